@@ -0,0 +1,69 @@
+"""Formatting of the devices problem report: text built with += against the grouped dict.
+
+Run from the repository root: ``python -m benchmarks.devices_report``
+"""
+import json
+import time
+
+from custom_components.robonomics_report_service.error_sources.sources.utils.message_formatter import MessageFormatter
+
+DEVICES = 2000
+ENTITIES_PER_DEVICE = 5
+LOOSE_ENTITIES = 10_000
+RUNS = 20
+
+
+def text_report(data: dict, type: str) -> str:
+    """Text form the report was sent in before the grouped dict."""
+    message = ""
+    for device in data["devices"]:
+        message += f"*{data['devices'][device]['device_name']}:"
+        for entity_name in data["devices"][device]["entities"]:
+            message += f"{entity_name},"
+        message += f" - {type}\n"
+    if len(data["entities"]) > 0:
+        message += "*Entities:"
+        for entity_name in data["entities"]:
+            message += f"{entity_name},"
+    return message
+
+
+def problems(name: str) -> dict:
+    return {
+        "devices": {
+            f"device_{i}": {
+                "device_name": f"Device {i}",
+                "entities": [f"sensor.device_{i}_{name}_{j}" for j in range(ENTITIES_PER_DEVICE)],
+            }
+            for i in range(DEVICES)
+        },
+        "entities": [f"sensor.loose_{name}_{i}" for i in range(LOOSE_ENTITIES)],
+    }
+
+
+def median_ms(func) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def main() -> None:
+    unavailables, not_updated = problems("unavailable"), problems("not_updated")
+
+    def old():
+        text = f"{text_report(unavailables, 'unavailables')}\n{text_report(not_updated, 'not updated')}"
+        return json.dumps({"description": text})
+
+    def new():
+        report = MessageFormatter.format_devices_report({"unavailables": unavailables, "not updated": not_updated})
+        return json.dumps({"description": report}, separators=(",", ":"))
+
+    print(f"Text with += and JSON: {median_ms(old):.1f} ms, {len(old())} bytes")
+    print(f"Grouped dict and compact JSON: {median_ms(new):.1f} ms, {len(new())} bytes")
+
+
+if __name__ == "__main__":
+    main()
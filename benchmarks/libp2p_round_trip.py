@@ -0,0 +1,52 @@
+"""Round trip of libp2p requests through a local stand-in proxy which answers immediately.
+
+The old client polled for responses once a second, so every request took about 1 s
+and only one could be in flight.
+
+Run from the repository root: ``python -m benchmarks.libp2p_round_trip``
+"""
+import asyncio
+import json
+import statistics
+import time
+
+import websockets
+
+from custom_components.robonomics_report_service.libp2p import LibP2PRPC
+from custom_components.robonomics_report_service.pyproxy import KeepAlive, Libp2pProxyAPI
+
+HASS_ADDRESS = "4FNQo2tK6PLeEhNEUuPePs8B8xKNwx15fX7tC2XnYpkC8W1j"
+PROTOCOL = "/initialization"
+SEQUENTIAL_REQUESTS = 200
+CONCURRENT_REQUESTS = 100
+
+
+async def stand_in_proxy(websocket) -> None:
+    async for raw in websocket:
+        message = json.loads(raw)
+        if "protocols_to_listen" in message:
+            continue
+        response = {"request_id": message["data"]["data"]["request_id"]}
+        await websocket.send(json.dumps({"protocol": f"{PROTOCOL}/{HASS_ADDRESS}", "data": response}))
+
+
+async def main() -> None:
+    async with websockets.serve(stand_in_proxy, "127.0.0.1", 0) as server:
+        # The connection is kept open as in the integration
+        proxy = Libp2pProxyAPI(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}", keep_alive=KeepAlive())
+        rpc = LibP2PRPC(proxy, HASS_ADDRESS)
+        times = []
+        for i in range(SEQUENTIAL_REQUESTS):
+            start = time.perf_counter()
+            await rpc.request({"number": i}, PROTOCOL)
+            times.append(time.perf_counter() - start)
+        print(f"Sequential round trip, median: {statistics.median(times) * 1000:.2f} ms")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(rpc.request({"number": i}, PROTOCOL) for i in range(CONCURRENT_REQUESTS)))
+        print(f"{CONCURRENT_REQUESTS} concurrent requests: {(time.perf_counter() - start) * 1000:.1f} ms")
+        await proxy.unsubscribe_from_all_protocols()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
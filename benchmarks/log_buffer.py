@@ -0,0 +1,39 @@
+"""Overhead of RingBufferLogHandler per record and time of a full snapshot.
+
+Run from the repository root: ``python -m benchmarks.log_buffer``
+"""
+import logging
+import time
+
+from custom_components.robonomics_report_service.const import LOG_BUFFER_MAX_BYTES
+from custom_components.robonomics_report_service.log_buffer import RingBufferLogHandler
+
+RECORDS = 200_000
+
+
+def log_records(logger: logging.Logger) -> float:
+    start = time.perf_counter()
+    for i in range(RECORDS):
+        logger.info("Entity sensor.temperature_%s changed state to %s", i % 100, i)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    logger = logging.getLogger("benchmark")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(logging.NullHandler())
+    baseline = log_records(logger)
+
+    handler = RingBufferLogHandler(LOG_BUFFER_MAX_BYTES)
+    logger.addHandler(handler)
+    with_buffer = log_records(logger)
+    print(f"Overhead per record: {(with_buffer - baseline) / RECORDS * 1e6:.1f} us")
+
+    start = time.perf_counter()
+    snapshot = handler.snapshot()
+    print(f"Snapshot of {len(snapshot.encode()) / 1024 / 1024:.1f} MB: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Time to build the proxy message for a 5 MB report.
+
+The old way serialized the report, parsed it back and serialized the whole message again
+with the standard json module. Now it is serialized once, with orjson when it is installed.
+
+Run from the repository root: ``python -m benchmarks.message_format``
+"""
+import json
+import os
+import statistics
+import time
+import typing as tp
+
+from custom_components.robonomics_report_service.pyproxy.utils import codec
+from custom_components.robonomics_report_service.pyproxy.utils.message import encode_msg_to_libp2p
+
+REPORT_SIZE = 5 * 1024 * 1024
+RUNS = 20
+
+report = {"report": {"logs.txt": os.urandom(REPORT_SIZE // 2).hex()}, "address": "address", "id": 1}
+
+
+def old_format() -> str:
+    data = json.loads(json.dumps(report))
+    return json.dumps({"protocol": "/report", "serverPeerId": "peer", "save_data": False, "data": {"data": data}})
+
+
+def measure(func: tp.Callable[[], tp.Any]) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main() -> None:
+    print(f"Old, serialized twice: {measure(old_format):.1f} ms")
+    print(f"New, from dict: {measure(lambda: encode_msg_to_libp2p(report, '/report', 'peer', False)):.1f} ms")
+    serialized = codec.dumps(report)
+    print(f"New, pre-serialized: {measure(lambda: encode_msg_to_libp2p(serialized, '/report', 'peer', False)):.1f} ms")
+    if codec.orjson is not None:
+        codec.orjson = None
+        print(f"New, from dict without orjson: {measure(lambda: encode_msg_to_libp2p(report, '/report', 'peer', False)):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
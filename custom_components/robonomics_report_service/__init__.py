@@ -5,7 +5,23 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.typing import ConfigType
 
 
-from .const import CONF_SENDER_SEED, DOMAIN, ERROR_SOURCES_MANAGER, CONF_EMAIL
+from .const import (
+    CONF_SENDER_SEED,
+    DOMAIN,
+    ERROR_SOURCES_MANAGER,
+    CONF_EMAIL,
+    CONF_STORAGE_BACKEND,
+    CONF_KUBO_URL,
+    CONF_LOG_BUFFER_SIZE,
+    STORAGE_BACKEND_PINATA,
+    DEFAULT_KUBO_URL,
+    LOG_BUFFER,
+    LOG_BUFFER_MAX_BYTES,
+    IPFS_CLIENT,
+    ROBONOMICS,
+    EXECUTOR,
+    LIBP2P,
+)
 
 # from .frontend import async_register_frontend, async_remove_frontend
 from .rws_registration import RWSRegistrationManager
@@ -13,6 +29,10 @@ from .robonomics import Robonomics
 from .error_sources.error_source_manager import ErrorSourcesManager
 from .report_service import ReportService
 from .libp2p import LibP2P
+from .ipfs import get_ipfs
+from .endpoint_manager import get_endpoint_manager
+from .executor import get_executor
+from .log_buffer import RingBufferLogHandler
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -20,13 +40,25 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][CONF_EMAIL] = entry.data[CONF_EMAIL]
+    hass.data[DOMAIN][CONF_STORAGE_BACKEND] = entry.data.get(CONF_STORAGE_BACKEND, STORAGE_BACKEND_PINATA)
+    hass.data[DOMAIN][CONF_KUBO_URL] = entry.data.get(CONF_KUBO_URL, DEFAULT_KUBO_URL)
+    # Registration in the config flow could create the client before the storage settings were set
+    hass.data[DOMAIN].pop(IPFS_CLIENT, None)
+    log_buffer_size = entry.data.get(CONF_LOG_BUFFER_SIZE)
+    log_buffer = RingBufferLogHandler(log_buffer_size * 1024 if log_buffer_size else LOG_BUFFER_MAX_BYTES)
+    logging.getLogger().addHandler(log_buffer)
+    hass.data[DOMAIN][LOG_BUFFER] = log_buffer
+    get_ipfs(hass).setup_garbage_collector()
+    get_endpoint_manager(hass).setup_probing()
     robonomics = Robonomics(
         hass,
         entry.data[CONF_SENDER_SEED],
     )
     await robonomics.setup()
+    await robonomics.resume_datalogs()
+    hass.data[DOMAIN][ROBONOMICS] = robonomics
     libp2p = LibP2P(robonomics.sender_address)
-    await libp2p.disconnect()
+    hass.data[DOMAIN][LIBP2P] = libp2p
     # async_register_frontend(hass)
     await RWSRegistrationManager.register(hass, robonomics, libp2p)
     await ReportService(hass, robonomics, libp2p).register()
@@ -51,6 +83,25 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     :return: True if all unload event were success
     """
     hass.data[DOMAIN][ERROR_SOURCES_MANAGER].remove_sources()
+    get_ipfs(hass).remove_garbage_collector()
+    get_endpoint_manager(hass).remove_probing()
+    # Pending reports, datalogs and the pins collection use the executor, which is shut down below
+    await get_executor(hass).async_cancel_tasks()
+    libp2p = hass.data[DOMAIN].pop(LIBP2P, None)
+    if libp2p is not None:
+        await libp2p.disconnect()
+    robonomics = hass.data[DOMAIN].pop(ROBONOMICS, None)
+    if robonomics is not None:
+        await get_executor(hass).async_run(robonomics.close)
+    log_buffer = hass.data[DOMAIN].pop(LOG_BUFFER, None)
+    if log_buffer is not None:
+        logging.getLogger().removeHandler(log_buffer)
+        log_buffer.close()
     await RWSRegistrationManager.delete(hass)
+    # Storage backend is chosen on setup, so the client is created again
+    hass.data[DOMAIN].pop(IPFS_CLIENT, None)
+    executor = hass.data[DOMAIN].pop(EXECUTOR, None)
+    if executor is not None:
+        executor.shutdown()
     # async_remove_frontend(hass)
     return True
@@ -0,0 +1,130 @@
+"""Local computation of IPFS CIDv0 the way `ipfs add` and Pinata do it by default.
+
+Files are split into 256KiB chunks and built into a balanced DAG of dag-pb nodes
+with UnixFS data and at most 174 links per node.
+"""
+import hashlib
+import typing as tp
+
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+
+UNIXFS_DIRECTORY = 1
+UNIXFS_FILE = 2
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+class _Node(tp.NamedTuple):
+    block: bytes
+    cumulative_size: int
+    file_size: int
+
+    @property
+    def multihash(self) -> bytes:
+        return b"\x12\x20" + hashlib.sha256(self.block).digest()
+
+
+def compute_file_cid(data: bytes) -> str:
+    """Compute CIDv0 of the file content.
+
+    :param data: File content.
+
+    :return: CIDv0 string.
+    """
+    return _encode_cid(_build_file(data))
+
+
+def compute_directory_cid(files: tp.Dict[str, bytes]) -> str:
+    """Compute CIDv0 of a directory with the files.
+
+    :param files: File name to the file content.
+
+    :return: CIDv0 string of the directory.
+    """
+    return _encode_cid(_build_directory({name: _build_file(data) for name, data in files.items()}))
+
+
+def _build_file(data: bytes) -> _Node:
+    if len(data) <= CHUNK_SIZE:
+        return _leaf(data)
+    leaves = [_leaf(data[i:i + CHUNK_SIZE]) for i in range(0, len(data), CHUNK_SIZE)]
+    depth = 1
+    while MAX_LINKS ** depth < len(leaves):
+        depth += 1
+    return _build_balanced(leaves, depth)
+
+
+def _build_balanced(leaves: tp.List[_Node], depth: int) -> _Node:
+    if depth == 1:
+        children = leaves
+    else:
+        subtree_size = MAX_LINKS ** (depth - 1)
+        children = [
+            _build_balanced(leaves[i:i + subtree_size], depth - 1)
+            for i in range(0, len(leaves), subtree_size)
+        ]
+    file_size = sum(child.file_size for child in children)
+    unixfs = _field_varint(1, UNIXFS_FILE) + _field_varint(3, file_size)
+    for child in children:
+        unixfs += _field_varint(4, child.file_size)
+    links = [(child, "") for child in children]
+    return _dag_node(links, unixfs, file_size)
+
+
+def _build_directory(files: tp.Dict[str, _Node]) -> _Node:
+    links = [(files[name], name) for name in sorted(files)]
+    return _dag_node(links, _field_varint(1, UNIXFS_DIRECTORY), 0)
+
+
+def _leaf(data: bytes) -> _Node:
+    unixfs = _field_varint(1, UNIXFS_FILE)
+    if data:
+        unixfs += _field_bytes(2, data)
+    unixfs += _field_varint(3, len(data))
+    return _dag_node([], unixfs, len(data))
+
+
+def _dag_node(links: tp.List[tp.Tuple[_Node, str]], unixfs: bytes, file_size: int) -> _Node:
+    block = b""
+    for child, name in links:
+        link = (
+            _field_bytes(1, child.multihash)
+            + _field_bytes(2, name.encode("utf-8"))
+            + _field_varint(3, child.cumulative_size)
+        )
+        block += _field_bytes(2, link)
+    block += _field_bytes(1, unixfs)
+    cumulative_size = len(block) + sum(child.cumulative_size for child, _ in links)
+    return _Node(block, cumulative_size, file_size)
+
+
+def _varint(value: int) -> bytes:
+    result = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            result.append(byte | 0x80)
+        else:
+            result.append(byte)
+            return bytes(result)
+
+
+def _field_varint(field_number: int, value: int) -> bytes:
+    return _varint(field_number << 3) + _varint(value)
+
+
+def _field_bytes(field_number: int, value: bytes) -> bytes:
+    return _varint(field_number << 3 | 2) + _varint(len(value)) + value
+
+
+def _encode_cid(node: _Node) -> str:
+    multihash = node.multihash
+    number = int.from_bytes(multihash, "big")
+    encoded = ""
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    leading_zeros = len(multihash) - len(multihash.lstrip(b"\x00"))
+    return BASE58_ALPHABET[0] * leading_zeros + encoded
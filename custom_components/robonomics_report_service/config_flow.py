@@ -10,6 +10,14 @@ from .const import (
     DOMAIN,
     CONF_EMAIL,
     CONF_SENDER_SEED,
+    CONF_STORAGE_BACKEND,
+    CONF_KUBO_URL,
+    CONF_LOG_BUFFER_SIZE,
+    STORAGE_BACKENDS,
+    STORAGE_BACKEND_PINATA,
+    DEFAULT_KUBO_URL,
+    LOG_BUFFER_MAX_BYTES,
+    LOG_BUFFER_MIN_BYTES,
 )
 from .robonomics import Robonomics
 from .rws_registration import RWSRegistrationManager
@@ -20,6 +28,11 @@ _LOGGER = logging.getLogger(__name__)
 STEP_USER_DATA_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_EMAIL): str,
+        vol.Optional(CONF_STORAGE_BACKEND, default=STORAGE_BACKEND_PINATA): vol.In(STORAGE_BACKENDS),
+        vol.Optional(CONF_KUBO_URL, default=DEFAULT_KUBO_URL): str,
+        vol.Optional(CONF_LOG_BUFFER_SIZE, default=LOG_BUFFER_MAX_BYTES // 1024): vol.All(
+            int, vol.Range(min=LOG_BUFFER_MIN_BYTES // 1024, max=LOG_BUFFER_MAX_BYTES // 1024)
+        ),
     }
 )
 
@@ -64,7 +77,11 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             )
             await robonomics.setup()
             libp2p = LibP2P(robonomics.sender_address)
-            await self.register_with_retry(robonomics, libp2p)
+            try:
+                await self.register_with_retry(robonomics, libp2p)
+            finally:
+                await libp2p.disconnect()
+                await robonomics.executor.async_run(robonomics.close)
             return self.async_create_entry(
                 title="Robonomics Report Service", data=self.user_data
             )
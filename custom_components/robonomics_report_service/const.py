@@ -4,6 +4,7 @@ ADDRESS = "address"
 SERVICE_PAID = False
 
 STORAGE_CREDENTIALS = "credentials"
+STORAGE_PINS = "pins"
 
 CONF_EMAIL = "email"
 CONF_OWNER_ADDRESS = "owner_address"
@@ -11,6 +12,9 @@ CONF_PINATA_SECRET = "pinata_secret"
 CONF_PINATA_PUBLIC = "pinata_public"
 CONF_SENDER_SEED = "sender_seed"
 CONF_INTEGRATOR_ADDRESS = "integrator_address"
+CONF_STORAGE_BACKEND = "storage_backend"
+CONF_KUBO_URL = "kubo_url"
+CONF_LOG_BUFFER_SIZE = "log_buffer_size" # KiB
 
 ROBONOMICS_WSS = [
     "wss://kusama.rpc.robonomics.network/",
@@ -18,16 +22,77 @@ ROBONOMICS_WSS = [
     "wss://robonomics.0xsamsara.com/",
 ]
 
+# Datalogs sent in one utility.batch extrinsic
+DATALOG_BATCH_SIZE = 10
+DATALOG_PIPELINE_DEPTH = 4 # Datalog extrinsics submitted without waiting for inclusion
+DATALOG_INCLUSION_POLL_INTERVAL = 6 # Seconds
+DATALOG_INCLUSION_TIMEOUT_BLOCKS = 50
+DATALOG_JOURNAL_FILE = ".storage/robonomics_report_service.datalog_journal" # Relative to the config directory
+DATALOG_JOURNAL_COMPACT_THRESHOLD = 1000 # Lines of finished entries
+EXECUTOR_MAX_WORKERS = 4 # Threads for chain, IPFS and crypto work
+EXECUTOR_MAX_QUEUE = 32 # Jobs waiting for a thread, callers wait in the event loop after that
+ROBONOMICS_RETRY_DELAY = 2 # Seconds before resending an extrinsic rejected by the pool
+RWS_MEMBERSHIP_TTL = 10*60 # Seconds to trust the last RWS devices check
+ENDPOINT_PROBE_INTERVAL = 5*60 # Seconds
+ENDPOINT_PROBE_TIMEOUT = 10 # Seconds
+ENDPOINT_LATENCY_SMOOTHING = 0.3 # Weight of the latest latency measurement
+ENDPOINT_ERROR_SMOOTHING = 0.2 # Weight of the latest request result in the error rate
+CIRCUIT_BREAKER_THRESHOLD = 3 # Failures in a row to stop using the node
+CIRCUIT_BREAKER_COOLDOWN = 60 # Seconds
+CIRCUIT_BREAKER_MAX_COOLDOWN = 30*60 # Seconds
+
 PROBLEM_REPORT_SERVICE = "report_an_issue"
 LOG_FILE_NAME = "home-assistant.log"
 TRACES_FILE_NAME = ".storage/trace.saved_traces"
 IPFS_PROBLEM_REPORT_FOLDER = "ha_problem_report"
-LOGS_MAX_LEN = 3*1024*1024
+PINATA_UPLOAD_MODE_CONCURRENT = "concurrent" # Each file is pinned separately
+PINATA_UPLOAD_MODE_DIRECTORY = "directory" # All files are pinned as one directory
+PINATA_UPLOAD_MODE = PINATA_UPLOAD_MODE_CONCURRENT
+PINATA_UPLOAD_CONCURRENCY = 4
+PIN_MAX_AGE = 7*24*60*60 # Seconds to keep pins of reports without response
+PIN_COMMITTED_MAX_AGE = 30*24*60*60 # Seconds to remember committed pins after their last use
+PIN_LEDGER_SAVE_DELAY = 10 # Seconds to collect ledger changes for before writing it
+PIN_RETENTION = 24*60*60 # Seconds to keep pins of reports finished without datalog
+PIN_GC_INTERVAL = 60*60 # Seconds
+PIN_GC_BATCH_SIZE = 20
+PIN_GC_UNPIN_DELAY = 2 # Seconds between unpin requests
+# Encrypt report files with keys and nonces derived from the content, so identical
+# files produce identical ciphertext and are pinned only once
+REPORT_DETERMINISTIC_ENCRYPTION = True
+LOGS_MAX_LEN = 3*1024*1024 # Bytes
+REPORT_SIZE_BUDGET = 8*1024*1024 # Bytes of encrypted report files
+REPORT_ARTIFACTS_PRIORITY = {LOG_FILE_NAME: 3} # Others have priority 1
+# Encrypted message is hex, so it is twice as big as the message plus keys and nonces
+ENCRYPTION_OVERHEAD = 1024
+LOG_BUFFER_MAX_BYTES = LOGS_MAX_LEN # Default, logs above LOGS_MAX_LEN are not sent anyway
+LOG_BUFFER_MIN_BYTES = 64*1024
+REPORT_MEMORY_BUDGET = 24*1024*1024
+# Raw log, its encoded bytes, hex ciphertext and the JSON copy of it
+REPORT_MEMORY_FACTOR = 6
+
+STORAGE_BACKEND_PINATA = "pinata"
+STORAGE_BACKEND_KUBO = "kubo"
+STORAGE_BACKEND_LOCAL = "local"
+STORAGE_BACKENDS = [STORAGE_BACKEND_PINATA, STORAGE_BACKEND_KUBO, STORAGE_BACKEND_LOCAL]
+DEFAULT_KUBO_URL = "http://127.0.0.1:5001"
+LOCAL_STORAGE_PATH = "robonomics_report_service/ipfs" # Relative to the config directory
 
 LIBP2P_WS_SERVER = "ws://127.0.0.1:8888"
 LIBP2P_LISTEN_PROTOCOL = "/pinataCreds"
 LIBP2P_SEND_INITIALISATION_PROTOCOL = "/initialization"
 LIBP2P_SEND_REPORT_PROTOCOL = "/report"
+LIBP2P_REQUEST_TIMEOUT = 60 # Seconds
+# The proxy connection is kept open and reused by all reports
+LIBP2P_PING_INTERVAL = 20 # Seconds
+LIBP2P_PING_TIMEOUT = 20 # Seconds
+LIBP2P_IDLE_TIMEOUT = 10*60 # Seconds without messages and subscriptions to close the connection
+LIBP2P_RECONNECT_DELAY = 1 # Seconds, doubles with every failed attempt
+LIBP2P_MAX_RECONNECT_DELAY = 60 # Seconds
+LIBP2P_SEND_BUFFER_SIZE = 100 # Messages kept while the proxy is unavailable
+LIBP2P_SEND_BUFFER_BYTES = 32*1024*1024 # Total size of messages kept while the proxy is unavailable
+LIBP2P_MAX_CONCURRENT_CALLBACKS = 8
+LIBP2P_SUBSCRIPTION_DEBOUNCE = 0.05 # Seconds
+LIBP2P_REPORT_SUBSCRIPTION_LINGER = 5*60 # Seconds to keep listening for report responses after the last one
 INTEGRATOR_PEER_ID = "12D3KooWBE2XrMkf1Z6P3AtKqYmvdD59aoD5xwKySrCgkmBqJNFh"
 PROBLEM_SERVICE_ROBONOMICS_ADDRESS = "4HifM6Cny7bHAdLb5jw3hHV2KabuzRZV8gmHG1eh4PxJakwi"
 
@@ -37,4 +102,11 @@ FRONTEND_URL = "/rrs/frontend"
 CHECK_ENTITIES_TIMEOUT = 24 # Hours
 
 OWNER_ADDRESS = PROBLEM_SERVICE_ROBONOMICS_ADDRESS
-ERROR_SOURCES_MANAGER = "error_sources_manages"
\ No newline at end of file
+ERROR_SOURCES_MANAGER = "error_sources_manages"
+REPORT_MEMORY_BUDGET_KEY = "report_memory_budget"
+LOG_BUFFER = "log_buffer"
+IPFS_CLIENT = "ipfs"
+ENDPOINT_MANAGER = "endpoint_manager"
+ROBONOMICS = "robonomics"
+EXECUTOR = "executor"
+LIBP2P = "libp2p"
\ No newline at end of file
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import logging
+import os
+import typing as tp
+
+from homeassistant.core import HomeAssistant
+
+from .executor import get_executor
+from .const import DATALOG_JOURNAL_FILE, DATALOG_JOURNAL_COMPACT_THRESHOLD
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DatalogState:
+    Queued = "queued" # Waits in the queue
+    Submitted = "submitted" # Sent to the chain, waits for inclusion
+    Included = "included" # Recorded in the chain
+    Failed = "failed" # Sending failed, pins were released
+
+
+class DatalogJournal:
+    """Append-only journal of datalog requests, so the queue survives restarts.
+
+    Every line is ``{"id": ..., "state": ...}``, queued entries have ``"data"`` as well.
+    Only entries which are not finished are kept in memory. The journal is rewritten
+    with them when stale lines exceed ``DATALOG_JOURNAL_COMPACT_THRESHOLD``.
+    Submitted entries are sent again after restart, as their inclusion is unknown.
+    File operations run one at a time, so a line is never appended to a file being replaced.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self.path = hass.config.path(DATALOG_JOURNAL_FILE)
+        self._pending: tp.Dict[int, str] = {}
+        self._next_id = 0
+        self._lines = 0
+        self._lock = asyncio.Lock()
+
+    async def async_load(self) -> tp.List[tp.Tuple[int, str]]:
+        """Replay the journal.
+
+        :return: Unfinished entries as ``(id, data)`` in the order they were queued.
+        """
+        async with self._lock:
+            await get_executor(self.hass).async_run(self._load)
+        _LOGGER.debug(f"Datalog journal loaded, pending: {len(self._pending)}")
+        return list(self._pending.items())
+
+    async def async_append(self, data: str) -> int:
+        entry_id = self._next_id
+        self._next_id += 1
+        self._pending[entry_id] = data
+        await self._async_write([{"id": entry_id, "state": DatalogState.Queued, "data": data}])
+        return entry_id
+
+    async def async_set_state(self, entry_ids: tp.List[int], state: str) -> None:
+        if not entry_ids:
+            return
+        records = [{"id": entry_id, "state": state} for entry_id in entry_ids]
+        if state in (DatalogState.Included, DatalogState.Failed):
+            for entry_id in entry_ids:
+                self._pending.pop(entry_id, None)
+        await self._async_write(records)
+        if self._lines - len(self._pending) > DATALOG_JOURNAL_COMPACT_THRESHOLD:
+            async with self._lock:
+                # The worker thread gets a copy, the loop keeps changing pending entries
+                pending = list(self._pending.items())
+                await get_executor(self.hass).async_run(self._compact, pending)
+                self._lines = len(pending)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _async_write(self, records: tp.List[dict]) -> None:
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        async with self._lock:
+            await get_executor(self.hass).async_run(self._append, lines)
+            self._lines += len(records)
+
+    def _load(self) -> None:
+        self._pending = {}
+        self._lines = 0
+        broken = False
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line can be partly written if HA was stopped while writing
+                    _LOGGER.warning(f"Skip broken datalog journal line: {line!r}")
+                    broken = True
+                    continue
+                self._lines += 1
+                entry_id = record["id"]
+                self._next_id = max(self._next_id, entry_id + 1)
+                if record["state"] == DatalogState.Queued:
+                    self._pending[entry_id] = record["data"]
+                elif record["state"] in (DatalogState.Included, DatalogState.Failed):
+                    self._pending.pop(entry_id, None)
+        # Rewrite a broken journal, new lines must not be appended to a partly written one
+        if broken or self._lines > len(self._pending):
+            self._compact(list(self._pending.items()))
+            self._lines = len(self._pending)
+
+    def _append(self, lines: str) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _compact(self, pending: tp.List[tp.Tuple[int, str]]) -> None:
+        tmp_path = f"{self.path}.tmp"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            for entry_id, data in pending:
+                record = {"id": entry_id, "state": DatalogState.Queued, "data": data}
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        _LOGGER.debug(f"Datalog journal compacted, pending: {len(pending)}")
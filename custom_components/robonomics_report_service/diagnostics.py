@@ -0,0 +1,15 @@
+import typing as tp
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, REPORT_MEMORY_BUDGET_KEY
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> tp.Dict[str, tp.Any]:
+    """Return runtime stats of the integration for the diagnostics download."""
+    domain_data = hass.data.get(DOMAIN, {})
+    memory_budget = domain_data.get(REPORT_MEMORY_BUDGET_KEY)
+    return {
+        "report_memory_budget": memory_budget.stats() if memory_budget is not None else None,
+    }
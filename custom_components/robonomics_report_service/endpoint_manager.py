@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import threading
+import time
+import typing as tp
+from datetime import timedelta
+
+import aiohttp
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import (
+    DOMAIN,
+    ENDPOINT_MANAGER,
+    ROBONOMICS_WSS,
+    ENDPOINT_PROBE_INTERVAL,
+    ENDPOINT_PROBE_TIMEOUT,
+    ENDPOINT_LATENCY_SMOOTHING,
+    ENDPOINT_ERROR_SMOOTHING,
+    CIRCUIT_BREAKER_THRESHOLD,
+    CIRCUIT_BREAKER_COOLDOWN,
+    CIRCUIT_BREAKER_MAX_COOLDOWN,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EndpointStats:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.latency: tp.Optional[float] = None # Smoothed, seconds
+        self.error_rate = 0.0 # Smoothed, so old errors of a recovered node are forgotten
+        self.consecutive_failures = 0
+        self.open_until = 0.0 # Circuit is open till this time
+        self.cooldown = CIRCUIT_BREAKER_COOLDOWN
+
+    def add_result(self, failed: bool) -> None:
+        self.error_rate += ENDPOINT_ERROR_SMOOTHING * (float(failed) - self.error_rate)
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.open_until
+
+    def as_dict(self) -> tp.Dict[str, tp.Any]:
+        return {
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "consecutive_failures": self.consecutive_failures,
+            "circuit_open": not self.is_available(time.monotonic()),
+        }
+
+
+class EndpointManager:
+    """Tracks latency and errors of Robonomics nodes and picks the best one.
+
+    Nodes are probed in the background with a JSON-RPC request. After
+    ``CIRCUIT_BREAKER_THRESHOLD`` failures in a row the circuit of the node is opened
+    and the node is skipped for a cooldown, which doubles each time the node fails
+    again after it. Results are reported from executor threads as well, so the
+    stats are guarded with a lock.
+    """
+
+    def __init__(self, hass: HomeAssistant, endpoints: tp.List[str] = ROBONOMICS_WSS) -> None:
+        self.hass = hass
+        self._stats = {url: EndpointStats(url) for url in endpoints}
+        self._lock = threading.Lock()
+        self._unsub_probing = None
+
+    def best(self, exclude: tp.Collection[str] = ()) -> str:
+        """Return the available node with the lowest error rate and latency.
+
+        :param exclude: Nodes to skip, e.g. the ones already failed during the current request.
+            They are used anyway if there are no other nodes available.
+
+        If circuits of all nodes are open, the node which is closed first is returned.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [stats for stats in self._stats.values() if stats.is_available(now)]
+            available = [stats for stats in available if stats.url not in exclude] or available
+            if not available:
+                return min(self._stats.values(), key=lambda stats: stats.open_until).url
+            # Nodes without measurements yet keep the order of the list
+            return min(
+                available,
+                key=lambda stats: (
+                    round(stats.error_rate, 1),
+                    stats.latency if stats.latency is not None else float("inf"),
+                ),
+            ).url
+
+    def report_success(self, url: str, latency: tp.Optional[float] = None) -> None:
+        with self._lock:
+            stats = self._stats[url]
+            stats.add_result(failed=False)
+            stats.consecutive_failures = 0
+            stats.cooldown = CIRCUIT_BREAKER_COOLDOWN
+            if latency is not None:
+                if stats.latency is None:
+                    stats.latency = latency
+                else:
+                    stats.latency += ENDPOINT_LATENCY_SMOOTHING * (latency - stats.latency)
+
+    def report_failure(self, url: str) -> None:
+        with self._lock:
+            stats = self._stats[url]
+            stats.add_result(failed=True)
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD:
+                stats.open_until = time.monotonic() + stats.cooldown
+                _LOGGER.warning(f"Robonomics node {url} is unavailable for {stats.cooldown} seconds")
+                stats.cooldown = min(stats.cooldown * 2, CIRCUIT_BREAKER_MAX_COOLDOWN)
+                stats.consecutive_failures = 0
+
+    def stats(self) -> tp.Dict[str, tp.Dict[str, tp.Any]]:
+        with self._lock:
+            return {url: stats.as_dict() for url, stats in self._stats.items()}
+
+    @callback
+    def setup_probing(self) -> None:
+        self._unsub_probing = async_track_time_interval(
+            self.hass, self.async_probe, timedelta(seconds=ENDPOINT_PROBE_INTERVAL)
+        )
+        self.hass.async_create_task(self.async_probe())
+
+    @callback
+    def remove_probing(self) -> None:
+        if self._unsub_probing is not None:
+            self._unsub_probing()
+            self._unsub_probing = None
+
+    async def async_probe(self, _=None) -> None:
+        await asyncio.gather(*(self._async_probe_endpoint(url) for url in self._stats))
+        _LOGGER.debug(f"Robonomics nodes: {self.stats()}, best: {self.best()}")
+
+    async def _async_probe_endpoint(self, url: str) -> None:
+        session = async_get_clientsession(self.hass)
+        start = time.monotonic()
+        try:
+            async with asyncio.timeout(ENDPOINT_PROBE_TIMEOUT):
+                async with session.ws_connect(url) as ws:
+                    await ws.send_json({"id": 1, "jsonrpc": "2.0", "method": "system_health", "params": []})
+                    response = await ws.receive_json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, TypeError) as e:
+            _LOGGER.debug(f"Probe of {url} failed: {e!r}")
+            self.report_failure(url)
+            return
+        if "result" in response:
+            self.report_success(url, time.monotonic() - start)
+        else:
+            _LOGGER.debug(f"Probe of {url} failed with response: {response}")
+            self.report_failure(url)
+
+
+def get_endpoint_manager(hass: HomeAssistant) -> EndpointManager:
+    """Return the endpoint manager shared by the integration."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if ENDPOINT_MANAGER not in domain_data:
+        domain_data[ENDPOINT_MANAGER] = EndpointManager(hass)
+    return domain_data[ENDPOINT_MANAGER]
@@ -47,16 +47,10 @@ class EntitiesStatusChecker(ErrorSource):
         await asyncio.sleep(15)
         unavailables = self._get_unavailables()
         not_updated = await self._get_not_updated()
-        unavailables_text = MessageFormatter.format_devices_list(
-            unavailables, "unavailables"
+        problem_report = MessageFormatter.format_devices_report(
+            {"unavailables": unavailables, "not updated": not_updated}
         )
-        not_updated_text = MessageFormatter.format_devices_list(
-            not_updated, "not updated"
-        )
-        problem_text = MessageFormatter.concatinate_messages(
-            unavailables_text, not_updated_text
-        )
-        await self._run_report_service(problem_text, ProblemType.Devices, "devices")
+        await self._run_report_service(problem_report, ProblemType.Devices, "devices")
 
     def _get_unavailables(self) -> tp.Dict:
         unavailables = []
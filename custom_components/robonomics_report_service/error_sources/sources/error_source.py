@@ -1,5 +1,6 @@
 import abc
 import asyncio
+import typing as tp
 from homeassistant.core import HomeAssistant
 
 from ...const import DOMAIN, PROBLEM_REPORT_SERVICE, CONF_EMAIL
@@ -20,7 +21,7 @@ class ErrorSource(abc.ABC):
 
     async def _run_report_service(
         self,
-        description: str,
+        description: tp.Union[str, dict],
         error_type: ProblemType,
         problem_source: str,
         repeated_error: bool = False,
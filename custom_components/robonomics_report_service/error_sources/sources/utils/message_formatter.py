@@ -2,20 +2,20 @@ import typing as tp
 
 class MessageFormatter:
     @staticmethod
-    def format_devices_list(data: dict, type: str) -> str:
-        message = ""
-        for device in data["devices"]:
-            message += f"*{data["devices"][device]['device_name']}:"
-            for entity_name in data["devices"][device]["entities"]:
-                message += f"{entity_name},"
-            message += f" - {type}\n"
-        if len(data["entities"]) > 0:
-            message += "*Entities:"
-            for entity_name in data["entities"]:
-                message += f"{entity_name},"
-        return message
+    def format_devices_report(problems: tp.Dict[str, dict]) -> dict:
+        """Group entities with problems by device in one pass.
 
-    @staticmethod
-    def concatinate_messages(message1: str, message2: str) -> str:
-        return f"{message1}\n{message2}"
+        :param problems: Problem type to the dict with devices and entities with this problem.
 
+        :return: Dict with devices and entities without device grouped by problem type.
+        """
+        report = {"devices": {}, "entities": {}}
+        for problem, data in problems.items():
+            for device_id, device in data["devices"].items():
+                device_report = report["devices"].get(device_id)
+                if device_report is None:
+                    device_report = report["devices"][device_id] = {"name": device["device_name"]}
+                device_report[problem] = list(device["entities"])
+            if len(data["entities"]) > 0:
+                report["entities"][problem] = list(data["entities"])
+        return report
@@ -0,0 +1,105 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
+
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, EXECUTOR, EXECUTOR_MAX_WORKERS, EXECUTOR_MAX_QUEUE
+
+_LOGGER = logging.getLogger(__name__)
+
+T = tp.TypeVar("T")
+
+
+class ReportServiceExecutor:
+    """Thread pool of the integration for chain, IPFS and crypto work.
+
+    Keeps long blocking calls off HA's shared executor. At most ``max_workers`` jobs
+    run at once and ``max_queue`` more wait in the pool, further callers wait in the
+    event loop until there is room. Background tasks which use the pool are created
+    with ``create_task``, so they are cancelled before the pool is shut down.
+    """
+
+    def __init__(self, max_workers: int = EXECUTOR_MAX_WORKERS, max_queue: int = EXECUTOR_MAX_QUEUE) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=DOMAIN)
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._tasks: tp.Set[asyncio.Task] = set()
+        self._queued = 0
+        self._running = 0
+        self._started = 0
+        self._completed = 0
+        self._total_wait_time = 0.0
+        self._total_run_time = 0.0
+        self._max_wait_time = 0.0
+
+    async def async_run(self, func: tp.Callable[..., T], *args, **kwargs) -> T:
+        """Run the function in the pool and return its result."""
+        async with self._slots:
+            submitted = time.monotonic()
+            with self._lock:
+                self._queued += 1
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(self._run, submitted, func, *args, **kwargs)
+            )
+
+    def _run(self, submitted: float, func: tp.Callable[..., T], *args, **kwargs) -> T:
+        started = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._started += 1
+            self._total_wait_time += started - submitted
+            self._max_wait_time = max(self._max_wait_time, started - submitted)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._total_run_time += time.monotonic() - started
+
+    def create_task(self, coro: tp.Coroutine[tp.Any, tp.Any, T]) -> "asyncio.Task[T]":
+        """Run the coroutine in the background till it is done or the tasks are cancelled."""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def async_cancel_tasks(self) -> None:
+        """Cancel background tasks and wait till they are finished."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs submitted to the pool, but not started yet."""
+        return self._queued
+
+    def stats(self) -> tp.Dict[str, tp.Any]:
+        with self._lock:
+            return {
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "average_wait_time": self._total_wait_time / (self._started or 1),
+                "max_wait_time": self._max_wait_time,
+                "average_run_time": self._total_run_time / (self._completed or 1),
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_executor(hass: HomeAssistant) -> ReportServiceExecutor:
+    """Return the thread pool shared by the integration."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if EXECUTOR not in domain_data:
+        domain_data[EXECUTOR] = ReportServiceExecutor()
+    return domain_data[EXECUTOR]
@@ -1,80 +1,302 @@
+import asyncio
 import logging
 import typing as tp
 import os
 import json
+from datetime import timedelta
 
-from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import HomeAssistantError
-from pinatapy import PinataPy
+import aiohttp
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
 
-from .utils import async_load_from_store
-from .const import STORAGE_CREDENTIALS, CONF_PINATA_PUBLIC, CONF_PINATA_SECRET
+from .cid import compute_directory_cid, compute_file_cid
+from .pin_ledger import PinLedger
+from .executor import get_executor
+from .pinata import PinataKeysRewoked
+from .storage import StorageBackend, PinataBackend, KuboBackend, LocalBackend
+from .const import (
+    IPFS_PROBLEM_REPORT_FOLDER,
+    PINATA_UPLOAD_MODE,
+    PINATA_UPLOAD_MODE_DIRECTORY,
+    PINATA_UPLOAD_CONCURRENCY,
+    PIN_GC_INTERVAL,
+    PIN_GC_BATCH_SIZE,
+    PIN_GC_UNPIN_DELAY,
+    DOMAIN,
+    IPFS_CLIENT,
+    CONF_STORAGE_BACKEND,
+    CONF_KUBO_URL,
+    STORAGE_BACKEND_PINATA,
+    STORAGE_BACKEND_KUBO,
+    STORAGE_BACKEND_LOCAL,
+    DEFAULT_KUBO_URL,
+    LOCAL_STORAGE_PATH,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
-class PinataKeysRewoked(HomeAssistantError):
-    """Pinata API Key has been revoked"""
-
 
 class IPFS:
-    def __init__(self, hass: HomeAssistant):
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        backend: StorageBackend,
+        upload_mode: str = PINATA_UPLOAD_MODE,
+        upload_concurrency: int = PINATA_UPLOAD_CONCURRENCY,
+    ):
         self.hass = hass
+        self.backend = backend
+        self.executor = get_executor(hass)
+        self.upload_mode = upload_mode
+        self._upload_semaphore = asyncio.Semaphore(upload_concurrency)
+        self.pin_ledger = PinLedger(hass, backend.storage_id)
+        self._unsub_garbage_collector = None
+        self._collecting_garbage = False
 
-    async def pin_to_pinata(self, dirname: str) -> tp.Optional[str]:
-        pinata = await self._get_pinata_with_creds()
-        if pinata is not None:
-            ipfs_hash = await self.hass.async_add_executor_job(
-                self._pin_to_pinata, dirname, pinata
-            )
-            return ipfs_hash
+    async def pin_files(self, dirname: str, owner: tp.Optional[str] = None) -> tp.Optional[str]:
+        """Pin report files from the directory.
+
+        :param dirname: Directory with report files.
+        :param owner: Id of the report owning the pins.
+
+        :return: Dict with file names and their hashes.
+        """
+        await self.pin_ledger.async_load()
+        try:
+            return await self._pin_files(dirname, owner)
+        finally:
+            self.pin_ledger.save()
 
-    async def unpin_from_pinata(self, ipfs_hashes_dict: str | dict) -> tp.Optional[str]:
-        pinata = await self._get_pinata_with_creds()
+    async def unpin_files(
+        self, ipfs_hashes_dict: str | dict, owner: tp.Optional[str] = None, retention: float = 0
+    ) -> tp.Optional[str]:
+        """Release pins of a report. Pins without references left are removed.
+
+        :param ipfs_hashes_dict: Dict with file names and their hashes.
+        :param owner: Id of the report owning the pins.
+        :param retention: Time in seconds to keep pins without references before removing.
+        """
         if isinstance(ipfs_hashes_dict, str):
             ipfs_hashes_dict = json.loads(ipfs_hashes_dict)
-        if pinata is not None:
-            await self.hass.async_add_executor_job(
-                self._unpin_from_pinata, ipfs_hashes_dict, pinata
-            )
+        await self.pin_ledger.async_load()
+        try:
+            await self._unpin_files(ipfs_hashes_dict, owner, retention)
+        finally:
+            self.pin_ledger.save()
 
-    async def _get_pinata_with_creds(self) -> tp.Optional[PinataPy]:
-        storage_data = await async_load_from_store(self.hass, STORAGE_CREDENTIALS)
-        if CONF_PINATA_PUBLIC in storage_data and CONF_PINATA_SECRET in storage_data:
-            return PinataPy(
-                storage_data[CONF_PINATA_PUBLIC], storage_data[CONF_PINATA_SECRET]
-            )
+    async def commit_pins(self, ipfs_hashes_dict: str | dict) -> None:
+        """Mark pins recorded in a datalog, so they are never removed."""
+        if isinstance(ipfs_hashes_dict, str):
+            ipfs_hashes_dict = json.loads(ipfs_hashes_dict)
+        await self.pin_ledger.async_load()
+        for ipfs_hash in _get_root_hashes(ipfs_hashes_dict):
+            self.pin_ledger.commit(ipfs_hash)
+        self.pin_ledger.save()
+
+    @callback
+    def setup_garbage_collector(self) -> None:
+        self._unsub_garbage_collector = async_track_time_interval(
+            self.hass, self._schedule_garbage_collection, timedelta(seconds=PIN_GC_INTERVAL)
+        )
+
+    @callback
+    def _schedule_garbage_collection(self, _=None) -> None:
+        # The run is cancelled with other tasks of the executor on unload
+        self.executor.create_task(self.async_collect_garbage())
+
+    @callback
+    def remove_garbage_collector(self) -> None:
+        if self._unsub_garbage_collector is not None:
+            self._unsub_garbage_collector()
+            self._unsub_garbage_collector = None
+
+    async def async_collect_garbage(self, _=None) -> None:
+        """Remove a batch of expired pins, one by one with a delay between requests."""
+        if self._collecting_garbage:
+            return
+        self._collecting_garbage = True
+        try:
+            await self.pin_ledger.async_load()
+            expired = self.pin_ledger.get_expired(PIN_GC_BATCH_SIZE)
+            for ipfs_hash in expired:
+                # The pin could be referenced again while previous pins were removed
+                if not self.pin_ledger.is_unpinnable(ipfs_hash):
+                    _LOGGER.debug(f"Pin {ipfs_hash} is referenced again, skip removing")
+                    continue
+                await self._remove_pin(ipfs_hash)
+                await asyncio.sleep(PIN_GC_UNPIN_DELAY)
+            self.pin_ledger.save()
+            _LOGGER.debug(f"Pins garbage collected: {len(expired)}, pins: {self.pin_ledger.stats()}")
+        finally:
+            self._collecting_garbage = False
 
-    def _pin_to_pinata(self, dirname: str, pinata: PinataPy) -> tp.Optional[str]:
-        res = None
-        dict_with_hashes = {}
+    async def async_invalidate_credentials(self) -> None:
+        """Reload storage credentials. Pins made with the old ones can't be checked or removed, so they are forgotten."""
+        self.backend.invalidate_credentials()
+        await self.pin_ledger.async_load()
+        self.pin_ledger.reset()
+        self.pin_ledger.save()
 
+    async def _pin_files(self, dirname: str, owner: tp.Optional[str]) -> tp.Optional[str]:
         _LOGGER.debug(f"tmp dir: {dirname}")
-        file_names = [
-            f
-            for f in os.listdir(dirname)
-            if os.path.isfile(os.path.join(dirname, f))
-        ]
+        file_names = await self.executor.async_run(_get_file_names, dirname)
         _LOGGER.debug(f"file names: {file_names}")
-        for file in file_names:
-            path_to_file = f"{dirname}/{file}"
-            res = pinata.pin_file_to_ipfs(path_to_file, save_absolute_paths=False)
-            ipfs_hash: tp.Optional[str] = res.get("IpfsHash")
-            if ipfs_hash:
-                _LOGGER.debug(f"Added file {file} to Pinata. Hash is: {ipfs_hash}")
-                dict_with_hashes[file] = ipfs_hash
-            elif res['status'] == 403 and "API_KEY_REVOKED" in res["text"]:
-                _LOGGER.warning("Pinata keys was revoked")
-                raise PinataKeysRewoked
-            else:
-                _LOGGER.error(f"Can't pin to pinata with responce: {res}")
+        if self.upload_mode == PINATA_UPLOAD_MODE_DIRECTORY:
+            dict_with_hashes = await self._pin_directory(dirname, file_names, owner)
+        else:
+            hashes = await asyncio.gather(
+                *(self._pin_file(f"{dirname}/{file}", file, owner) for file in file_names)
+            )
+            dict_with_hashes = {
+                file: ipfs_hash for file, ipfs_hash in zip(file_names, hashes) if ipfs_hash
+            }
         _LOGGER.debug(f"Dict with hashes: {dict_with_hashes}")
         if dict_with_hashes:
             return dict_with_hashes
 
-    def _unpin_from_pinata(self, ipfs_hashes_dict: tp.Dict, pinata: PinataPy) -> None:
+    async def _pin_directory(
+        self, dirname: str, file_names: tp.List[str], owner: tp.Optional[str]
+    ) -> tp.Dict[str, str]:
+        """Pin all files in one request. Files are addressed as paths in the directory root hash."""
+        root_hash = await self.executor.async_run(_get_directory_cid, dirname, file_names)
+        if await self._is_pinned(root_hash):
+            _LOGGER.debug(f"Directory {dirname} is already pinned with hash {root_hash}")
+            self.pin_ledger.add_reference(root_hash, owner)
+            return {file: f"{root_hash}/{file}" for file in file_names}
+        opened_files = []
+        try:
+            for file in file_names:
+                f = await self.executor.async_run(open, f"{dirname}/{file}", "rb")
+                opened_files.append((file, f))
+            pinned_hash = await self.backend.pin_directory(opened_files, IPFS_PROBLEM_REPORT_FOLDER)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            _LOGGER.error(f"Can't pin {dirname} with exception: {e}")
+            return {}
+        finally:
+            for _, f in opened_files:
+                await self.executor.async_run(f.close)
+        root_hash = self._handle_pinned_hash(pinned_hash, dirname, root_hash, owner)
+        if root_hash is None:
+            return {}
+        return {file: f"{root_hash}/{file}" for file in file_names}
+
+    async def _pin_file(
+        self, path_to_file: str, file: str, owner: tp.Optional[str]
+    ) -> tp.Optional[str]:
+        local_hash = await self.executor.async_run(_get_file_cid, path_to_file)
+        if await self._is_pinned(local_hash):
+            _LOGGER.debug(f"File {file} is already pinned with hash {local_hash}")
+            self.pin_ledger.add_reference(local_hash, owner)
+            return local_hash
+        async with self._upload_semaphore:
+            f = await self.executor.async_run(open, path_to_file, "rb")
+            try:
+                pinned_hash = await self.backend.pin(file, f)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                _LOGGER.error(f"Can't pin {file} with exception: {e}")
+                return None
+            finally:
+                await self.executor.async_run(f.close)
+        return self._handle_pinned_hash(pinned_hash, file, local_hash, owner)
+
+    async def _is_pinned(self, ipfs_hash: str) -> bool:
+        """Check the ledger and make sure the backend still has the pin."""
+        if not self.pin_ledger.is_pinned(ipfs_hash):
+            return False
+        try:
+            if await self.backend.exists(ipfs_hash):
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            _LOGGER.warning(f"Can't check pin {ipfs_hash} with exception: {e}")
+            return False
+        _LOGGER.debug(f"Pin {ipfs_hash} is in the ledger, but not in the storage, pin again")
+        return False
+
+    def _handle_pinned_hash(
+        self, ipfs_hash: tp.Optional[str], file: str, local_hash: str, owner: tp.Optional[str]
+    ) -> tp.Optional[str]:
+        if ipfs_hash:
+            _LOGGER.debug(f"Added {file} to storage. Hash is: {ipfs_hash}")
+            if ipfs_hash != local_hash:
+                _LOGGER.warning(f"Locally computed hash {local_hash} of {file} differs from storage hash {ipfs_hash}")
+            self.pin_ledger.add_reference(ipfs_hash, owner)
+            return ipfs_hash
+
+    async def _unpin_files(
+        self, ipfs_hashes_dict: tp.Dict, owner: tp.Optional[str], retention: float
+    ) -> None:
         _LOGGER.debug(f"Start removing pins: {ipfs_hashes_dict}")
-        for key in ipfs_hashes_dict:
-            current_hash: str = ipfs_hashes_dict[key]
-            if isinstance(current_hash, str) and current_hash.startswith("Qm"):
-                res = pinata.remove_pin_from_ipfs(current_hash)
-                _LOGGER.debug(f"Remove response for pin {current_hash}: {res}")
+        for current_hash in _get_root_hashes(ipfs_hashes_dict):
+            if self.pin_ledger.remove_reference(current_hash, owner, retention):
+                await self._remove_pin(current_hash)
+
+    async def _remove_pin(self, ipfs_hash: str) -> None:
+        try:
+            removed = await self.backend.unpin(ipfs_hash)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            _LOGGER.warning(f"Can't remove pin {ipfs_hash} with exception: {e}")
+            removed = False
+        if self.pin_ledger.is_unpinnable(ipfs_hash):
+            if removed:
+                self.pin_ledger.remove(ipfs_hash)
+            else:
+                self.pin_ledger.mark_failed(ipfs_hash)
+        elif removed:
+            # Referenced while the request was running. The entry is kept for the new owner,
+            # the next pin of the content checks the storage and pins it again
+            _LOGGER.warning(f"Pin {ipfs_hash} was referenced while it was removed")
+
+
+def _get_root_hashes(ipfs_hashes_dict: tp.Dict) -> tp.List[str]:
+    root_hashes = []
+    for key in ipfs_hashes_dict:
+        current_hash: str = ipfs_hashes_dict[key]
+        if isinstance(current_hash, str) and current_hash.startswith("Qm"):
+            # Files pinned in directory mode are paths in the directory root hash
+            root_hash = current_hash.split("/")[0]
+            if root_hash not in root_hashes:
+                root_hashes.append(root_hash)
+    return root_hashes
+
+
+def _get_file_names(dirname: str) -> tp.List[str]:
+    return [
+        f
+        for f in os.listdir(dirname)
+        if os.path.isfile(os.path.join(dirname, f))
+    ]
+
+
+def _get_file_cid(path_to_file: str) -> str:
+    with open(path_to_file, "rb") as f:
+        return compute_file_cid(f.read())
+
+
+def _get_directory_cid(dirname: str, file_names: tp.List[str]) -> str:
+    files = {}
+    for file in file_names:
+        with open(f"{dirname}/{file}", "rb") as f:
+            files[file] = f.read()
+    return compute_directory_cid(files)
+
+
+def create_storage_backend(hass: HomeAssistant, backend_type: str, kubo_url: str) -> StorageBackend:
+    if backend_type == STORAGE_BACKEND_KUBO:
+        return KuboBackend(hass, kubo_url)
+    if backend_type == STORAGE_BACKEND_LOCAL:
+        return LocalBackend(hass, hass.config.path(LOCAL_STORAGE_PATH))
+    return PinataBackend(hass)
+
+
+def get_ipfs(hass: HomeAssistant) -> IPFS:
+    """Return the IPFS client shared by the integration."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if IPFS_CLIENT not in domain_data:
+        backend = create_storage_backend(
+            hass,
+            domain_data.get(CONF_STORAGE_BACKEND, STORAGE_BACKEND_PINATA),
+            domain_data.get(CONF_KUBO_URL, DEFAULT_KUBO_URL),
+        )
+        _LOGGER.debug(f"Storage backend: {type(backend).__name__}")
+        domain_data[IPFS_CLIENT] = IPFS(hass, backend)
+    return domain_data[IPFS_CLIENT]
@@ -1,11 +1,12 @@
 import logging
 import typing as tp
 import asyncio
-import json
-from copy import deepcopy
+from functools import partial
+from uuid import uuid4
 
 from homeassistant.core import HomeAssistant
 from .pyproxy import Libp2pProxyAPI
+from .pyproxy.utils.websocket import KeepAlive
 from homeassistant.exceptions import HomeAssistantError
 
 from .const import (
@@ -14,6 +15,17 @@ from .const import (
     PROBLEM_SERVICE_ROBONOMICS_ADDRESS,
     CONF_EMAIL,
     DOMAIN,
+    LIBP2P_REQUEST_TIMEOUT,
+    LIBP2P_PING_INTERVAL,
+    LIBP2P_PING_TIMEOUT,
+    LIBP2P_IDLE_TIMEOUT,
+    LIBP2P_RECONNECT_DELAY,
+    LIBP2P_MAX_RECONNECT_DELAY,
+    LIBP2P_SEND_BUFFER_SIZE,
+    LIBP2P_SEND_BUFFER_BYTES,
+    LIBP2P_MAX_CONCURRENT_CALLBACKS,
+    LIBP2P_SUBSCRIPTION_DEBOUNCE,
+    LIBP2P_REPORT_SUBSCRIPTION_LINGER,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -28,7 +40,22 @@ class LibP2PConnectionException(HomeAssistantError):
 class LibP2P:
     def __init__(self, hass_address: str) -> None:
         self._hass_address = hass_address
-        self._libp2p_proxy = Libp2pProxyAPI(LIBP2P_WS_SERVER)
+        self._libp2p_proxy = Libp2pProxyAPI(
+            LIBP2P_WS_SERVER,
+            keep_alive=KeepAlive(
+                LIBP2P_PING_INTERVAL,
+                LIBP2P_PING_TIMEOUT,
+                LIBP2P_IDLE_TIMEOUT,
+                LIBP2P_RECONNECT_DELAY,
+                LIBP2P_MAX_RECONNECT_DELAY,
+                LIBP2P_SEND_BUFFER_SIZE,
+                LIBP2P_SUBSCRIPTION_DEBOUNCE,
+                LIBP2P_SEND_BUFFER_BYTES,
+            ),
+            max_concurrent_callbacks=LIBP2P_MAX_CONCURRENT_CALLBACKS,
+            # Reports go in binary frames if the proxy accepts them and text frames otherwise
+            binary_frames=True,
+        )
         self._init_instanse = LibP2PInitialization(self._libp2p_proxy, self._hass_address)
         self._report_instanse = LibP2PReports(self._libp2p_proxy, self._hass_address)
 
@@ -46,6 +73,7 @@ class LibP2P:
 
     async def disconnect(self) -> None:
         _LOGGER.debug("Start disconnect from libp2p")
+        self._report_instanse.close()
         await self._libp2p_proxy.unsubscribe_from_all_protocols()
         _LOGGER.debug("Finish disconnect from libp2p")
 
@@ -62,13 +90,15 @@ class LibP2PReports:
         self._handle_report_response: tp.Awaitable = None
         self._wait_for_response_count = 0
         self._subscribed_for_responses = False
+        self._unsubscribe_task: tp.Optional[asyncio.Task] = None
 
     async def send_report(self, report_data: dict, report_id: int) -> None:
         _LOGGER.debug(f"Start send report in libp2p with id: {report_id}")
         await self._subscribe_to_report_response_protocol()
         await asyncio.sleep(0)
         message = self._format_report_message(report_data, report_id)
-        _LOGGER.debug(f"Sending report using libp2p: {message}")
+        # The report is not logged, it can take megabytes
+        _LOGGER.debug(f"Sending report {report_id} using libp2p")
         await self._libp2p_proxy.send_msg_to_libp2p(
             message, LIBP2P_REPORT_PROTOCOL, server_peer_id=INTEGRATOR_PEER_ID
         )
@@ -76,33 +106,133 @@ class LibP2PReports:
     def register_report_handler(self, handler: tp.Awaitable) -> None:
         self._handle_report_response = handler
 
+    def close(self) -> None:
+        self._cancel_unsubscribe()
+
     async def _subscribe_to_report_response_protocol(self) -> None:
         _LOGGER.debug("Subscribe to report responce protocol")
         self._wait_for_response_count += 1
+        self._cancel_unsubscribe()
         _LOGGER.debug(f"Wait for responces reports in subscribe: {self._wait_for_response_count}, _subscribed_for_responses: {self._subscribed_for_responses}")
         if not self._subscribed_for_responses:
             await self._libp2p_proxy.subscribe_to_protocol_async(
                 f"{LIBP2P_REPORT_PROTOCOL}/{self._hass_address}", self._handle_report_response_message, reconnect=False
             )
-            while not self._libp2p_proxy.ws_client.is_listening:
-                await asyncio.sleep(1)
             self._subscribed_for_responses = True
             _LOGGER.debug("Subscribed to report responce protocol")
 
     async def _handle_report_response_message(self, received_data: tp.Union[str, dict]):
         _LOGGER.debug(f"Libp2p report response: {received_data}")
         self._wait_for_response_count -= 1
-        _LOGGER.debug(f"Wait for responces reports: {self._wait_for_response_count}")
+        _LOGGER.debug(f"Wait for responces reports: {self._wait_for_response_count}, callbacks: {self._libp2p_proxy.callback_stats()}")
         if self._wait_for_response_count == 0:
-            self._subscribed_for_responses = False
-            await self._libp2p_proxy.unsubscribe_from_protocol(f"{LIBP2P_REPORT_PROTOCOL}/{self._hass_address}")
+            # Keep the subscription for a while, the next report is likely to come soon
+            self._cancel_unsubscribe()
+            self._unsubscribe_task = asyncio.create_task(self._unsubscribe_from_report_response_protocol())
         if "datalog" in received_data and "id" in received_data:
             await self._handle_report_response(received_data["id"], received_data)
         else:
             _LOGGER.error(f"Libp2p message in wrong format: {received_data}")
 
-    def _format_report_message(self, report_data: dict, report_id: int) -> str:
-        return json.dumps({"report": report_data, "address": self._hass_address, "id": report_id})
+    async def _unsubscribe_from_report_response_protocol(self) -> None:
+        await asyncio.sleep(LIBP2P_REPORT_SUBSCRIPTION_LINGER)
+        # Not cancelled from here, the task is done with the unsubscribing
+        self._unsubscribe_task = None
+        if self._wait_for_response_count == 0 and self._subscribed_for_responses:
+            _LOGGER.debug("Unsubscribe from report responce protocol")
+            self._subscribed_for_responses = False
+            await self._libp2p_proxy.unsubscribe_from_protocol(f"{LIBP2P_REPORT_PROTOCOL}/{self._hass_address}")
+
+    def _cancel_unsubscribe(self) -> None:
+        if self._unsubscribe_task is not None:
+            self._unsubscribe_task.cancel()
+            self._unsubscribe_task = None
+
+    def _format_report_message(self, report_data: dict, report_id: int) -> dict:
+        return {"report": report_data, "address": self._hass_address, "id": report_id}
+
+
+class LibP2PRPC:
+    """Request/response calls over the libp2p proxy.
+
+    Each request gets a ``request_id`` and waits for its own future, so several requests
+    can be in flight at once. Responses come on ``<protocol>/<hass address>``. A response
+    without a known ``request_id`` resolves the oldest request sent with the protocol.
+    """
+
+    def __init__(self, libp2p_proxy: Libp2pProxyAPI, hass_address: str) -> None:
+        self._hass_address = hass_address
+        self._libp2p_proxy = libp2p_proxy
+        self._pending: tp.Dict[str, tp.Tuple[str, asyncio.Future]] = {}
+        self._subscribed_protocols: tp.Set[str] = set()
+
+    async def request(
+        self, data: dict, protocol: str, timeout: tp.Optional[float] = LIBP2P_REQUEST_TIMEOUT
+    ) -> dict:
+        """Send the request and wait for the response.
+
+        :param data: Request data.
+        :param protocol: Protocol to send the request to.
+        :param timeout: Time in seconds to wait for the response, None to wait without limit.
+
+        :return: Response data.
+        """
+        request_id = uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (protocol, future)
+        try:
+            await self._subscribe_for_responses(protocol)
+            message = {**data, "request_id": request_id}
+            _LOGGER.debug("Sending request to LibP2P: %s", message)
+            await self._libp2p_proxy.send_msg_to_libp2p(message, protocol, server_peer_id=INTEGRATOR_PEER_ID)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            _LOGGER.warning(f"No response for LibP2P request {request_id} in {timeout} seconds")
+            raise LibP2PConnectionException
+        finally:
+            self._pending.pop(request_id, None)
+
+    def fail_pending(self, exception: Exception) -> None:
+        """Fail all requests waiting for responses."""
+        for _, future in self._pending.values():
+            if not future.done():
+                future.set_exception(exception)
+
+    async def close_protocol(self, protocol: str) -> None:
+        """Stop receiving responses for the protocol."""
+        if protocol in self._subscribed_protocols:
+            self._subscribed_protocols.discard(protocol)
+            await self._libp2p_proxy.unsubscribe_from_protocol(f"{protocol}/{self._hass_address}")
+
+    async def _subscribe_for_responses(self, protocol: str) -> None:
+        if protocol not in self._subscribed_protocols:
+            await self._libp2p_proxy.subscribe_to_protocol_async(
+                f"{protocol}/{self._hass_address}",
+                partial(self._handle_response, protocol),
+                reconnect=True,
+                # Responses resolve their own futures, so they don't wait for each other
+                ordered=False,
+            )
+            self._subscribed_protocols.add(protocol)
+
+    async def _handle_response(self, protocol: str, received_data: tp.Union[str, dict]) -> None:
+        _LOGGER.debug("Received LibP2P response: %s", received_data)
+        request_id = received_data.get("request_id") if isinstance(received_data, dict) else None
+        if request_id not in self._pending:
+            request_id = next(
+                (
+                    pending_id
+                    for pending_id, (pending_protocol, future) in self._pending.items()
+                    if pending_protocol == protocol and not future.done()
+                ),
+                None,
+            )
+        if request_id is None:
+            _LOGGER.warning("LibP2P response for unknown request: %s", received_data)
+            return
+        _, future = self._pending[request_id]
+        if not future.done():
+            future.set_result(received_data)
 
 
 class LibP2PInitialization:
@@ -111,13 +241,11 @@ class LibP2PInitialization:
     def __init__(self, libp2p_proxy: Libp2pProxyAPI, hass_address: str) -> None:
         self._hass_address = hass_address
         self._libp2p_proxy = libp2p_proxy
-        self._common_resp_received = False
-        self._common_resp = None
-        self._err_feedback = False
+        self._rpc = LibP2PRPC(libp2p_proxy, hass_address)
 
     async def get_integrator_address(self) -> str | None:
         await self._subscribe_to_feedback_protocol()
-        res = await self._send_request_and_wait_for_response(
+        res = await self._rpc.request(
             self._format_data_for_init_request_address(), LIBP2P_INITILIZATION_PROTOCOL
         )
         if "integrator_address" in res:
@@ -127,33 +255,18 @@ class LibP2PInitialization:
             return None
 
     async def get_pinata_creds(self, encrypted_email: str) -> dict:
-        res = await self._send_request_and_wait_for_response(
-            self._format_data_for_init_request_pinata(encrypted_email), LIBP2P_INITILIZATION_PROTOCOL
-        )
+        try:
+            # Credentials are sent after the subscription is paid, so there is no time limit
+            res = await self._rpc.request(
+                self._format_data_for_init_request_pinata(encrypted_email), LIBP2P_INITILIZATION_PROTOCOL, timeout=None
+            )
+        finally:
+            await self._rpc.close_protocol(LIBP2P_INITILIZATION_PROTOCOL)
         if not ("public" in res and "private" in res):
             _LOGGER.error("Pinata creds not received, message is in wrong format: %s", res)
             res = {}
-        await self._libp2p_proxy.unsubscribe_from_protocol(f"{LIBP2P_INITILIZATION_PROTOCOL}/{self._hass_address}")
         return res
 
-    async def _send_request_and_wait_for_response(self, data: str, protocol: str) -> dict:
-        self._common_resp_received = False
-        self._common_resp = None
-        await self._libp2p_proxy.subscribe_to_protocol_async(
-            f"{protocol}/{self._hass_address}", self._common_request_callback, reconnect=True
-        )
-        _LOGGER.debug("Sending request to LibP2P: %s", data)
-        await self._libp2p_proxy.send_msg_to_libp2p(data, protocol, server_peer_id=INTEGRATOR_PEER_ID)
-        while not self._common_resp_received:
-            if self._err_feedback:
-                self._err_feedback = False
-                raise LibP2PConnectionException
-            await asyncio.sleep(1)
-        self._common_resp_received = False
-        resp = deepcopy(self._common_resp)
-        self._common_resp = None
-        return resp
-
     async def _subscribe_to_feedback_protocol(self) -> None:
         await self._libp2p_proxy.subscribe_to_protocol_async(
             LIBP2P_LISTEN_ERRORS_PROTOCOL, self._handle_libp2p_feedback, reconnect=False
@@ -164,23 +277,16 @@ class LibP2PInitialization:
             f"Libp2p feedback on initialisation: {received_data}"
         )
         if received_data["feedback"] != "ok":
-            self._err_feedback = True
+            self._rpc.fail_pending(LibP2PConnectionException())
         await self._libp2p_proxy.unsubscribe_from_protocol(LIBP2P_LISTEN_ERRORS_PROTOCOL)
 
-    async def _common_request_callback(self, received_data: tp.Union[str, dict]):
-        _LOGGER.debug("Received LibP2P response: %s", received_data)
-        self._common_resp = received_data
-        self._common_resp_received = True
-
-    def _format_data_for_init_request_pinata(self, encrypted_email: str) -> str:
-        data = {
+    def _format_data_for_init_request_pinata(self, encrypted_email: str) -> dict:
+        return {
             "email": encrypted_email,
             "address": self._hass_address,
         }
-        return json.dumps(data)
 
-    def _format_data_for_init_request_address(self) -> str:
-        data = {
+    def _format_data_for_init_request_address(self) -> dict:
+        return {
             "new_client": self._hass_address,
         }
-        return json.dumps(data)
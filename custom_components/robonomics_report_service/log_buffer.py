@@ -0,0 +1,59 @@
+import logging
+import typing as tp
+from collections import deque
+
+LOG_FORMAT = "%(asctime)s %(levelname)s (%(threadName)s) [%(name)s] %(message)s"
+
+
+class RingBufferLogHandler(logging.Handler):
+    """Logging handler which keeps the most recent formatted records in memory.
+
+    Records are stored as UTF-8 encoded lines and the oldest ones are dropped
+    once the total size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int, level: int = logging.NOTSET) -> None:
+        """
+        :param max_bytes: Maximum size of the stored records in bytes.
+        :param level: Minimum level of the records to store.
+        """
+        super().__init__(level)
+        self.max_bytes: int = max_bytes
+        self._records: tp.Deque[bytes] = deque()
+        self._size: int = 0
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    @property
+    def size(self) -> int:
+        """Size of the stored records in bytes."""
+        return self._size
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = self.format(record).encode("utf-8", errors="replace") + b"\n"
+        except Exception:
+            self.handleError(record)
+            return
+        if len(line) > self.max_bytes:
+            line = line[-self.max_bytes:]
+        self._records.append(line)
+        self._size += len(line)
+        while self._size > self.max_bytes:
+            self._size -= len(self._records.popleft())
+
+    def snapshot(self) -> str:
+        """Return the stored records as a single text, oldest first."""
+        self.acquire()
+        try:
+            data = b"".join(self._records)
+        finally:
+            self.release()
+        return data.decode("utf-8", errors="replace")
+
+    def clear(self) -> None:
+        self.acquire()
+        try:
+            self._records.clear()
+            self._size = 0
+        finally:
+            self.release()
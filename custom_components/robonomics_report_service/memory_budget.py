@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import time
+import typing as tp
+from contextlib import asynccontextmanager
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ReportMemoryBudget:
+    """Byte-budget semaphore for the memory held by concurrent report builds.
+
+    A build is admitted only while its estimated peak memory fits into the free
+    part of the budget. A build larger than the whole budget is admitted alone.
+    """
+
+    def __init__(self, budget_bytes: int) -> None:
+        self.budget_bytes: int = budget_bytes
+        self._bytes_in_use: int = 0
+        self._peak_bytes: int = 0
+        self._waiting: int = 0
+        self._last_wait_time: float = 0.0
+        self._total_wait_time: float = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def bytes_in_use(self) -> int:
+        return self._bytes_in_use
+
+    @property
+    def peak_bytes(self) -> int:
+        return self._peak_bytes
+
+    @property
+    def waiting(self) -> int:
+        return self._waiting
+
+    @property
+    def last_wait_time(self) -> float:
+        return self._last_wait_time
+
+    @property
+    def total_wait_time(self) -> float:
+        return self._total_wait_time
+
+    def stats(self) -> tp.Dict[str, tp.Union[int, float]]:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "bytes_in_use": self._bytes_in_use,
+            "peak_bytes": self._peak_bytes,
+            "waiting": self._waiting,
+            "last_wait_time": self._last_wait_time,
+            "total_wait_time": self._total_wait_time,
+        }
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> tp.AsyncIterator[None]:
+        """Hold ``nbytes`` of the budget for the duration of the block.
+
+        :param nbytes: Estimated peak memory of the build in bytes.
+        """
+        nbytes = min(max(nbytes, 0), self.budget_bytes)
+        await self._acquire(nbytes)
+        try:
+            yield
+        finally:
+            await self._release(nbytes)
+
+    async def _acquire(self, nbytes: int) -> None:
+        start = time.monotonic()
+        async with self._condition:
+            self._waiting += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: self._bytes_in_use + nbytes <= self.budget_bytes
+                )
+            finally:
+                self._waiting -= 1
+            self._bytes_in_use += nbytes
+            self._peak_bytes = max(self._peak_bytes, self._bytes_in_use)
+        self._last_wait_time = time.monotonic() - start
+        self._total_wait_time += self._last_wait_time
+        _LOGGER.debug(
+            f"Reserved {nbytes} bytes for report build after {self._last_wait_time:.3f}s, memory budget: {self.stats()}"
+        )
+
+    async def _release(self, nbytes: int) -> None:
+        async with self._condition:
+            self._bytes_in_use -= nbytes
+            self._condition.notify_all()
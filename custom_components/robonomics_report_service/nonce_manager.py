@@ -0,0 +1,34 @@
+import logging
+import threading
+import typing as tp
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class NonceManager:
+    """Assigns account nonces locally, so extrinsics are submitted without waiting for the previous ones.
+
+    The nonce is fetched from the chain on first use and after ``resync``, which must be
+    called when the local nonce may be out of sync with the chain.
+    """
+
+    def __init__(self) -> None:
+        self._next_nonce: tp.Optional[int] = None
+        self._lock = threading.Lock()
+
+    def next(self, fetch_nonce: tp.Callable[[], int]) -> int:
+        """Return the nonce for the next extrinsic.
+
+        :param fetch_nonce: Function returning the next nonce of the account from the chain.
+        """
+        with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = fetch_nonce()
+                _LOGGER.debug(f"Nonce synced from the chain: {self._next_nonce}")
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def resync(self) -> None:
+        with self._lock:
+            self._next_nonce = None
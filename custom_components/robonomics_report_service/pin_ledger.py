@@ -0,0 +1,154 @@
+import logging
+import time
+import typing as tp
+
+from homeassistant.core import HomeAssistant
+
+from homeassistant.helpers.storage import Store
+
+from .const import STORAGE_PINS, PIN_MAX_AGE, PIN_COMMITTED_MAX_AGE, PIN_LEDGER_SAVE_DELAY
+from .utils import _get_store_for_key
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PinState:
+    Live = "live" # Referenced by reports which are in progress
+    Committed = "committed" # Recorded in a datalog, never unpinned, forgotten when not used for long
+    Expired = "expired" # Not referenced anymore, waits for unpinning
+    Failed = "failed" # Unpinning failed, will be retried
+
+
+class PinLedger:
+    """Persisted ledger of pinned CIDs with the reports owning them and their state.
+
+    Every entry looks like ``{"owners": [...], "state": ..., "expires": ..., "updated": ...}``.
+    Live entries without owners or older than ``PIN_MAX_AGE`` become expired. Committed
+    entries not used for ``PIN_COMMITTED_MAX_AGE`` are forgotten, the pins stay in the storage.
+    The ledger belongs to one storage, it starts empty if the stored one was kept for another.
+    """
+
+    def __init__(self, hass: HomeAssistant, storage_id: str = "") -> None:
+        """
+        :param storage_id: Id of the storage the pins are kept in.
+        """
+        self.hass = hass
+        self.storage_id = storage_id
+        self._pins: tp.Optional[tp.Dict[str, dict]] = None
+        self._store: tp.Optional[Store] = None
+
+    async def async_load(self) -> None:
+        if self._pins is None:
+            data = await self._get_store().async_load() or {}
+            if data.get("storage") == self.storage_id:
+                self._pins = data.get("pins", {})
+            else:
+                if data:
+                    _LOGGER.debug(f"Pins ledger of storage {data.get('storage')} is dropped, storage: {self.storage_id}")
+                self._pins = {}
+
+    def save(self) -> None:
+        """Schedule writing the ledger, changes made in ``PIN_LEDGER_SAVE_DELAY`` are written at once."""
+        self._get_store().async_delay_save(self._data_to_save, PIN_LEDGER_SAVE_DELAY)
+
+    def reset(self) -> None:
+        """Forget all pins, e.g. when they were made with credentials which can't be used anymore."""
+        _LOGGER.debug(f"Pins ledger is reset, pins: {self.stats()}")
+        self._pins = {}
+
+    def is_pinned(self, cid: str) -> bool:
+        return cid in self._pins
+
+    def add_reference(self, cid: str, owner: tp.Optional[str] = None) -> None:
+        entry = self._pins.setdefault(cid, {"owners": [], "state": PinState.Live})
+        entry["owners"].append(owner)
+        if entry["state"] != PinState.Committed:
+            entry["state"] = PinState.Live
+        self._touch(entry)
+        _LOGGER.debug(f"Pin {cid} is owned by {entry['owners']}")
+
+    def remove_reference(self, cid: str, owner: tp.Optional[str] = None, retention: float = 0) -> bool:
+        """Remove one reference to the CID.
+
+        :param cid: Pinned CID.
+        :param owner: Report owning the reference, the oldest reference is removed if not set.
+        :param retention: Time in seconds to keep the pin after the last reference is removed.
+
+        :return: True if there are no references left and the CID can be unpinned now.
+        """
+        entry = self._pins.get(cid)
+        if entry is None:
+            return True
+        if owner in entry["owners"]:
+            entry["owners"].remove(owner)
+        elif entry["owners"]:
+            entry["owners"].pop(0)
+        self._touch(entry)
+        if entry["owners"] or entry["state"] == PinState.Committed:
+            _LOGGER.debug(f"Pin {cid} is kept with state {entry['state']}, owners: {entry['owners']}")
+            return False
+        entry["state"] = PinState.Expired
+        entry["expires"] = time.time() + retention
+        return retention <= 0
+
+    def commit(self, cid: str) -> None:
+        """Mark the CID as recorded in a datalog, so it is never unpinned."""
+        entry = self._pins.setdefault(cid, {"owners": []})
+        entry["state"] = PinState.Committed
+        self._touch(entry)
+
+    def is_unpinnable(self, cid: str) -> bool:
+        """Check that the CID is still expired or failed and nobody references it again."""
+        entry = self._pins.get(cid)
+        return (
+            entry is not None
+            and entry["state"] in (PinState.Expired, PinState.Failed)
+            and not entry["owners"]
+        )
+
+    def remove(self, cid: str) -> None:
+        """Forget the CID after it was unpinned."""
+        self._pins.pop(cid, None)
+
+    def mark_failed(self, cid: str) -> None:
+        if cid in self._pins:
+            self._pins[cid]["state"] = PinState.Failed
+            self._touch(self._pins[cid])
+
+    def get_expired(self, limit: int) -> tp.List[str]:
+        """Return up to ``limit`` CIDs to unpin, the ones waiting the longest first.
+
+        Committed entries not used for ``PIN_COMMITTED_MAX_AGE`` are dropped on the way.
+        """
+        now = time.time()
+        expired = []
+        for cid, entry in list(self._pins.items()):
+            if entry["state"] == PinState.Committed and now - entry["updated"] > PIN_COMMITTED_MAX_AGE:
+                del self._pins[cid]
+                continue
+            if entry["state"] == PinState.Live and now - entry["updated"] > PIN_MAX_AGE:
+                _LOGGER.debug(f"Pin {cid} of reports {entry['owners']} has no response, expiring")
+                entry["state"] = PinState.Expired
+                entry["expires"] = now
+            if entry["state"] in (PinState.Expired, PinState.Failed) and entry.get("expires", 0) <= now:
+                expired.append(cid)
+        expired.sort(key=lambda cid: self._pins[cid].get("expires", 0))
+        return expired[:limit]
+
+    def stats(self) -> tp.Dict[str, int]:
+        """Number of pins in each state."""
+        stats = {PinState.Live: 0, PinState.Committed: 0, PinState.Expired: 0, PinState.Failed: 0}
+        for entry in (self._pins or {}).values():
+            stats[entry["state"]] += 1
+        return stats
+
+    def _get_store(self) -> Store:
+        if self._store is None:
+            self._store = _get_store_for_key(self.hass, STORAGE_PINS)
+        return self._store
+
+    def _data_to_save(self) -> dict:
+        return {"storage": self.storage_id, "pins": self._pins}
+
+    def _touch(self, entry: dict) -> None:
+        entry["updated"] = time.time()
@@ -0,0 +1,124 @@
+import logging
+import typing as tp
+
+import aiohttp
+from homeassistant.exceptions import HomeAssistantError
+
+_LOGGER = logging.getLogger(__name__)
+
+PINATA_API_URL = "https://api.pinata.cloud"
+PINATA_UPLOAD_TIMEOUT = 300 # Seconds
+PINATA_REQUEST_TIMEOUT = 30 # Seconds
+PINATA_CONNECT_TIMEOUT = 10 # Seconds
+
+
+class PinataKeysRewoked(HomeAssistantError):
+    """Pinata API Key has been revoked"""
+
+
+class PinataClient:
+    """Asyncio Pinata API client working on a shared aiohttp session.
+
+    Responses have the same format as in PinataPy: the response json on success
+    and a dict with ``status`` and ``text`` of the response otherwise.
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        api_key: str,
+        secret_api_key: str,
+        base_url: str = PINATA_API_URL,
+    ) -> None:
+        """
+        :param session: aiohttp session to send requests with, e.g. HA shared session.
+        :param api_key: Pinata public API key.
+        :param secret_api_key: Pinata secret API key.
+        :param base_url: Pinata API URL.
+        """
+        self._session = session
+        self._base_url = base_url.rstrip("/")
+        self._headers = {
+            "pinata_api_key": api_key,
+            "pinata_secret_api_key": secret_api_key,
+        }
+
+    async def pin_file_to_ipfs(
+        self, content: tp.Union[bytes, tp.BinaryIO], filename: str
+    ) -> tp.Dict[str, tp.Any]:
+        """Pin one file. File objects are streamed, not loaded into memory.
+
+        :param content: File content or a file object opened in binary mode.
+        :param filename: Name of the file on Pinata.
+
+        :return: Pinata response with ``IpfsHash`` on success.
+        """
+        form = aiohttp.FormData()
+        form.add_field("file", content, filename=filename, content_type="application/octet-stream")
+        return await self._request(
+            "POST", "/pinning/pinFileToIPFS", PINATA_UPLOAD_TIMEOUT, data=form
+        )
+
+    async def pin_directory_to_ipfs(
+        self, files: tp.List[tp.Tuple[str, tp.Union[bytes, tp.BinaryIO]]], dirname: str
+    ) -> tp.Dict[str, tp.Any]:
+        """Pin files as one directory in a single request.
+
+        :param files: Pairs of file name and file content or file object.
+        :param dirname: Name of the directory on Pinata.
+
+        :return: Pinata response with ``IpfsHash`` of the directory on success.
+        """
+        # Pinata builds the directory from raw slashes in file names
+        form = aiohttp.FormData(quote_fields=False)
+        for filename, content in files:
+            form.add_field(
+                "file", content, filename=f"{dirname}/{filename}", content_type="application/octet-stream"
+            )
+        return await self._request(
+            "POST", "/pinning/pinFileToIPFS", PINATA_UPLOAD_TIMEOUT, data=form
+        )
+
+    async def remove_pin_from_ipfs(self, ipfs_hash: str) -> tp.Dict[str, tp.Any]:
+        """Unpin the hash.
+
+        :param ipfs_hash: Hash to unpin.
+
+        :return: Pinata response.
+        """
+        return await self._request(
+            "DELETE", f"/pinning/unpin/{ipfs_hash}", PINATA_REQUEST_TIMEOUT
+        )
+
+    async def pin_list(self, ipfs_hash: str) -> tp.Dict[str, tp.Any]:
+        """List active pins with the hash.
+
+        :param ipfs_hash: Hash to look for.
+
+        :return: Pinata response with ``count`` of found pins.
+        """
+        return await self._request(
+            "GET",
+            "/data/pinList",
+            PINATA_REQUEST_TIMEOUT,
+            params={"hashContains": ipfs_hash, "status": "pinned"},
+        )
+
+    async def _request(
+        self, method: str, path: str, timeout: float, **kwargs
+    ) -> tp.Dict[str, tp.Any]:
+        client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=PINATA_CONNECT_TIMEOUT)
+        async with self._session.request(
+            method,
+            f"{self._base_url}{path}",
+            headers=self._headers,
+            timeout=client_timeout,
+            **kwargs,
+        ) as response:
+            text = await response.text()
+            if response.status == 200:
+                try:
+                    return await response.json(content_type=None)
+                except ValueError:
+                    return {"status": response.status, "text": text}
+            return {"status": response.status, "text": text}
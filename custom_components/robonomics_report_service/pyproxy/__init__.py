@@ -1,62 +1,99 @@
 import typing as tp
-from .utils.websocket import WebsocketClient
-from .utils.message import format_msg_to_libp2p
+from .utils.websocket import WebsocketClient, KeepAlive
+from .utils.message import encode_msg_to_libp2p
 from .utils.protocols_manager import ProtocolsManager, Callback, CallbackTypes
 
 
 class Libp2pProxyAPI:
     """A libp2p-proxy client object"""
 
-    def __init__(self, proxy_server_url: str, peer_id_callback: tp.Optional[tp.Callable] = None) -> None:
+    def __init__(
+        self,
+        proxy_server_url: str,
+        peer_id_callback: tp.Optional[tp.Callable] = None,
+        keep_alive: tp.Optional[KeepAlive] = None,
+        max_concurrent_callbacks: int = 10,
+        binary_frames: bool = False,
+        compression: bool = True,
+    ) -> None:
         """
         :param proxy_server_url: URL to the proxy server to connect.
         :param peer_id_callback: Callback function for message with Libp2p peer id.
+        :param keep_alive: Settings of the persistent connection. Messages are buffered and sent in
+            background then, reconnecting when needed. If None, the connection is closed after each
+            message sent without listening.
+        :param max_concurrent_callbacks: Maximum number of protocol callbacks running at once.
+        :param binary_frames: Send messages in binary frames if the proxy accepts them, text frames are
+            used otherwise.
+        :param compression: Negotiate permessage-deflate, messages are not compressed if the proxy
+            doesn't support it.
         """
 
         self.protocols_manager = ProtocolsManager()
-        self.ws_client = WebsocketClient(self.protocols_manager, proxy_server_url, peer_id_callback)
-
-    async def subscribe_to_protocol_sync(self, protocol: str, callback: tp.Callable, reconnect: bool = False) -> None:
+        self.ws_client = WebsocketClient(
+            self.protocols_manager,
+            proxy_server_url,
+            peer_id_callback,
+            keep_alive,
+            max_concurrent_callbacks,
+            binary_frames,
+            compression,
+        )
+
+    async def subscribe_to_protocol_sync(
+        self, protocol: str, callback: tp.Callable, reconnect: bool = False, ordered: bool = True
+    ) -> None:
         """Synchronously subscribes to a protocol to get messages.
 
         :param protocol: Protocol to subscribe.
         :param callback: Callback function for the messages from the protocol.
         :param reconnect: True if needs to reconnect to the proxy server in case of failure.
+        :param ordered: True if messages must be handled one by one in the order received,
+            otherwise they are handled concurrently.
         """
         await self.ws_client.set_listener(reconnect=reconnect)
-        callback_obj = Callback(callback, CallbackTypes.SyncType)
+        callback_obj = Callback(callback, CallbackTypes.SyncType, ordered)
         self.protocols_manager.add_protocol(protocol, callback_obj)
         protocols = self.protocols_manager.get_protocols()
         await self.ws_client.send_msg_to_subscribe(protocols)
 
-    async def subscribe_to_protocol_async(self, protocol: str, callback: tp.Callable, reconnect: bool = False) -> None:
+    async def subscribe_to_protocol_async(
+        self, protocol: str, callback: tp.Callable, reconnect: bool = False, ordered: bool = True
+    ) -> None:
         """Asynchronously subscribes to a protocol to get messages.
 
         :param protocol: Protocol to subscribe.
         :param callback: Callback function for the messages from the protocol.
         :param reconnect: True if needs to reconnect to the proxy server in case of failure.
+        :param ordered: True if messages must be handled one by one in the order received,
+            otherwise they are handled concurrently.
         """
 
         await self.ws_client.set_listener(reconnect=reconnect)
-        callback_obj = Callback(callback, CallbackTypes.AsyncType)
+        callback_obj = Callback(callback, CallbackTypes.AsyncType, ordered)
         self.protocols_manager.add_protocol(protocol, callback_obj)
         protocols = self.protocols_manager.get_protocols()
         await self.ws_client.send_msg_to_subscribe(protocols)
 
     async def send_msg_to_libp2p(
-        self, data: str, protocol: str, server_peer_id: str = "", save_data: bool = False, reconnect: bool = False
+        self,
+        data: tp.Union[str, bytes, dict, list],
+        protocol: str,
+        server_peer_id: str = "",
+        save_data: bool = False,
+        reconnect: bool = False,
     ) -> None:
         """ Sends a message to the proxy server.
 
-        :param data: Data to send.
+        :param data: Data to send: structured data, pre-serialized JSON as bytes or a string.
         :param protocol: Protocol to which the message should be sent.
         :param server_peer_id: Peer id of the specific node to which the message should be sent. 
         :param save_data: Either should the data be saved on the proxy server or not.
         :param reconnect: True if needs to reconnect to the proxy server in case of failure.
         """
 
-        msg = format_msg_to_libp2p(data, protocol, server_peer_id, save_data)
-        await self.ws_client.send_msg(msg, reconnect=reconnect)
+        msg = encode_msg_to_libp2p(data, protocol, server_peer_id, save_data)
+        await self.ws_client.send_msg(msg, reconnect=reconnect, protocol=protocol)
 
     async def unsubscribe_from_protocol(self, protocol: str) -> None:
         """Unsubscribes from a protocol.
@@ -67,7 +104,7 @@ class Libp2pProxyAPI:
         self.protocols_manager.remove_protocol(protocol)
         protocols = self.protocols_manager.get_protocols()
         await self.ws_client.send_msg_to_subscribe(protocols)
-        if not protocols:
+        if not protocols and self.ws_client.keep_alive is None:
             await self.ws_client.close_connection()
 
     async def unsubscribe_from_all_protocols(self) -> None:
@@ -81,3 +118,7 @@ class Libp2pProxyAPI:
     def is_connected(self) -> bool:
         """Checks if the connection is alive"""
         return self.ws_client.websocket is not None
+
+    def callback_stats(self) -> tp.Dict[str, tp.Any]:
+        """Returns queue depth of received messages and latency of callbacks per protocol."""
+        return self.ws_client.dispatcher.stats()
@@ -0,0 +1,23 @@
+import random
+
+
+class Backoff:
+    """Capped exponential backoff with jitter.
+
+    Each delay is picked at random from the upper half of ``initial * factor ** attempt``
+    capped with ``maximum``, so clients which lost the connection at once don't reconnect at once.
+    """
+
+    def __init__(self, initial: float = 1, maximum: float = 60, factor: float = 2) -> None:
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        cap = min(self.maximum, self.initial * self.factor**self.attempts)
+        self.attempts += 1
+        return random.uniform(cap / 2, cap)
+
+    def reset(self) -> None:
+        self.attempts = 0
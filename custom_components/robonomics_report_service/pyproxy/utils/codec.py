@@ -0,0 +1,20 @@
+import json
+import typing as tp
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library is used without it
+    orjson = None
+
+
+def dumps(obj: tp.Any) -> bytes:
+    """Serialize the object to compact JSON."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: tp.Union[str, bytes]) -> tp.Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
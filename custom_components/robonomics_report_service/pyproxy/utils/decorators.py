@@ -2,6 +2,7 @@ import asyncio
 from functools import wraps
 import websockets
 from .logger import logger
+from .backoff import Backoff
 
 
 def set_websocket(func):
@@ -40,19 +41,21 @@ def set_websocket(func):
         return ws_client_instance.websocket is not None
 
     async def _reconnecting(ws_client_instance) -> None:
+        backoff = Backoff()
         while ws_client_instance.websocket is None:
             try:
                 ws_client_instance.websocket = await websockets.connect(
-                    ws_client_instance.proxy_server_url, ping_timeout=None
+                    ws_client_instance.proxy_server_url, **ws_client_instance.get_connect_kwargs()
                 )
             except Exception as e:
-                logger.warning(f"Websocket connection exception in decorator: {e}, reconnecting...")
-                await asyncio.sleep(5)
+                delay = backoff.next_delay()
+                logger.warning(f"Websocket connection exception in decorator: {e}, reconnecting in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
 
     async def _connect_once(ws_client_instance) -> None:
         try:
             ws_client_instance.websocket = await websockets.connect(
-                ws_client_instance.proxy_server_url, ping_timeout=None
+                ws_client_instance.proxy_server_url, **ws_client_instance.get_connect_kwargs()
             )
         except Exception as e:
             logger.error(f"Websocket connection exception in decorator: {e}, will not reconnect")
@@ -0,0 +1,98 @@
+import asyncio
+import time
+import typing as tp
+from collections import deque
+from .logger import logger
+from .protocols_manager import Callback, CallbackTypes
+
+
+class CallbackStats:
+    def __init__(self) -> None:
+        self.handled = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.total_wait_time = 0.0
+
+    def as_dict(self) -> tp.Dict[str, tp.Any]:
+        return {
+            "handled": self.handled,
+            "errors": self.errors,
+            "average_latency": self.total_latency / (self.handled or 1),
+            "max_latency": self.max_latency,
+            "average_wait_time": self.total_wait_time / (self.handled or 1),
+        }
+
+
+class CallbackDispatcher:
+    """Runs protocol callbacks in tasks, so a slow callback doesn't stop receiving messages.
+
+    Messages of an ordered protocol are handled one by one in the order they were received,
+    other messages are handled concurrently. At most ``max_concurrency`` callbacks run at once.
+    An exception in a callback is logged and doesn't affect other messages.
+    """
+
+    def __init__(self, max_concurrency: int = 10) -> None:
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._queues: tp.Dict[str, tp.Deque[tp.Tuple[Callback, tp.Any, float]]] = {}
+        self._workers: tp.Dict[str, asyncio.Task] = {}
+        self._tasks: tp.Set[asyncio.Task] = set()
+        self._stats: tp.Dict[str, CallbackStats] = {}
+        self._waiting = 0
+        self._running = 0
+
+    def dispatch(self, protocol: str, callback_obj: Callback, message: tp.Any) -> None:
+        self._waiting += 1
+        received = time.monotonic()
+        loop = asyncio.get_event_loop()
+        if callback_obj.ordered:
+            self._queues.setdefault(protocol, deque()).append((callback_obj, message, received))
+            worker = self._workers.get(protocol)
+            if worker is None or worker.done():
+                self._workers[protocol] = loop.create_task(self._drain(protocol))
+        else:
+            task = loop.create_task(self._run(protocol, callback_obj, message, received))
+            # Keep a reference till the task is done
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    @property
+    def queue_depth(self) -> int:
+        """Messages received, but not handled yet."""
+        return self._waiting
+
+    def stats(self) -> tp.Dict[str, tp.Any]:
+        return {
+            "queue_depth": self._waiting,
+            "running": self._running,
+            "protocols": {protocol: stats.as_dict() for protocol, stats in self._stats.items()},
+        }
+
+    async def _drain(self, protocol: str) -> None:
+        queue = self._queues[protocol]
+        while queue:
+            await self._run(protocol, *queue.popleft())
+        self._queues.pop(protocol, None)
+        self._workers.pop(protocol, None)
+
+    async def _run(self, protocol: str, callback_obj: Callback, message: tp.Any, received: float) -> None:
+        async with self._slots:
+            self._waiting -= 1
+            self._running += 1
+            stats = self._stats.setdefault(protocol, CallbackStats())
+            started = time.monotonic()
+            try:
+                if callback_obj.callback_type == CallbackTypes.AsyncType:
+                    await callback_obj.callback_function(message)
+                else:
+                    callback_obj.callback_function(message)
+            except Exception:
+                stats.errors += 1
+                logger.exception(f"Callback of protocol {protocol} failed")
+            finally:
+                latency = time.monotonic() - started
+                self._running -= 1
+                stats.handled += 1
+                stats.total_latency += latency
+                stats.max_latency = max(stats.max_latency, latency)
+                stats.total_wait_time += started - received
@@ -1,5 +1,6 @@
 import typing as tp
 import json
+from . import codec
 
 
 def format_msg_from_libp2p(message: dict) -> tp.Union[str, dict]:
@@ -7,18 +8,25 @@ def format_msg_from_libp2p(message: dict) -> tp.Union[str, dict]:
     return data
 
 
-def format_msg_to_libp2p(data: str, protocol: str, server_peer_id: str, save_data: bool) -> str:
-    try:
-        json_obj = json.loads(data)
-        message = {
-            "protocol": protocol,
-            "serverPeerId": server_peer_id,
-            "save_data": save_data,
-            "data": {"data": json_obj},
-        }
-    except json.decoder.JSONDecodeError:
-        message = {"protocol": protocol, "serverPeerId": server_peer_id, "save_data": save_data, "data": {"data": data}}
-    return json.dumps(message)
+def encode_msg_to_libp2p(
+    data: tp.Union[str, bytes, dict, list], protocol: str, server_peer_id: str, save_data: bool
+) -> bytes:
+    """Build the message for the proxy as UTF-8 JSON, the data is serialized once.
+
+    :param data: Structured data, pre-serialized JSON as bytes, or a string, which is sent
+        as JSON if it can be parsed and as a string otherwise.
+    """
+    if isinstance(data, (bytes, bytearray)):
+        # Pre-serialized JSON is put into the message as is
+        head = codec.dumps({"protocol": protocol, "serverPeerId": server_peer_id, "save_data": save_data})
+        return b"".join((head[:-1], b',"data":{"data":', data, b"}}"))
+    if isinstance(data, str):
+        try:
+            data = codec.loads(data)
+        except ValueError:
+            pass
+    message = {"protocol": protocol, "serverPeerId": server_peer_id, "save_data": save_data, "data": {"data": data}}
+    return codec.dumps(message)
 
 
 def format_msg_for_subscribing(protocols: list) -> str:
@@ -23,6 +23,7 @@ class ProtocolsManager:
 class Callback:
     callback_function: tp.Callable
     callback_type: str
+    ordered: bool = True # Handle messages of the protocol one by one
 
 
 class CallbackTypes:
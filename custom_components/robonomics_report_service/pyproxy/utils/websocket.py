@@ -1,16 +1,70 @@
 import asyncio
+import time
+import zlib
 import websockets
 import typing as tp
-import json
+from collections import deque
+from dataclasses import dataclass
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
 from .logger import logger
+from . import codec
+from .backoff import Backoff
+from .dispatcher import CallbackDispatcher
 from .message import format_msg_from_libp2p, format_msg_for_subscribing, InitialMessage
 from .decorators import set_websocket
-from .protocols_manager import ProtocolsManager, CallbackTypes
+from .protocols_manager import ProtocolsManager
+
+# Subprotocol of the proxy accepting messages in binary frames
+BINARY_SUBPROTOCOL = "libp2p-proxy.binary"
+# Large messages are hex of ciphertext, which has no repeats to find. Huffman coding alone
+# halves it about three times faster than the default level of deflate.
+DEFLATE_SETTINGS = {"level": 1, "memLevel": 5, "strategy": zlib.Z_HUFFMAN_ONLY}
+
+
+def get_extension_names(websocket) -> tp.List[str]:
+    """Names of the extensions negotiated on the connection.
+
+    Connections of websockets>=14 keep them in the protocol, the legacy ones in the connection itself.
+    """
+    extensions = getattr(getattr(websocket, "protocol", websocket), "extensions", None) or []
+    return [extension.name for extension in extensions]
+
+
+@dataclass
+class KeepAlive:
+    """Settings of the persistent connection.
+
+    :param ping_interval: Seconds between heartbeat pings.
+    :param ping_timeout: Seconds to wait for a pong before the connection is considered dead.
+    :param idle_timeout: Seconds without messages and subscriptions to close the connection after.
+    :param reconnect_delay: Seconds to wait before the first reconnect, the delay doubles with every failure.
+    :param max_reconnect_delay: Maximum seconds to wait between reconnects.
+    :param send_buffer_size: Messages to keep while disconnected, the oldest ones are dropped above it.
+    :param subscription_debounce: Seconds to collect subscription changes for, before sending them as one update.
+    :param send_buffer_bytes: Total size of messages to keep while disconnected, the oldest ones are
+        dropped above it. The newest message is kept even if it is bigger.
+    """
+
+    ping_interval: float = 20
+    ping_timeout: float = 20
+    idle_timeout: float = 300
+    reconnect_delay: float = 1
+    max_reconnect_delay: float = 60
+    send_buffer_size: int = 100
+    subscription_debounce: float = 0.05
+    send_buffer_bytes: int = 32 * 1024 * 1024
 
 
 class WebsocketClient:
     def __init__(
-        self, protocols_manager: ProtocolsManager, proxy_server_url: str, peer_id_callback: tp.Optional[tp.Callable]
+        self,
+        protocols_manager: ProtocolsManager,
+        proxy_server_url: str,
+        peer_id_callback: tp.Optional[tp.Callable],
+        keep_alive: tp.Optional[KeepAlive] = None,
+        max_concurrent_callbacks: int = 10,
+        binary_frames: bool = False,
+        compression: bool = True,
     ) -> None:
         self.websocket = None
         self.proxy_server_url: str = proxy_server_url
@@ -18,18 +72,43 @@ class WebsocketClient:
         self.is_connecting = False
         self.protocols_manager = protocols_manager
         self.peer_id_callback = peer_id_callback
+        self.keep_alive = keep_alive
+        self.dispatcher = CallbackDispatcher(max_concurrent_callbacks)
+        self.binary_frames = binary_frames
+        self.compression = compression
+        self._backoff = Backoff(keep_alive.reconnect_delay, keep_alive.max_reconnect_delay) if keep_alive else Backoff()
+        self._outbox: tp.Deque[tp.Tuple[str, tp.Union[str, bytes]]] = deque() # Protocol and message
+        self._outbox_bytes = 0
+        self._subscriptions_changed = False
+        self._sent_protocols: tp.Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._link: tp.Optional[asyncio.Task] = None
+        self._last_activity = time.monotonic()
+
+    def get_connect_kwargs(self) -> dict:
+        kwargs = {"compression": None, "subprotocols": None}
+        if self.compression:
+            kwargs["compression"] = "deflate"
+            kwargs["extensions"] = [ClientPerMessageDeflateFactory(compress_settings=DEFLATE_SETTINGS)]
+        if self.binary_frames:
+            # The proxy selects the subprotocol if it accepts binary frames
+            kwargs["subprotocols"] = [BINARY_SUBPROTOCOL]
+        if self.keep_alive is None:
+            return {**kwargs, "ping_timeout": None}
+        return {**kwargs, "ping_interval": self.keep_alive.ping_interval, "ping_timeout": self.keep_alive.ping_timeout}
 
-    @set_websocket
     async def set_listener(self, reconnect: bool = False) -> None:
-        logger.debug(f"Is listening: {self.is_listening}")
-        if self.is_listening:
+        if self.keep_alive is not None:
+            # The connection is opened in background, messages received on it are always consumed
+            self.is_listening = True
+            self._ensure_link()
             return
-        self.is_listening = True
-        logger.debug(f"Connected to WebSocket server at {self.proxy_server_url}")
-        loop = asyncio.get_event_loop()
-        loop.create_task(self._consumer_handler(reconnect))
+        await self._set_listener(reconnect=reconnect)
 
-    async def send_msg(self, msg: str, reconnect: bool = False) -> None:
+    async def send_msg(self, msg: tp.Union[str, bytes], reconnect: bool = False, protocol: str = "") -> None:
+        if self.keep_alive is not None:
+            self._enqueue(msg, protocol)
+            return
         await self._send_msg(msg, reconnect=reconnect)
         if not self.is_listening:
             logger.debug("Close connection after sending message")
@@ -37,11 +116,21 @@ class WebsocketClient:
 
     async def send_msg_to_subscribe(self, protocols: list) -> None:
         logger.debug(f"Subscribing to: {protocols}")
+        if self.keep_alive is not None:
+            # Only the latest list matters, it is sent before the buffered messages if it differs
+            # from the one sent last time
+            self._subscriptions_changed = True
+            self._wake()
+            return
         msg = format_msg_for_subscribing(protocols)
         await self._send_msg(msg, reconnect=False)
 
     async def close_connection(self) -> None:
         await asyncio.sleep(0)
+        if self._link is not None:
+            self._link.cancel()
+            self._link = None
+            self.is_listening = False
         logger.debug("Close websocket connection")
         if self.websocket is not None:
             await self.websocket.close()
@@ -49,8 +138,148 @@ class WebsocketClient:
             logger.debug("Websocket connection closed")
 
     @set_websocket
-    async def _send_msg(self, msg: str, reconnect: bool = False) -> None:
-        await self.websocket.send(msg)
+    async def _set_listener(self, reconnect: bool = False) -> None:
+        logger.debug(f"Is listening: {self.is_listening}")
+        if self.is_listening:
+            return
+        self.is_listening = True
+        logger.debug(f"Connected to WebSocket server at {self.proxy_server_url}")
+        loop = asyncio.get_event_loop()
+        loop.create_task(self._consumer_handler(reconnect))
+
+    @set_websocket
+    async def _send_msg(self, msg: tp.Union[str, bytes], reconnect: bool = False) -> None:
+        await self.websocket.send(self._to_frame(self.websocket, msg))
+
+    @staticmethod
+    def _to_frame(websocket, msg: tp.Union[str, bytes]) -> tp.Union[str, bytes]:
+        """Messages are built as UTF-8 JSON bytes, they go as text if the proxy doesn't accept binary frames."""
+        if isinstance(msg, bytes) and websocket.subprotocol != BINARY_SUBPROTOCOL:
+            return msg.decode("utf-8")
+        return msg
+
+    def _enqueue(self, msg: tp.Union[str, bytes], protocol: str) -> None:
+        self._outbox.append((protocol, msg))
+        self._outbox_bytes += len(msg)
+        while len(self._outbox) > 1 and (
+            len(self._outbox) > self.keep_alive.send_buffer_size
+            or self._outbox_bytes > self.keep_alive.send_buffer_bytes
+        ):
+            dropped_protocol, dropped = self._outbox.popleft()
+            self._outbox_bytes -= len(dropped)
+            logger.warning(
+                f"Send buffer is full, dropping the oldest message of {len(dropped)} bytes to {dropped_protocol}"
+            )
+        self._wake()
+
+    def _wake(self) -> None:
+        self._wakeup.set()
+        self._ensure_link()
+
+    def _ensure_link(self) -> None:
+        if self._link is None or self._link.done():
+            self._link = asyncio.get_event_loop().create_task(self._run_link())
+
+    def _has_work(self) -> bool:
+        return bool(self._outbox) or bool(self.protocols_manager.protocols)
+
+    async def _run_link(self) -> None:
+        """Keep the connection in the keep-alive mode.
+
+        Disconnected: wait with backoff between attempts while there are messages to send or
+        protocols to listen. Connected: send the changed subscriptions and the buffered messages in order,
+        then wait for new ones and close the connection after ``idle_timeout`` without traffic
+        and subscriptions.
+        """
+        try:
+            while self.websocket is not None or self._has_work():
+                self._wakeup.clear()
+                if self.websocket is None:
+                    await self._connect()
+                    continue
+                websocket = self.websocket
+                if self._subscriptions_changed and not self._outbox:
+                    # Wait for the rest of changes, e.g. unsubscribe right after subscribe
+                    await asyncio.sleep(self.keep_alive.subscription_debounce)
+                try:
+                    await self._flush(websocket)
+                except websockets.exceptions.ConnectionClosed:
+                    logger.debug("Connection is closed, reconnecting to send the buffered messages")
+                    self._drop(websocket)
+                    continue
+                idle_time = time.monotonic() - self._last_activity
+                if idle_time >= self.keep_alive.idle_timeout and not self.protocols_manager.protocols:
+                    logger.debug(f"Close idle connection after {idle_time:.0f} seconds")
+                    self._drop(websocket)
+                    await websocket.close()
+                    continue
+                remaining = self.keep_alive.idle_timeout - idle_time
+                # While there are subscriptions check again after a whole timeout
+                timeout = remaining if remaining > 0 else self.keep_alive.idle_timeout
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self._link is asyncio.current_task():
+                self._link = None
+                self.is_listening = False
+
+    async def _connect(self) -> None:
+        try:
+            self.websocket = await websockets.connect(self.proxy_server_url, **self.get_connect_kwargs())
+        except Exception as e:
+            delay = self._backoff.next_delay()
+            logger.warning(f"Websocket connection exception: {e}, reconnecting in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+            return
+        logger.debug(
+            f"Connected to WebSocket server at {self.proxy_server_url}, "
+            f"subprotocol: {self.websocket.subprotocol}, extensions: {get_extension_names(self.websocket)}"
+        )
+        self._backoff.reset()
+        self._last_activity = time.monotonic()
+        # A new connection of the proxy has no subscriptions
+        self._sent_protocols = set()
+        self._subscriptions_changed = True
+        asyncio.get_event_loop().create_task(self._listen(self.websocket))
+
+    async def _flush(self, websocket) -> None:
+        if self._subscriptions_changed:
+            self._subscriptions_changed = False
+            protocols = self.protocols_manager.get_protocols()
+            if set(protocols) != self._sent_protocols:
+                try:
+                    await websocket.send(format_msg_for_subscribing(protocols))
+                except websockets.exceptions.ConnectionClosed:
+                    self._subscriptions_changed = True
+                    raise
+                self._sent_protocols = set(protocols)
+        while self._outbox:
+            # The message leaves the buffer only when it is sent
+            item = self._outbox[0]
+            await websocket.send(self._to_frame(websocket, item[1]))
+            # Unless it was dropped as the oldest one while sending
+            if self._outbox and self._outbox[0] is item:
+                self._outbox.popleft()
+                self._outbox_bytes -= len(item[1])
+            self._last_activity = time.monotonic()
+
+    def _drop(self, websocket) -> None:
+        if self.websocket is websocket:
+            self.websocket = None
+            self._wakeup.set()
+
+    async def _listen(self, websocket) -> None:
+        try:
+            async for message in websocket:
+                self._last_activity = time.monotonic()
+                logger.debug(f"Received message from server: {message}")
+                await self._consumer(message)
+            logger.debug("Stop listening websocket on ConnectionClosedOK")
+        except Exception as e:
+            logger.error(f"Websocket exception: {e}")
+        self._drop(websocket)
 
     async def _consumer_handler(self, reconnect: bool) -> None:
         try:
@@ -72,11 +301,11 @@ class WebsocketClient:
             self.is_listening = False
             logger.error(f"Websocket exception: {e}")
             if reconnect:
-                await asyncio.sleep(5)
+                await asyncio.sleep(self._backoff.next_delay())
                 await self._reconnect(reconnect)
 
     async def _consumer(self, message: str) -> None:
-        message = json.loads(message)
+        message = codec.loads(message)
         if "peerId" in message:
             if self.peer_id_callback is not None:
                 self.peer_id_callback(InitialMessage(message))
@@ -85,20 +314,16 @@ class WebsocketClient:
             protocol = message.get("protocol")
             formated_msg = format_msg_from_libp2p(message)
             callback_obj = self.protocols_manager.protocols[protocol]
-            callback_type = callback_obj.callback_type
-            if callback_type == CallbackTypes.AsyncType:
-                await callback_obj.callback_function(formated_msg)
-            else:
-                callback_obj.callback_function(formated_msg)
+            self.dispatcher.dispatch(protocol, callback_obj, formated_msg)
 
     async def _reconnect(self, reconnect: bool) -> None:
         logger.debug("Reconnecting...")
         self.websocket = None
-        await self.set_listener(reconnect=reconnect)
-        while self.websocket is None:
-            await asyncio.sleep(0.1)
-            if not self.is_listening:
-                return
+        # Connects with backoff and returns when connected
+        await self._set_listener(reconnect=reconnect)
+        if self.websocket is None:
+            return
+        self._backoff.reset()
         protocols = self.protocols_manager.get_protocols()
         logger.debug(f"Callbacks to resubscribe: {protocols}")
         await self.send_msg_to_subscribe(protocols)
@@ -1,9 +1,10 @@
+import typing as tp
 from dataclasses import dataclass
 from enum import Enum
 from random import randint
 
 class ReportStatus(Enum):
-    WAIT_FOR_PINATA = 1
+    WAIT_FOR_PINATA = 1 # Files for the datalog are being pinned
     WAIT_FOR_RESPONSE = 2
     DONE = 3
 
@@ -11,9 +12,21 @@ class ReportStatus(Enum):
 class ReportData:
     id: str
     encrypted_data: dict
-    description: str
+    description: tp.Union[str, dict]
     status: ReportStatus
+    bundle: tp.Optional[dict] = None # Pinned files with logs, built for the datalog if the report was sent without them
 
     @staticmethod
-    def create(encrypted_data: dict, description: str) -> 'ReportData':
-        return ReportData(str(randint(0, 100000)), encrypted_data, description, ReportStatus.WAIT_FOR_RESPONSE)
+    def generate_id() -> str:
+        return str(randint(0, 100000))
+
+    @staticmethod
+    def create(
+        encrypted_data: dict,
+        description: tp.Union[str, dict],
+        bundle: tp.Optional[dict] = None,
+        report_id: tp.Optional[str] = None,
+    ) -> 'ReportData':
+        return ReportData(
+            report_id or ReportData.generate_id(), encrypted_data, description, ReportStatus.WAIT_FOR_RESPONSE, bundle
+        )
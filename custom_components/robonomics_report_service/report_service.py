@@ -16,18 +16,28 @@ from .const import (
     DOMAIN,
     PROBLEM_REPORT_SERVICE,
     SERVICE_PAID,
+    REPORT_MEMORY_BUDGET,
+    REPORT_MEMORY_BUDGET_KEY,
+    LOG_BUFFER,
+    REPORT_SIZE_BUDGET,
+    REPORT_DETERMINISTIC_ENCRYPTION,
+    PIN_RETENTION,
 )
-from .ipfs import IPFS, PinataKeysRewoked
+from .ipfs import IPFS, PinataKeysRewoked, get_ipfs
 from .utils import (
     create_temp_dir_with_encrypted_files,
     encrypt_message,
     delete_temp_dir,
     get_tempdir_filenames,
+    estimate_report_memory,
+    encrypted_message_size,
 )
 from .robonomics import Robonomics
 from .libp2p import LibP2P
 from .report_model import ReportData, ReportStatus
 from .rws_registration import RWSRegistrationManager
+from .memory_budget import ReportMemoryBudget
+from .executor import ReportServiceExecutor, get_executor
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -38,10 +48,14 @@ class ReportService:
     def __init__(self, hass: HomeAssistant, robonomics: Robonomics, libp2p: LibP2P):
         self.hass = hass
         self.robonomics = robonomics
-        self.ipfs = IPFS(hass)
+        self.ipfs: IPFS = get_ipfs(hass)
         self.libp2p = libp2p
         self._pending_reports: dict[str, ReportData] = {}
         self._requesting_new_pinata_creds = False
+        self.memory_budget: ReportMemoryBudget = hass.data[DOMAIN].setdefault(
+            REPORT_MEMORY_BUDGET_KEY, ReportMemoryBudget(REPORT_MEMORY_BUDGET)
+        )
+        self.executor: ReportServiceExecutor = get_executor(hass)
 
     async def register(self) -> None:
         self.hass.services.async_register(
@@ -52,16 +66,21 @@ class ReportService:
 
     async def send_problem_report(self, call: ServiceCall) -> None:
         _LOGGER.debug(
-            f"send problem service with logs: {not call.data.get('only_description')}: {call.data.get('description')}"
+            "send problem service with logs: %s: %s",
+            not call.data.get("only_description"),
+            call.data.get("description"),
         )
+        bundle = None
+        report_id = ReportData.generate_id()
         if call.data.get("only_description"):
             data_to_send = self._create_data_for_repeated_errors(
                 call.data.get("description")
             )
         else:
-            data_to_send = await self._create_data_for_errors_with_logs(call.data)
+            data_to_send = await self._create_data_for_errors_with_logs(call.data, report_id)
+            bundle = data_to_send
         if data_to_send is not None:
-            new_report = ReportData.create(data_to_send, call.data.get("description"))
+            new_report = ReportData.create(data_to_send, call.data.get("description"), bundle, report_id)
             self._pending_reports[new_report.id] = new_report
             await self.libp2p.send_report(
                 new_report.encrypted_data, new_report.id
@@ -69,35 +88,45 @@ class ReportService:
 
     async def _handle_report_response(self, report_id: str, response: dict) -> None:
         if not response["datalog"]:
-            self._pending_reports.pop(report_id)
+            report = self._pending_reports.pop(report_id, None)
             _LOGGER.debug(f"Report {report_id} is finished without datalog")
+            if report is not None and report.bundle is not None:
+                await self.ipfs.unpin_files(report.bundle, report.id, PIN_RETENTION)
         else:
             report = self._pending_reports.get(report_id)
             _LOGGER.debug(f"Report {report_id} will be sent in datalog, report: {report}")
-            if report:
-                asyncio.ensure_future(self._send_report_to_datalog(report, response["ticket_ids"]))
+            if report and report.status == ReportStatus.WAIT_FOR_RESPONSE:
+                # A repeated response must not build and pin the files again
+                report.status = ReportStatus.WAIT_FOR_PINATA
+                self.executor.create_task(self._send_report_to_datalog(report, response["ticket_ids"]))
 
     async def _send_report_to_datalog(self, report: ReportData, ticket_ids: list) -> None:
-        if "home-assistant.log" in report.encrypted_data:
+        if report.bundle is not None:
             _LOGGER.debug(f"Report {report.id} has encrypted logs")
             await self.robonomics.send_datalog(report.encrypted_data)
         else:
             _LOGGER.debug(f"Report {report.id} doesn't have encrypted logs")
-            data_to_send = await self._create_data_for_errors_with_logs({"description": report.description})
-            data_to_send["ticket_ids"] = ticket_ids.copy()
-            await self.robonomics.send_datalog(data_to_send)
-
-    async def _create_data_for_errors_with_logs(self, issue_description: dict) -> dict:
+            report.bundle = await self._create_data_for_errors_with_logs(
+                {"description": report.description}, report.id
+            )
+            if report.bundle is not None:
+                await self.robonomics.send_datalog({**report.bundle, "ticket_ids": ticket_ids.copy()})
+        report.status = ReportStatus.DONE
+        self._pending_reports.pop(report.id, None)
+
+    async def _create_data_for_errors_with_logs(
+        self, issue_description: dict, report_id: tp.Optional[str] = None
+    ) -> dict:
         try:
             tempdir = await self._create_temp_dir_with_report_data(issue_description)
             while self._requesting_new_pinata_creds:
                 await asyncio.sleep(1)
-            data_to_send = await self.ipfs.pin_to_pinata(tempdir)
+            data_to_send = await self.ipfs.pin_files(tempdir, report_id)
         except PinataKeysRewoked:
             self._requesting_new_pinata_creds = True
             await RWSRegistrationManager.request_new_pinata_creds(self.hass, self.robonomics, self.libp2p)
             self._requesting_new_pinata_creds = False
-            data_to_send = await self.ipfs.pin_to_pinata(tempdir)
+            data_to_send = await self.ipfs.pin_files(tempdir, report_id)
         finally:
             await self._remove_tempdir(tempdir)
         return data_to_send
@@ -107,46 +136,77 @@ class ReportService:
         return {"issue_description.json": encrypted}
 
     async def _create_temp_dir_with_report_data(self, issue_description: dict) -> str:
-        files = self._get_logs_files()
-        tempdir: str = await self._async_create_temp_dir_with_encrypted_files(files)
-        await self._async_add_description_json(issue_description, tempdir)
+        buffer_sizes = self._get_logs_buffer_sizes()
+        files = self._get_logs_files(skip_log_file=LOG_FILE_NAME in buffer_sizes)
+        estimated_memory = await self.executor.async_run(estimate_report_memory, files, buffer_sizes)
+        description_size = encrypted_message_size(
+            len(json.dumps(self._format_description_json(issue_description), separators=(",", ":")).encode("utf-8"))
+        )
+        size_budget = REPORT_SIZE_BUDGET - description_size
+        async with self.memory_budget.reserve(estimated_memory):
+            # The snapshot is taken only when the build is admitted
+            buffers = await self._async_get_logs_buffers(buffer_sizes)
+            tempdir: str = await self._async_create_temp_dir_with_encrypted_files(
+                files, buffers, size_budget
+            )
+            await self._async_add_description_json(issue_description, tempdir)
+        _LOGGER.debug(f"Report memory: {self.memory_budget.stats()}, executor: {self.executor.stats()}")
         return tempdir
 
-    def _get_logs_files(self) -> tp.List[str]:
+    def _get_logs_buffer_sizes(self) -> tp.Dict[str, int]:
+        log_buffer = self.hass.data[DOMAIN].get(LOG_BUFFER)
+        if log_buffer is None or log_buffer.size == 0:
+            return {}
+        return {LOG_FILE_NAME: log_buffer.size}
+
+    async def _async_get_logs_buffers(self, buffer_sizes: tp.Dict[str, int]) -> tp.Dict[str, str]:
+        """Snapshot recent logs from the in-memory buffer instead of reading the log file."""
+        if LOG_FILE_NAME not in buffer_sizes:
+            return {}
+        log_buffer = self.hass.data[DOMAIN][LOG_BUFFER]
+        logs = await self.hass.async_add_executor_job(log_buffer.snapshot)
+        return {LOG_FILE_NAME: logs}
+
+    def _get_logs_files(self, skip_log_file: bool = False) -> tp.List[str]:
         hass_config_path = self.hass.config.path()
         files = []
-        if os.path.isfile(f"{hass_config_path}/{LOG_FILE_NAME}"):
+        if not skip_log_file and os.path.isfile(f"{hass_config_path}/{LOG_FILE_NAME}"):
             files.append(f"{hass_config_path}/{LOG_FILE_NAME}")
         if os.path.isfile(f"{hass_config_path}/{TRACES_FILE_NAME}"):
             files.append(f"{hass_config_path}/{TRACES_FILE_NAME}")
         return files
 
     async def _async_create_temp_dir_with_encrypted_files(
-        self, files: tp.List[str]
+        self, files: tp.List[str], buffers: tp.Dict[str, str], size_budget: int
     ) -> str:
-        return await self.hass.async_add_executor_job(
-            self._create_temp_dir_with_encrypted_files, files
+        return await self.executor.async_run(
+            self._create_temp_dir_with_encrypted_files, files, buffers, size_budget
         )
 
-    def _create_temp_dir_with_encrypted_files(self, files: tp.List[str]) -> str:
+    def _create_temp_dir_with_encrypted_files(
+        self, files: tp.List[str], buffers: tp.Dict[str, str], size_budget: int
+    ) -> str:
         return create_temp_dir_with_encrypted_files(
             IPFS_PROBLEM_REPORT_FOLDER,
             files,
             self.robonomics.sender_seed,
             PROBLEM_SERVICE_ROBONOMICS_ADDRESS,
+            buffers,
+            size_budget,
+            REPORT_DETERMINISTIC_ENCRYPTION,
         )
 
     async def _async_add_description_json(self, call_data: dict, tempdir: str) -> None:
-        await self.hass.async_add_executor_job(
-            self._add_description_json, call_data, tempdir
-        )
+        await self.executor.async_run(self._add_description_json, call_data, tempdir)
+
+    def _format_description_json(self, call_data: dict) -> dict:
+        return {"description": call_data.get("description")}
 
     def _add_description_json(self, call_data: dict, tempdir: str) -> None:
-        problem_text = call_data.get("description")
-        json_description = {
-            "description": problem_text,
-        }
-        encrypted_description = self.robonomics.multi_device_encrypt(json_description)
+        json_description = self._format_description_json(call_data)
+        encrypted_description = self.robonomics.multi_device_encrypt(
+            json_description, REPORT_DETERMINISTIC_ENCRYPTION
+        )
         with open(f"{tempdir}/issue_description.json", "w") as f:
             f.write(encrypted_description)
 
@@ -1,24 +1,40 @@
 import asyncio
+import functools
 import logging
+import threading
 import time
 import json
 import typing as tp
 
 from homeassistant.core import HomeAssistant
 from robonomicsinterface import (
-    RWS,
     Account,
-    Datalog,
     Subscriber,
     SubEvent,
 )
-from substrateinterface import Keypair, KeypairType
+from substrateinterface import Keypair, KeypairType, SubstrateInterface, ExtrinsicReceipt
 from substrateinterface.exceptions import SubstrateRequestException, ExtrinsicFailedException
-from tenacity import Retrying, stop_after_attempt, wait_fixed
+from websocket import WebSocketException
 from collections import deque
 
-from .const import ROBONOMICS_WSS, OWNER_ADDRESS, STORAGE_CREDENTIALS, CONF_INTEGRATOR_ADDRESS
-from .ipfs import IPFS
+from .const import (
+    ROBONOMICS_WSS,
+    OWNER_ADDRESS,
+    STORAGE_CREDENTIALS,
+    CONF_INTEGRATOR_ADDRESS,
+    DATALOG_BATCH_SIZE,
+    DATALOG_PIPELINE_DEPTH,
+    DATALOG_INCLUSION_POLL_INTERVAL,
+    DATALOG_INCLUSION_TIMEOUT_BLOCKS,
+    PIN_RETENTION,
+    ROBONOMICS_RETRY_DELAY,
+    RWS_MEMBERSHIP_TTL,
+)
+from .endpoint_manager import get_endpoint_manager
+from .executor import get_executor
+from .datalog_journal import DatalogJournal, DatalogState
+from .nonce_manager import NonceManager
+from .ipfs import get_ipfs
 from .utils import decrypt_message, encrypt_message, multi_device_encrypt_message, async_load_from_store
 
 _LOGGER = logging.getLogger(__name__)
@@ -32,16 +48,30 @@ class Robonomics:
     ):
         self.hass: HomeAssistant = hass
         self.sender_seed: str = sender_seed
+        self.endpoints = get_endpoint_manager(hass)
+        self.executor = get_executor(hass)
+        self.current_wss: str = self.endpoints.best()
         self.sender_account: Account = Account(
-            self.sender_seed, crypto_type=KeypairType.ED25519
+            self.sender_seed, crypto_type=KeypairType.ED25519, remote_ws=self.current_wss
         )
         self.sender_address: str = self.sender_account.get_address()
         _LOGGER.debug(f"Sender address: {self.sender_address}")
-        self.current_wss: str = ROBONOMICS_WSS[0]
         self.subscriber = None
+        self._rws_waiters: tp.List[asyncio.Future] = []
+        self._rws_membership: tp.Optional[tp.Tuple[bool, float]] = None # In RWS and time of the check
         self._datalog_queue = deque()
+        self._datalog_journal = DatalogJournal(hass)
         self._datalogs_are_sending = False
+        self._datalogs_in_flight = 0
+        self._nonces = NonceManager()
+        self._pending_extrinsics: tp.Dict[str, tp.Tuple[asyncio.Future, int]] = {}
+        self._inclusion_tracker: tp.Optional[asyncio.Future] = None
         self._integrator_address = None
+        # Connections to nodes are kept open with cached runtime metadata.
+        # SubstrateInterface is not thread safe, so chain calls are made with the lock.
+        self._interfaces: tp.Dict[str, SubstrateInterface] = {}
+        self._stale_interfaces: tp.Set[str] = set()
+        self._chain_lock = threading.Lock()
 
     @staticmethod
     def generate_seed() -> str:
@@ -54,19 +84,45 @@ class Robonomics:
             if CONF_INTEGRATOR_ADDRESS in storage_data:
                 self._integrator_address = storage_data[CONF_INTEGRATOR_ADDRESS]
 
+    async def resume_datalogs(self) -> None:
+        """Queue datalogs which were not sent before restart."""
+        pending = await self._datalog_journal.async_load()
+        if pending:
+            _LOGGER.debug(f"Resume {len(pending)} datalogs from the journal")
+            self._datalog_queue.extend(pending)
+            self.executor.create_task(self._async_send_datalog_from_queue())
+
     def set_integrator_address(self, address: str) -> None:
         self._integrator_address = address
 
     async def wait_for_rws(self) -> None:
-        sender_in_rws = await self.hass.async_add_executor_job(
-            self._check_sender_in_rws
-        )
-        if not sender_in_rws:
+        """Wait till the sender is added to the RWS subscription devices."""
+        future = self.hass.loop.create_future()
+        self._rws_waiters.append(future)
+        # Subscribe before the check, so the event can't be missed between them
+        if self.subscriber is None:
             self.subscriber = Subscriber(
-                Account(), SubEvent.NewDevices, self._callback_event
+                Account(remote_ws=self.current_wss), SubEvent.NewDevices, self._callback_event, addr=OWNER_ADDRESS
             )
-            while self.subscriber is not None:
-                await asyncio.sleep(1)
+        try:
+            if not await self.async_is_sender_in_rws():
+                _LOGGER.debug("Waiting for the sender to be added to RWS")
+                await future
+        finally:
+            self._rws_waiters.remove(future)
+            if not self._rws_waiters and self.subscriber is not None:
+                self.subscriber.cancel()
+                self.subscriber = None
+
+    async def async_is_sender_in_rws(self) -> bool:
+        """Check the sender in RWS devices, the result is cached for ``RWS_MEMBERSHIP_TTL``."""
+        if self._rws_membership is not None:
+            in_rws, checked_at = self._rws_membership
+            if time.monotonic() - checked_at < RWS_MEMBERSHIP_TTL:
+                return in_rws
+        in_rws = await self.executor.async_run(self._check_sender_in_rws, self.current_wss)
+        self._set_rws_membership(in_rws)
+        return in_rws
 
     async def send_datalog(self, data_to_send: str | dict) -> None:
         if isinstance(data_to_send, dict):
@@ -84,97 +140,374 @@ class Robonomics:
         """Encrypt message with hass account private key and integrator public key."""
         integrator_kp = Keypair(ss58_address=self._integrator_address)
         if isinstance(message, dict):
-            message = json.dumps(message)
+            message = json.dumps(message, separators=(",", ":"))
         return encrypt_message(message, self.sender_account.keypair, integrator_kp.public_key)
 
-    def multi_device_encrypt(self, message: str | dict) -> str:
+    def multi_device_encrypt(self, message: str | dict, deterministic: bool = False) -> str:
         """Encrypt message for integrator and hass account public keys."""
         if isinstance(message, dict):
-            message = json.dumps(message)
-        return multi_device_encrypt_message(message, self.sender_seed, self._integrator_address)
+            message = json.dumps(message, separators=(",", ":"))
+        return multi_device_encrypt_message(
+            message, self.sender_seed, self._integrator_address, deterministic
+        )
 
     def _retry_decorator(func: tp.Callable):
-        def wrapper(self, *args, **kwargs):
-            for attempt in Retrying(
-                wait=wait_fixed(2), stop=stop_after_attempt(len(ROBONOMICS_WSS))
-            ):
-                with attempt:
-                    try:
-                        res = func(self, *args, **kwargs)
-                        return res
-                    except TimeoutError:
-                        self._change_current_wss()
-                        raise TimeoutError
-                    except ExtrinsicFailedException as e:
-                        _LOGGER.warning(f"Datalog failed exception: {e}")
-                        return False
-                    except SubstrateRequestException as e:
-                        if e.args[0]["code"] == 1014:
-                            _LOGGER.warning(f"Datalog sending exception: {e}, retrying...")
-                            time.sleep(8)
-                            raise e
-                        else:
-                            _LOGGER.warning(f"Datalog sending exception: {e}")
-                            return False
-                    except Exception as e:
-                        _LOGGER.warning(f"Datalog sending exeption: {e}")
+        """Run the chain call in the integration's executor, trying the next node after connection errors.
+
+        The call gets the node URL as the first argument, as the current node may change
+        while it runs.
+        """
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            failed_wss = set()
+            for _ in range(len(ROBONOMICS_WSS)):
+                wss = self._use_best_wss(exclude=failed_wss)
+                start = time.monotonic()
+                try:
+                    res = await self.executor.async_run(func, self, wss, *args, **kwargs)
+                    self.endpoints.report_success(wss)
+                    return res
+                except (TimeoutError, ConnectionError, WebSocketException) as e:
+                    # The next attempt goes to another node, so there is no need to wait
+                    _LOGGER.warning(f"Robonomics node {wss} failed with {e!r}, "
+                                    f"after {time.monotonic() - start:.1f}s")
+                    self.endpoints.report_failure(wss)
+                    self._stale_interfaces.add(wss)
+                    failed_wss.add(wss)
+                except ExtrinsicFailedException as e:
+                    _LOGGER.warning(f"Datalog failed exception: {e}")
+                    return False
+                except SubstrateRequestException as e:
+                    if e.args[0]["code"] == 1014:
+                        # Nonce is already used by an extrinsic in the pool, nonce was resynced
+                        _LOGGER.warning(f"Datalog sending exception: {e}, retrying...")
+                        await asyncio.sleep(ROBONOMICS_RETRY_DELAY)
+                    else:
+                        _LOGGER.warning(f"Datalog sending exception: {e}")
                         return False
+                except Exception as e:
+                    _LOGGER.warning(f"Datalog sending exeption: {e}")
+                    return False
+            _LOGGER.warning("Datalog sending failed on all nodes")
+            return False
 
         return wrapper
 
     async def _handle_datalog_request(self, data_to_send: str) -> None:
-        self._datalog_queue.append(data_to_send)
+        entry_id = await self._datalog_journal.async_append(data_to_send)
+        self._datalog_queue.append((entry_id, data_to_send))
         _LOGGER.debug(f"New datalog request, queue length: {len(self._datalog_queue)}")
-        if not self._datalogs_are_sending:
-            await self._async_send_datalog_from_queue()
+        await self._async_send_datalog_from_queue()
 
     async def _async_send_datalog_from_queue(self) -> None:
+        """Submit queued datalogs in batches without waiting for inclusion of the previous ones.
+
+        Up to ``DATALOG_PIPELINE_DEPTH`` extrinsics are in flight at once, their inclusion is
+        tracked by ``_async_track_inclusion``.
+        """
+        if self._datalogs_are_sending:
+            return
         self._datalogs_are_sending = True
-        data_to_send = self._datalog_queue.popleft()
-        res = await asyncio.to_thread(self._send_datalog, data_to_send)
-        _LOGGER.debug("After datalog")
-        if not res:
-            await IPFS(self.hass).unpin_from_pinata(data_to_send)
-        if len(self._datalog_queue) > 0:
-            asyncio.ensure_future(self._async_send_datalog_from_queue())
-        else:
+        try:
+            while len(self._datalog_queue) > 0 and self._datalogs_in_flight < DATALOG_PIPELINE_DEPTH:
+                entries = [
+                    self._datalog_queue.popleft()
+                    for _ in range(min(DATALOG_BATCH_SIZE, len(self._datalog_queue)))
+                ]
+                await self._datalog_journal.async_set_state(
+                    [entry_id for entry_id, _ in entries], DatalogState.Submitted
+                )
+                submitted = await self._send_datalogs([data_to_send for _, data_to_send in entries])
+                if not submitted:
+                    await self._async_finish_datalogs(entries, [False] * len(entries))
+                    continue
+                self._datalogs_in_flight += 1
+                self.executor.create_task(self._async_wait_for_datalogs(entries, *submitted))
+        finally:
             self._datalogs_are_sending = False
 
+    async def _async_wait_for_datalogs(
+        self, entries: tp.List[tp.Tuple[int, str]], extrinsic_hash: str, block_number: int, nonce: int
+    ) -> None:
+        retention = 0
+        try:
+            inclusion = await self._async_wait_for_inclusion(extrinsic_hash, block_number)
+            if inclusion is None:
+                included = await self._async_is_nonce_used(nonce)
+                self._nonces.resync()
+                if included:
+                    # The finalized block with the extrinsic was not scanned, so its events are unknown.
+                    # Pins are kept, as they may be recorded in the datalog
+                    _LOGGER.warning(f"Datalog extrinsic {extrinsic_hash} was included, but not found in scanned blocks")
+                    results = [True] * len(entries)
+                else:
+                    # The extrinsic still may be in the pool, so pins are removed after the retention
+                    _LOGGER.warning(f"Datalog extrinsic {extrinsic_hash} was not included in time")
+                    results = [False] * len(entries)
+                    retention = PIN_RETENTION
+            else:
+                is_success, events = inclusion
+                if not is_success:
+                    results = [False] * len(entries)
+                elif len(entries) == 1:
+                    results = [True]
+                else:
+                    results = get_batch_results(events, len(entries))
+            _LOGGER.debug(f"Datalog extrinsic {extrinsic_hash} results: {results}")
+            await self._async_finish_datalogs(entries, results, retention)
+        finally:
+            self._datalogs_in_flight -= 1
+        await self._async_send_datalog_from_queue()
+
+    async def _async_finish_datalogs(
+        self, entries: tp.List[tp.Tuple[int, str]], results: tp.List[bool], retention: float = 0
+    ) -> None:
+        for (_, data_to_send), res in zip(entries, results):
+            if res:
+                await get_ipfs(self.hass).commit_pins(data_to_send)
+            else:
+                await get_ipfs(self.hass).unpin_files(data_to_send, retention=retention)
+        await self._datalog_journal.async_set_state(
+            [entry_id for (entry_id, _), res in zip(entries, results) if res], DatalogState.Included
+        )
+        await self._datalog_journal.async_set_state(
+            [entry_id for (entry_id, _), res in zip(entries, results) if not res], DatalogState.Failed
+        )
+
+    async def _async_wait_for_inclusion(
+        self, extrinsic_hash: str, block_number: int
+    ) -> tp.Optional[tp.Tuple[bool, tp.List[tp.Any]]]:
+        """Wait till the extrinsic is included in a block.
+
+        :return: Success of the extrinsic and its events, None if it was not included in time.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending_extrinsics[extrinsic_hash] = (future, block_number + DATALOG_INCLUSION_TIMEOUT_BLOCKS)
+        if self._inclusion_tracker is None or self._inclusion_tracker.done():
+            self._inclusion_tracker = self.executor.create_task(self._async_track_inclusion(block_number))
+        return await future
+
+    async def _async_track_inclusion(self, next_block: int) -> None:
+        """Scan new blocks for all extrinsics in flight, till there are no extrinsics left."""
+        while self._pending_extrinsics:
+            await asyncio.sleep(DATALOG_INCLUSION_POLL_INTERVAL)
+            wss = self.current_wss
+            try:
+                found, next_block = await self.executor.async_run(
+                    self._scan_blocks, wss, next_block, set(self._pending_extrinsics)
+                )
+                head = next_block - 1
+            except Exception as e:
+                _LOGGER.warning(f"Can't scan blocks for datalogs with exception: {e!r}")
+                self._stale_interfaces.add(wss)
+                # Deadlines pass even if blocks can't be scanned, inclusion is checked by nonce then
+                found = {}
+                head = await self._async_get_head_block()
+                if head is None:
+                    continue
+            for extrinsic_hash, (future, deadline_block) in list(self._pending_extrinsics.items()):
+                if extrinsic_hash in found:
+                    future.set_result(found[extrinsic_hash])
+                elif head >= deadline_block:
+                    future.set_result(None)
+                else:
+                    continue
+                del self._pending_extrinsics[extrinsic_hash]
+
+    async def _async_get_head_block(self) -> tp.Optional[int]:
+        wss = self.current_wss
+        try:
+            return await self.executor.async_run(self._get_head_block, wss)
+        except Exception as e:
+            _LOGGER.warning(f"Can't get the head block with exception: {e!r}")
+            self._stale_interfaces.add(wss)
+
+    def _get_head_block(self, wss: str) -> int:
+        with self._chain_lock:
+            return self._get_interface(wss).get_block_number(None)
+
+    async def _async_is_nonce_used(self, nonce: int) -> bool:
+        """Check if an extrinsic with the nonce was included in a finalized block.
+
+        False if the chain can't be reached.
+        """
+        wss = self.current_wss
+        try:
+            return await self.executor.async_run(self._get_finalized_nonce, wss) > nonce
+        except Exception as e:
+            _LOGGER.warning(f"Can't get the account nonce with exception: {e!r}")
+            self._stale_interfaces.add(wss)
+            return False
+
+    def _get_finalized_nonce(self, wss: str) -> int:
+        """Nonce of the account at the finalized head. Unlike the next index, it doesn't count
+        extrinsics in the pool, which may be dropped yet."""
+        with self._chain_lock:
+            interface = self._get_interface(wss)
+            block_hash = interface.get_chain_finalised_head()
+            account = interface.query("System", "Account", [self.sender_address], block_hash=block_hash)
+            return account.value["nonce"]
+
+    def _scan_blocks(
+        self, wss: str, next_block: int, extrinsic_hashes: tp.Set[str]
+    ) -> tp.Tuple[tp.Dict[str, tp.Tuple[bool, tp.List[tp.Any]]], int]:
+        """Look for the extrinsics in blocks from ``next_block`` to the chain head.
+
+        :return: Success and events of found extrinsics, and the next block to scan.
+        """
+        found = {}
+        with self._chain_lock:
+            interface = self._get_interface(wss)
+            head = interface.get_block_number(None)
+            while next_block <= head:
+                block = interface.get_block(block_number=next_block)
+                for extrinsic in block["extrinsics"]:
+                    if not extrinsic.extrinsic_hash:
+                        continue
+                    extrinsic_hash = f"0x{extrinsic.extrinsic_hash.hex()}"
+                    if extrinsic_hash in extrinsic_hashes:
+                        receipt = ExtrinsicReceipt(
+                            substrate=interface, extrinsic_hash=extrinsic_hash, block_hash=block["header"]["hash"]
+                        )
+                        if not receipt.is_success:
+                            _LOGGER.warning(f"Datalog extrinsic {extrinsic_hash} failed: {receipt.error_message}")
+                        found[extrinsic_hash] = (receipt.is_success, receipt.triggered_events)
+                next_block += 1
+        return found, next_block
+
     @_retry_decorator
-    def _send_datalog(self, data_to_send: str) -> bool:
-        _LOGGER.debug(f"Start creating datalog with data: {data_to_send}")
-        datalog = Datalog(
-            self.sender_account, rws_sub_owner=self.sender_address
+    def _send_datalogs(self, wss: str, batch: tp.List[str]) -> tp.Tuple[str, int, int]:
+        """Submit datalogs in one extrinsic, several datalogs are sent with utility.batch.
+
+        :return: Hash of the extrinsic, the block number it was submitted at and its nonce.
+        """
+        _LOGGER.debug(f"Start creating datalog extrinsic with {len(batch)} records")
+        if len(batch) == 1:
+            submitted = self._submit_rws_call(wss, "Datalog", "record", {"record": batch[0]})
+        else:
+            calls = [
+                {
+                    "call_module": "Datalog",
+                    "call_function": "record",
+                    "call_args": {"record": data_to_send},
+                }
+                for data_to_send in batch
+            ]
+            submitted = self._submit_rws_call(wss, "Utility", "batch", {"calls": calls})
+        _LOGGER.debug(
+            f"Datalog extrinsic submitted with hash: {submitted[0]}, "
+            f"{len(self._datalog_queue)} datalogs left in the queue"
         )
-        receipt = datalog.record(data_to_send)
-        _LOGGER.debug(f"Datalog created with hash: {receipt}, {len(self._datalog_queue)} datalogs left in the queue")
-        return True
+        return submitted
+
+    def _submit_rws_call(self, wss: str, call_module: str, call_function: str, call_args: dict) -> tp.Tuple[str, int, int]:
+        """Sign the call via the RWS subscription with a local nonce and submit it without waiting for inclusion.
+
+        :return: Hash of the extrinsic, the block number it was submitted at and its nonce.
+        """
+        rws_params = {
+            "subscription_id": self.sender_address,
+            "call": {
+                "call_module": call_module,
+                "call_function": call_function,
+                "call_args": call_args,
+            },
+        }
+        with self._chain_lock:
+            interface = self._get_interface(wss)
+            call = interface.compose_call(call_module="RWS", call_function="call", call_params=rws_params)
+            # Next index counts extrinsics in the pool as well as in the chain
+            nonce = self._nonces.next(
+                lambda: interface.rpc_request("system_accountNextIndex", [self.sender_address])["result"]
+            )
+            try:
+                extrinsic = interface.create_signed_extrinsic(
+                    call=call, keypair=self.sender_account.keypair, nonce=nonce
+                )
+                block_number = interface.get_block_number(None)
+                receipt = interface.submit_extrinsic(extrinsic, wait_for_inclusion=False)
+            except Exception:
+                # The nonce may be used or not, so it is fetched from the chain again
+                self._nonces.resync()
+                raise
+        return receipt.extrinsic_hash, block_number, nonce
+
+    def _get_interface(self, wss: str) -> SubstrateInterface:
+        """Return the connection to the node, reconnecting it after failures.
+
+        Must be called with ``_chain_lock``.
+        """
+        interface = self._interfaces.get(wss)
+        if interface is None:
+            _LOGGER.debug(f"Connecting to {wss}")
+            interface = SubstrateInterface(
+                url=wss,
+                ss58_format=32,
+                type_registry_preset="substrate-node-template",
+                type_registry=self.sender_account.type_registry,
+            )
+            self._interfaces[wss] = interface
+        elif wss in self._stale_interfaces:
+            _LOGGER.debug(f"Reconnecting to {wss}")
+            # Runtime metadata stays cached in the interface
+            interface.connect_websocket()
+        self._stale_interfaces.discard(wss)
+        return interface
+
+    def close(self) -> None:
+        """Close connections to all nodes."""
+        with self._chain_lock:
+            for interface in self._interfaces.values():
+                interface.close()
+            self._interfaces = {}
 
-    def _check_sender_in_rws(self) -> bool:
-        rws = RWS(self.sender_account)
-        devices = rws.get_devices(OWNER_ADDRESS)
+    def _check_sender_in_rws(self, wss: str) -> bool:
+        with self._chain_lock:
+            try:
+                devices = self._get_interface(wss).query("RWS", "Devices", [OWNER_ADDRESS]).value
+            except (TimeoutError, ConnectionError, WebSocketException):
+                self._stale_interfaces.add(wss)
+                raise
         res = self.sender_address in devices
         _LOGGER.debug(f"RWS devices: {devices}, controller in devices: {res}")
         return res
 
     def _callback_event(self, data):
+        """Handle NewDevices event in the subscriber thread."""
         if data[0] == OWNER_ADDRESS:
-            if self.sender_address in data[1]:
-                self.subscriber.cancel()
-                self.subscriber = None
+            # The event contains the full list of devices
+            self.hass.loop.call_soon_threadsafe(self._set_rws_membership, self.sender_address in data[1])
 
-    def _change_current_wss(self) -> None:
-        """Set next current wss"""
+    def _set_rws_membership(self, in_rws: bool) -> None:
+        self._rws_membership = (in_rws, time.monotonic())
+        if in_rws:
+            for future in self._rws_waiters:
+                if not future.done():
+                    future.set_result(None)
 
-        current_index = ROBONOMICS_WSS.index(self.current_wss)
-        if current_index == (len(ROBONOMICS_WSS) - 1):
-            next_index = 0
-        else:
-            next_index = current_index + 1
-        self.current_wss = ROBONOMICS_WSS[next_index]
-        _LOGGER.debug(f"New Robonomics ws is {self.current_wss}")
-        self.sender_account: Account = Account(
-            seed=self.sender_seed,
-            crypto_type=KeypairType.ED25519,
-            remote_ws=self.current_wss,
-        )
+    def _use_best_wss(self, exclude: tp.Collection[str] = ()) -> str:
+        """Switch to the best Robonomics node, if it is not the current one.
+
+        :return: URL of the node.
+        """
+        best_wss = self.endpoints.best(exclude)
+        if best_wss != self.current_wss:
+            self.current_wss = best_wss
+            _LOGGER.debug(f"New Robonomics ws is {self.current_wss}")
+        return best_wss
+
+
+def get_batch_results(events: tp.List[tp.Any], batch_size: int) -> tp.List[bool]:
+    """Map utility.batch events to the result of each call in the batch.
+
+    Batch stops on the first failed call and emits BatchInterrupted with its index,
+    so the calls before it succeeded and the rest were not executed.
+    """
+    for event in events:
+        if event.value["module_id"] == "Utility" and event.value["event_id"] == "BatchInterrupted":
+            attributes = event.value["attributes"]
+            index = attributes["index"] if isinstance(attributes, dict) else attributes[0]
+            _LOGGER.warning(f"Datalog batch interrupted on call {index}: {attributes}")
+            return [i < index for i in range(batch_size)]
+    return [True] * batch_size
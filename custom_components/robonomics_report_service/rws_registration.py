@@ -3,6 +3,7 @@ import logging
 
 from .robonomics import Robonomics
 from .libp2p import LibP2P
+from .ipfs import get_ipfs
 from .utils import pinata_creds_exists, async_remove_store, async_save_to_store
 from .const import (
     STORAGE_CREDENTIALS,
@@ -46,6 +47,7 @@ class RWSRegistrationManager:
     async def delete(hass: HomeAssistant) -> None:
         _LOGGER.debug("Remove credentials store")
         await async_remove_store(hass, STORAGE_CREDENTIALS)
+        await get_ipfs(hass).async_invalidate_credentials()
 
     @staticmethod
     async def _save_service_creds(
@@ -61,3 +63,4 @@ class RWSRegistrationManager:
             STORAGE_CREDENTIALS,
             storage_data,
         )
+        await get_ipfs(hass).async_invalidate_credentials()
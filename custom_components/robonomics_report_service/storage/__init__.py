@@ -0,0 +1,4 @@
+from .storage_backend import StorageBackend
+from .pinata_backend import PinataBackend
+from .kubo_backend import KuboBackend
+from .local_backend import LocalBackend
@@ -0,0 +1,73 @@
+import json
+import logging
+import typing as tp
+
+import aiohttp
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .storage_backend import StorageBackend
+
+_LOGGER = logging.getLogger(__name__)
+
+KUBO_REQUEST_TIMEOUT = 300 # Seconds
+
+
+class KuboBackend(StorageBackend):
+    """Pins report files to a Kubo (go-ipfs) node through its HTTP RPC API."""
+
+    def __init__(self, hass: HomeAssistant, api_url: str):
+        """
+        :param api_url: URL of the Kubo RPC API, e.g. ``http://127.0.0.1:5001``.
+        """
+        super().__init__(hass)
+        self._api_url = api_url.rstrip("/")
+
+    @property
+    def storage_id(self) -> str:
+        return f"kubo:{self._api_url}"
+
+    async def pin(self, filename: str, content: tp.BinaryIO) -> tp.Optional[str]:
+        form = aiohttp.FormData()
+        form.add_field("file", content, filename=filename, content_type="application/octet-stream")
+        added = await self._add(form, {"cid-version": "0", "pin": "true"})
+        return added[-1]["Hash"] if added else None
+
+    async def pin_directory(
+        self, files: tp.List[tp.Tuple[str, tp.BinaryIO]], dirname: str
+    ) -> tp.Optional[str]:
+        form = aiohttp.FormData(quote_fields=False)
+        for filename, content in files:
+            form.add_field("file", content, filename=filename, content_type="application/octet-stream")
+        added = await self._add(
+            form, {"cid-version": "0", "pin": "true", "wrap-with-directory": "true"}
+        )
+        # The wrapping directory is the last added object and has an empty name
+        for obj in reversed(added):
+            if obj.get("Name") == "":
+                return obj["Hash"]
+
+    async def unpin(self, cid: str) -> bool:
+        status, text = await self._post("/api/v0/pin/rm", {"arg": cid})
+        _LOGGER.debug(f"Remove response for pin {cid}: {status}, {text}")
+        return status == 200 or "not pinned" in text
+
+    async def exists(self, cid: str) -> bool:
+        status, _ = await self._post("/api/v0/pin/ls", {"arg": cid, "type": "recursive"})
+        return status == 200
+
+    async def _add(self, form: aiohttp.FormData, params: tp.Dict[str, str]) -> tp.List[dict]:
+        status, text = await self._post("/api/v0/add", params, data=form)
+        if status != 200:
+            _LOGGER.error(f"Can't add to Kubo with response: {status}, {text}")
+            return []
+        return [json.loads(line) for line in text.splitlines() if line]
+
+    async def _post(self, path: str, params: tp.Dict[str, str], **kwargs) -> tp.Tuple[int, str]:
+        async with async_get_clientsession(self.hass).post(
+            f"{self._api_url}{path}",
+            params=params,
+            timeout=aiohttp.ClientTimeout(total=KUBO_REQUEST_TIMEOUT),
+            **kwargs,
+        ) as response:
+            return response.status, await response.text()
@@ -0,0 +1,76 @@
+import logging
+import os
+import shutil
+import typing as tp
+
+from homeassistant.core import HomeAssistant
+
+from .storage_backend import StorageBackend
+from ..cid import compute_directory_cid, compute_file_cid
+from ..executor import get_executor
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LocalBackend(StorageBackend):
+    """Content-addressed store on the local filesystem.
+
+    Files are saved as ``<path>/<cid>`` and directories as ``<path>/<cid>/<file>``, with
+    the same CIDs the IPFS backends would return. Useful for offline runs and benchmarks.
+    """
+
+    def __init__(self, hass: HomeAssistant, path: str):
+        """
+        :param path: Directory to keep the pinned content in.
+        """
+        super().__init__(hass)
+        self._path = path
+
+    @property
+    def storage_id(self) -> str:
+        return f"local:{self._path}"
+
+    async def pin(self, filename: str, content: tp.BinaryIO) -> tp.Optional[str]:
+        return await get_executor(self.hass).async_run(self._pin, content)
+
+    async def pin_directory(
+        self, files: tp.List[tp.Tuple[str, tp.BinaryIO]], dirname: str
+    ) -> tp.Optional[str]:
+        return await get_executor(self.hass).async_run(self._pin_directory, files)
+
+    async def unpin(self, cid: str) -> bool:
+        await get_executor(self.hass).async_run(self._unpin, cid)
+        return True
+
+    async def exists(self, cid: str) -> bool:
+        return await get_executor(self.hass).async_run(os.path.exists, self._get_path(cid))
+
+    def _pin(self, content: tp.BinaryIO) -> str:
+        data = content.read()
+        cid = compute_file_cid(data)
+        os.makedirs(self._path, exist_ok=True)
+        self._write(self._get_path(cid), data)
+        return cid
+
+    def _pin_directory(self, files: tp.List[tp.Tuple[str, tp.BinaryIO]]) -> str:
+        files_data = {filename: content.read() for filename, content in files}
+        cid = compute_directory_cid(files_data)
+        os.makedirs(self._get_path(cid), exist_ok=True)
+        for filename, data in files_data.items():
+            self._write(f"{self._get_path(cid)}/{filename}", data)
+        return cid
+
+    def _unpin(self, cid: str) -> None:
+        path = self._get_path(cid)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def _write(self, path: str, data: bytes) -> None:
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.tmp", path)
+
+    def _get_path(self, cid: str) -> str:
+        return f"{self._path}/{cid}"
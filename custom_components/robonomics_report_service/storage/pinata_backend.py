@@ -0,0 +1,80 @@
+import logging
+import typing as tp
+
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .storage_backend import StorageBackend
+from ..pinata import PinataClient, PinataKeysRewoked
+from ..utils import async_load_from_store
+from ..const import STORAGE_CREDENTIALS, CONF_PINATA_PUBLIC, CONF_PINATA_SECRET
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PinataBackend(StorageBackend):
+    """Pins report files to Pinata with the credentials received during registration."""
+
+    def __init__(self, hass):
+        super().__init__(hass)
+        self._pinata: tp.Optional[PinataClient] = None
+        self._credentials_loaded = False
+
+    @property
+    def storage_id(self) -> str:
+        return "pinata"
+
+    async def pin(self, filename: str, content: tp.BinaryIO) -> tp.Optional[str]:
+        pinata = await self._get_pinata_with_creds()
+        if pinata is not None:
+            return self._handle_pin_response(await pinata.pin_file_to_ipfs(content, filename))
+
+    async def pin_directory(
+        self, files: tp.List[tp.Tuple[str, tp.BinaryIO]], dirname: str
+    ) -> tp.Optional[str]:
+        pinata = await self._get_pinata_with_creds()
+        if pinata is not None:
+            return self._handle_pin_response(await pinata.pin_directory_to_ipfs(files, dirname))
+
+    async def unpin(self, cid: str) -> bool:
+        pinata = await self._get_pinata_with_creds()
+        if pinata is None:
+            return False
+        res = await pinata.remove_pin_from_ipfs(cid)
+        _LOGGER.debug(f"Remove response for pin {cid}: {res}")
+        # Pinata answers with an error if the hash is not pinned already
+        return res.get("status") == 200 or "CURRENT_USER_HAS_NOT_PINNED_CID" in res.get("text", "")
+
+    async def exists(self, cid: str) -> bool:
+        pinata = await self._get_pinata_with_creds()
+        if pinata is None:
+            return False
+        res = await pinata.pin_list(cid)
+        return res.get("count", 0) > 0
+
+    def invalidate_credentials(self) -> None:
+        """Drop cached Pinata credentials, they will be reloaded from the store on next use."""
+        _LOGGER.debug("Pinata credentials cache invalidated")
+        self._pinata = None
+        self._credentials_loaded = False
+
+    async def _get_pinata_with_creds(self) -> tp.Optional[PinataClient]:
+        if not self._credentials_loaded:
+            storage_data = await async_load_from_store(self.hass, STORAGE_CREDENTIALS)
+            if CONF_PINATA_PUBLIC in storage_data and CONF_PINATA_SECRET in storage_data:
+                self._pinata = PinataClient(
+                    async_get_clientsession(self.hass),
+                    storage_data[CONF_PINATA_PUBLIC],
+                    storage_data[CONF_PINATA_SECRET],
+                )
+            self._credentials_loaded = True
+        return self._pinata
+
+    def _handle_pin_response(self, res: tp.Dict[str, tp.Any]) -> tp.Optional[str]:
+        ipfs_hash: tp.Optional[str] = res.get("IpfsHash")
+        if ipfs_hash:
+            return ipfs_hash
+        elif res.get("status") == 403 and "API_KEY_REVOKED" in res.get("text", ""):
+            _LOGGER.warning("Pinata keys was revoked")
+            raise PinataKeysRewoked
+        else:
+            _LOGGER.error(f"Can't pin to pinata with responce: {res}")
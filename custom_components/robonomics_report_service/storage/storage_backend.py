@@ -0,0 +1,40 @@
+import abc
+import typing as tp
+
+from homeassistant.core import HomeAssistant
+
+
+class StorageBackend(abc.ABC):
+    """Content-addressed storage for report files.
+
+    Pin methods return the CIDv0 of the pinned content or None if it was not pinned.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+
+    @property
+    def storage_id(self) -> str:
+        """Id of the storage the pins are kept in, pins of one storage can't be managed by another."""
+        return type(self).__name__
+
+    @abc.abstractmethod
+    async def pin(self, filename: str, content: tp.BinaryIO) -> tp.Optional[str]:
+        pass
+
+    @abc.abstractmethod
+    async def pin_directory(
+        self, files: tp.List[tp.Tuple[str, tp.BinaryIO]], dirname: str
+    ) -> tp.Optional[str]:
+        pass
+
+    @abc.abstractmethod
+    async def unpin(self, cid: str) -> bool:
+        """Remove the pin. Returns True if the CID is not pinned anymore."""
+
+    @abc.abstractmethod
+    async def exists(self, cid: str) -> bool:
+        pass
+
+    def invalidate_credentials(self) -> None:
+        pass
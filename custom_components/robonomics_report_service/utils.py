@@ -1,6 +1,9 @@
+import hashlib
+import hmac
 import logging
 import os
 import random
+import secrets
 import shutil
 import tempfile
 import typing as tp
@@ -14,20 +17,47 @@ from homeassistant.helpers.storage import Store
 from robonomicsinterface import Account
 from substrateinterface import Keypair, KeypairType
 
-from .const import LOGS_MAX_LEN, STORAGE_CREDENTIALS, CONF_PINATA_PUBLIC, CONF_PINATA_SECRET
+from .const import (
+    LOGS_MAX_LEN,
+    REPORT_MEMORY_FACTOR,
+    REPORT_ARTIFACTS_PRIORITY,
+    ENCRYPTION_OVERHEAD,
+    STORAGE_CREDENTIALS,
+    CONF_PINATA_PUBLIC,
+    CONF_PINATA_SECRET,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 VERSION_STORAGE = 6
 
-def multi_device_encrypt_message(message, sender_seed: str, recipient_address: str) -> str:
+def multi_device_encrypt_message(
+    message, sender_seed: str, recipient_address: str, deterministic: bool = False
+) -> str:
+    """Encrypt message with a random key, which is encrypted for the recipient and the sender.
+
+    :param message: Message to encrypt
+    :param sender_seed: Sender account seed
+    :param recipient_address: Recipient account address
+    :param deterministic: Derive the key and nonces from the sender seed and the message, so
+        the same message always gives the same result and can be deduplicated by its hash
+
+    :return: JSON with encrypted keys for devices and encrypted data
+    """
     try:
-        random_seed = Keypair.generate_mnemonic()
+        message = str(message)
+        if deterministic:
+            random_seed = f"0x{_derive_secret(sender_seed, 'seed', message).hex()}"
+        else:
+            random_seed = Keypair.generate_mnemonic()
         random_acc = Account(random_seed, crypto_type=KeypairType.ED25519)
         sender_acc = Account(sender_seed, crypto_type=KeypairType.ED25519)
         sender_keypair = sender_acc.keypair
         encrypted_data = encrypt_message(
-            str(message), sender_keypair, random_acc.keypair.public_key
+            message,
+            sender_keypair,
+            random_acc.keypair.public_key,
+            _derive_secret(sender_seed, "data", message)[:24] if deterministic else None,
         )
         devices = [recipient_address, sender_acc.get_address()]
         encrypted_keys = {}
@@ -38,7 +68,10 @@ def multi_device_encrypt_message(message, sender_seed: str, recipient_address: s
                     ss58_address=device, crypto_type=KeypairType.ED25519
                 )
                 encrypted_key = encrypt_message(
-                    random_seed, sender_keypair, receiver_kp.public_key
+                    random_seed,
+                    sender_keypair,
+                    receiver_kp.public_key,
+                    _derive_secret(sender_seed, device, random_seed)[:24] if deterministic else None,
                 )
                 encrypted_keys[device] = encrypted_key
             except Exception as e:
@@ -51,20 +84,29 @@ def multi_device_encrypt_message(message, sender_seed: str, recipient_address: s
     except Exception as e:
         _LOGGER.error(f"Exception in encrypt for devices: {e}")
 
+def _derive_secret(sender_seed: str, purpose: str, message: str) -> bytes:
+    return hmac.new(
+        sender_seed.encode("utf-8"), f"{purpose}:{message}".encode("utf-8"), hashlib.sha256
+    ).digest()
+
 def encrypt_message(
     message: tp.Union[bytes, str],
     sender_keypair: Keypair,
     recipient_public_key: bytes,
+    nonce: tp.Optional[bytes] = None,
 ) -> str:
     """Encrypt message with sender private key and recipient public key
 
     :param message: Message to encrypt
     :param sender_keypair: Sender account Keypair
     :param recipient_public_key: Recipient public key
+    :param nonce: 24 bytes nonce, random if not set
 
     :return: encrypted message
     """
-    encrypted = sender_keypair.encrypt_message(message, recipient_public_key)
+    if nonce is None:
+        nonce = secrets.token_bytes(24)
+    encrypted = sender_keypair.encrypt_message(message, recipient_public_key, nonce)
     return f"0x{encrypted.hex()}"
 
 def decrypt_message(encrypted_message: str, receiver_seed: str, sender_address: str) -> str:
@@ -165,11 +207,17 @@ def create_temp_dir_with_encrypted_files(
     files: tp.List[str],
     sender_seed: tp.Optional[str],
     receiver_address: tp.Optional[str],
+    buffers: tp.Optional[tp.Dict[str, str]] = None,
+    size_budget: tp.Optional[int] = None,
+    deterministic: bool = False,
 ) -> str:
     """Create directory in tepmoral directory and copy there files.
 
     :param dirname: the name of the directory to create
     :param files: list of file pathes to copy
+    :param buffers: in-memory files to write, file name to its content
+    :param size_budget: maximum total size of the encrypted files in bytes
+    :param deterministic: encrypt files deterministically, see `multi_device_encrypt_message`
 
     :return: path to the created directory
     """
@@ -183,25 +231,165 @@ def create_temp_dir_with_encrypted_files(
             os.mkdir(dirpath)
         except Exception as e:
             _LOGGER.warning("Can't create tempdir: %s, retrying...", e)
-            return create_temp_dir_with_encrypted_files(dirname, files, sender_seed, receiver_address)
+            return create_temp_dir_with_encrypted_files(
+                dirname, files, sender_seed, receiver_address, buffers, size_budget, deterministic
+            )
+        buffers = {
+            filename: data.encode("utf-8") for filename, data in (buffers or {}).items()
+        }
+        if not (sender_seed and receiver_address):
+            for filepath in files:
+                filename = filepath.split("/")[-1]
+                shutil.copyfile(filepath, f"{dirpath}/{filename}")
+            for filename, data in buffers.items():
+                with open(f"{dirpath}/{filename}", "wb") as f:
+                    f.write(data)
+            return dirpath
+        sizes = {filepath.split("/")[-1]: os.path.getsize(filepath) for filepath in files}
+        sizes.update({filename: len(data) for filename, data in buffers.items()})
+        encrypted_sizes = {
+            filename: encrypted_message_size(min(size, LOGS_MAX_LEN))
+            for filename, size in sizes.items()
+        }
+        if size_budget is None:
+            size_budget = sum(encrypted_sizes.values())
+        plan = plan_report_budget(encrypted_sizes, REPORT_ARTIFACTS_PRIORITY, size_budget)
+        _LOGGER.debug(f"Report size plan: {plan}, sizes: {sizes}")
         for filepath in files:
             filename = filepath.split("/")[-1]
-            if sender_seed and receiver_address:
-                with open(filepath, "r") as f:
-                    data = f.read()
-                data = data[-LOGS_MAX_LEN:]
-                encrypted_data = multi_device_encrypt_message(
-                    data, sender_seed, receiver_address
-                )
-                with open(f"{dirpath}/{filename}", "w") as f:
-                    f.write(encrypted_data)
-            else:
-                shutil.copyfile(filepath, f"{dirpath}/{filename}")
+            data = _read_tail(filepath, max_plaintext_size(plan[filename]))
+            _write_encrypted_file(
+                f"{dirpath}/{filename}", data, plan[filename], sender_seed, receiver_address, deterministic
+            )
+        for filename, data in buffers.items():
+            _write_encrypted_file(
+                f"{dirpath}/{filename}", data, plan[filename], sender_seed, receiver_address, deterministic
+            )
         return dirpath
     except Exception as e:
         _LOGGER.error(f"Exception in create temp dir: {e}")
 
 
+def _read_tail(filepath: str, max_bytes: int) -> bytes:
+    with open(filepath, "rb") as f:
+        f.seek(max(0, os.path.getsize(filepath) - max_bytes))
+        return f.read(max_bytes)
+
+
+def _write_encrypted_file(
+    filepath: str,
+    data: bytes,
+    max_size: int,
+    sender_seed: str,
+    receiver_address: str,
+    deterministic: bool = False,
+) -> None:
+    data = truncate_to_bytes(data, max_plaintext_size(max_size))
+    while True:
+        encrypted_data = multi_device_encrypt_message(
+            data.decode("utf-8", errors="ignore"), sender_seed, receiver_address, deterministic
+        )
+        excess = len(encrypted_data) - max_size
+        if excess <= 0 or not data:
+            break
+        _LOGGER.debug(f"Encrypted {filepath} exceeds its budget by {excess} bytes, truncating")
+        data = truncate_to_bytes(data, len(data) - excess // 2 - 1)
+    with open(filepath, "w") as f:
+        f.write(encrypted_data)
+
+
+def encrypted_message_size(plaintext_size: int) -> int:
+    """Upper bound of the multi device encrypted message size in bytes.
+
+    :param plaintext_size: size of the message to encrypt in bytes
+
+    :return: size of the encrypted message
+    """
+    return 2 * plaintext_size + ENCRYPTION_OVERHEAD
+
+
+def max_plaintext_size(encrypted_size: int) -> int:
+    """Maximum message size in bytes which fits into the encrypted size after encryption.
+
+    :param encrypted_size: size of the encrypted message in bytes
+
+    :return: size of the message to encrypt
+    """
+    return max(0, (encrypted_size - ENCRYPTION_OVERHEAD) // 2)
+
+
+def truncate_to_bytes(data: bytes, max_bytes: int) -> bytes:
+    """Keep the end of the data not longer than max_bytes, starting from a line beginning.
+
+    :param data: data to truncate
+    :param max_bytes: maximum size of the result in bytes
+
+    :return: truncated data
+    """
+    if len(data) <= max_bytes:
+        return data
+    if max_bytes <= 0:
+        return b""
+    tail = data[-max_bytes:]
+    line_start = tail.find(b"\n")
+    if line_start == -1 or line_start == len(tail) - 1:
+        return tail
+    return tail[line_start + 1:]
+
+
+def plan_report_budget(
+    sizes: tp.Dict[str, int], priorities: tp.Dict[str, int], budget: int
+) -> tp.Dict[str, int]:
+    """Divide a byte budget between report artifacts by priority.
+
+    Each artifact gets a share of the budget proportional to its priority. Shares
+    left unused by small artifacts are redistributed among the others.
+
+    :param sizes: artifact name to its full size in bytes
+    :param priorities: artifact name to its priority, 1 for unknown artifacts
+    :param budget: total size budget in bytes
+
+    :return: artifact name to its size limit in bytes
+    """
+    plan = {}
+    pending = dict(sizes)
+    budget = max(0, budget)
+    while pending:
+        total_priority = sum(priorities.get(name, 1) for name in pending)
+        shares = {
+            name: budget * priorities.get(name, 1) // total_priority for name in pending
+        }
+        fitting = [name for name in pending if pending[name] <= shares[name]]
+        if not fitting:
+            plan.update(shares)
+            break
+        for name in fitting:
+            plan[name] = pending.pop(name)
+            budget -= plan[name]
+    return plan
+
+
+def estimate_report_memory(files: tp.List[str], buffer_sizes: tp.Optional[tp.Dict[str, int]] = None) -> int:
+    """Estimate peak memory in bytes needed to encrypt the files into a report.
+
+    Files are encrypted one by one, so the peak is defined by the largest one.
+    Snapshots of in-memory buffers are held for the whole build, so they count as well.
+
+    :param files: list of file pathes to encrypt
+    :param buffer_sizes: sizes of in-memory files to snapshot and encrypt, file name to its size
+
+    :return: estimated peak memory in bytes
+    """
+    buffer_sizes = buffer_sizes or {}
+    largest = max((min(size, LOGS_MAX_LEN) for size in buffer_sizes.values()), default=0)
+    for filepath in files:
+        try:
+            largest = max(largest, min(os.path.getsize(filepath), LOGS_MAX_LEN))
+        except OSError:
+            continue
+    return largest * REPORT_MEMORY_FACTOR + sum(buffer_sizes.values())
+
+
 def delete_temp_dir(dirpath: str) -> None:
     """
     Delete temporary directory
@@ -0,0 +1,31 @@
+from custom_components.robonomics_report_service.cid import compute_file_cid, compute_directory_cid
+
+def test_file_cid_matches_ipfs_add():
+    assert compute_file_cid(b"") == "QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH"
+    assert compute_file_cid(b"hello world\n") == "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o"
+
+def test_directory_cid_matches_ipfs_add():
+    assert compute_directory_cid({}) == "QmUNLLsPACCz1vLxQVkXqqLX5R1X345qqfHbsf67hvA3Nn"
+
+def test_big_file_cid_depends_on_every_chunk():
+    data = bytearray(b"a" * (5 * 256 * 1024 + 1))
+    cid = compute_file_cid(bytes(data))
+    data[-1:] = b"b"
+    assert compute_file_cid(bytes(data)) != cid
+
+# Expected CIDs are from `ipfs add --only-hash` of kubo v0.22.0
+def test_multi_chunk_file_cid_matches_ipfs_add():
+    assert compute_file_cid(b"a" * (256 * 1024 + 1)) == "QmTaxvXcxpzzaatSEEAYr7t3knkJ6DmTVbr8MjJJWLRWpV"
+    assert compute_file_cid(bytes(range(256)) * 2344) == "QmRbfZgC5LA5c9E4F2tzmLXWBx8kDfDm2tBRYGc4BASW6M"
+
+def test_two_level_file_cid_matches_ipfs_add():
+    # 175 chunks don't fit in one node with 174 links
+    data = bytes(i % 251 for i in range(256 * 1024)) * 174 + b"x"
+    assert compute_file_cid(data) == "QmYEw8j34ZgDP5TkjwqB18xAjQTztAaX9irDN7HxUbofd1"
+
+def test_report_directory_cid_matches_ipfs_add():
+    files = {
+        "home-assistant.log": bytes(range(256)) * 2344,
+        "issue_description.json": b'{"description":"test"}',
+    }
+    assert compute_directory_cid(files) == "QmXs5TZvafPs8Gcjgqwjzg2kbyt7cGeLh9u7JHYWF3eSgf"
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import typing as tp
+from types import SimpleNamespace
+
+from custom_components.robonomics_report_service import datalog_journal
+from custom_components.robonomics_report_service.datalog_journal import DatalogJournal, DatalogState
+
+
+def create_journal(tmp_path) -> DatalogJournal:
+    hass = SimpleNamespace(config=SimpleNamespace(path=lambda path: str(tmp_path / "journal")), data={})
+    return DatalogJournal(hass)
+
+def write_records(journal: DatalogJournal, records: list, tail: str = "") -> None:
+    journal._append("".join(json.dumps(record) + "\n" for record in records) + tail)
+
+def test_replay_keeps_unfinished_entries(tmp_path):
+    journal = create_journal(tmp_path)
+    write_records(journal, [
+        {"id": 0, "state": DatalogState.Queued, "data": "a"},
+        {"id": 1, "state": DatalogState.Queued, "data": "b"},
+        {"id": 2, "state": DatalogState.Queued, "data": "c"},
+        {"id": 0, "state": DatalogState.Submitted},
+        {"id": 1, "state": DatalogState.Submitted},
+        {"id": 0, "state": DatalogState.Included},
+        {"id": 1, "state": DatalogState.Failed},
+    ])
+    journal = create_journal(tmp_path)
+    journal._load()
+    assert list(journal._pending.items()) == [(2, "c")]
+    assert journal._next_id == 3
+    # Finished entries are compacted away
+    with open(journal.path) as f:
+        assert len(f.readlines()) == 1
+
+def test_broken_tail_is_rewritten(tmp_path):
+    journal = create_journal(tmp_path)
+    write_records(journal, [{"id": 0, "state": DatalogState.Queued, "data": "a"}], tail='{"id": 1, "sta')
+    journal._load()
+    write_records(journal, [{"id": 1, "state": DatalogState.Queued, "data": "b"}])
+    journal = create_journal(tmp_path)
+    journal._load()
+    assert list(journal._pending.items()) == [(0, "a"), (1, "b")]
+
+async def append_and_compact(journal: DatalogJournal) -> tp.Set[int]:
+    async def append_and_finish(i: int) -> tp.Optional[int]:
+        entry_id = await journal.async_append(f"data {i}")
+        if i % 3:
+            await journal.async_set_state([entry_id], DatalogState.Included)
+            return None
+        return entry_id
+
+    entry_ids = await asyncio.gather(*(append_and_finish(i) for i in range(300)))
+    return {entry_id for entry_id in entry_ids if entry_id is not None}
+
+def test_concurrent_appends_survive_compaction(tmp_path, monkeypatch):
+    # Compact after every few finished entries, while other entries are appended
+    monkeypatch.setattr(datalog_journal, "DATALOG_JOURNAL_COMPACT_THRESHOLD", 5)
+    journal = create_journal(tmp_path)
+    pending = asyncio.run(append_and_compact(journal))
+    assert set(journal._pending) == pending
+    journal = create_journal(tmp_path)
+    journal._load()
+    assert set(journal._pending) == pending
@@ -0,0 +1,36 @@
+from custom_components.robonomics_report_service.endpoint_manager import EndpointManager
+
+endpoints = ["wss://first/", "wss://second/", "wss://third/"]
+
+
+def test_fastest_endpoint_is_chosen():
+    manager = EndpointManager(hass=None, endpoints=endpoints)
+    assert manager.best() == endpoints[0]
+    manager.report_success(endpoints[0], 0.5)
+    manager.report_success(endpoints[1], 0.1)
+    assert manager.best() == endpoints[1]
+    assert manager.best(exclude=[endpoints[1]]) == endpoints[0]
+
+def test_circuit_is_opened_after_failures():
+    manager = EndpointManager(hass=None, endpoints=endpoints[:2])
+    manager.report_success(endpoints[0], 0.1)
+    manager.report_success(endpoints[1], 0.5)
+    for _ in range(3):
+        manager.report_failure(endpoints[0])
+    assert manager.stats()[endpoints[0]]["circuit_open"]
+    assert manager.best() == endpoints[1]
+    for _ in range(3):
+        manager.report_failure(endpoints[1])
+    # All circuits are open, the one closed first is used
+    assert manager.best() == endpoints[0]
+
+def test_recovered_endpoint_is_chosen_again():
+    manager = EndpointManager(hass=None, endpoints=endpoints[:2])
+    manager.report_success(endpoints[0], 0.1)
+    manager.report_success(endpoints[1], 0.5)
+    for _ in range(2):
+        manager.report_failure(endpoints[0])
+    assert manager.best() == endpoints[1]
+    for _ in range(10):
+        manager.report_success(endpoints[0], 0.1)
+    assert manager.best() == endpoints[0]
@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+from custom_components.robonomics_report_service.executor import ReportServiceExecutor
+
+
+def test_jobs_run_in_bounded_pool():
+    async def run():
+        executor = ReportServiceExecutor(max_workers=2, max_queue=1)
+        threads = set()
+        def job(value: int) -> int:
+            threads.add(threading.current_thread().name)
+            return value * 2
+        results = await asyncio.gather(*(executor.async_run(job, i) for i in range(10)))
+        executor.shutdown()
+        return results, threads, executor.stats()
+
+    results, threads, stats = asyncio.run(run())
+    assert results == [i * 2 for i in range(10)]
+    assert len(threads) <= 2
+    assert stats["completed"] == 10
+    assert stats["queued"] == 0
+
+def test_tasks_are_cancelled_before_shutdown():
+    async def run():
+        executor = ReportServiceExecutor(max_workers=1)
+        started = asyncio.Event()
+        async def report():
+            started.set()
+            await asyncio.sleep(10)
+            await executor.async_run(sum, [1, 2])
+        task = executor.create_task(report())
+        await started.wait()
+        await executor.async_cancel_tasks()
+        executor.shutdown()
+        return task
+
+    task = asyncio.run(run())
+    assert task.cancelled()
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+from custom_components.robonomics_report_service import ipfs
+from custom_components.robonomics_report_service.ipfs import IPFS
+from custom_components.robonomics_report_service.pin_ledger import PinState
+from custom_components.robonomics_report_service.storage import StorageBackend
+
+first_cid = "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o"
+second_cid = "QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH"
+
+
+class SlowUnpinBackend(StorageBackend):
+    def __init__(self, hass):
+        super().__init__(hass)
+        self.unpinned = []
+        self.on_unpin = None
+
+    async def pin(self, filename, content):
+        pass
+
+    async def pin_directory(self, files, dirname):
+        pass
+
+    async def unpin(self, cid):
+        await asyncio.sleep(0.01)
+        self.unpinned.append(cid)
+        if self.on_unpin is not None:
+            self.on_unpin(cid)
+        return True
+
+    async def exists(self, cid):
+        return cid not in self.unpinned
+
+
+class Store:
+    def async_delay_save(self, data_func, delay):
+        pass
+
+
+def create_ipfs(monkeypatch) -> IPFS:
+    monkeypatch.setattr(ipfs, "PIN_GC_UNPIN_DELAY", 0.01)
+    hass = SimpleNamespace(data={})
+    client = IPFS(hass, SlowUnpinBackend(hass))
+    client.pin_ledger._pins = {}
+    client.pin_ledger._store = Store()
+    for cid in (first_cid, second_cid):
+        client.pin_ledger.add_reference(cid, "old report")
+        client.pin_ledger.remove_reference(cid, "old report")
+    return client
+
+def test_garbage_collector_skips_pin_referenced_again(monkeypatch):
+    client = create_ipfs(monkeypatch)
+    # The second pin is reused by a new report while the first one is removed
+    client.backend.on_unpin = lambda cid: client.pin_ledger.add_reference(second_cid, "new report")
+    asyncio.run(client.async_collect_garbage())
+    assert client.backend.unpinned == [first_cid]
+    assert not client.pin_ledger.is_pinned(first_cid)
+    assert client.pin_ledger.is_pinned(second_cid)
+    assert client.pin_ledger.stats()[PinState.Live] == 1
+
+def test_pin_referenced_during_unpin_keeps_its_owner(monkeypatch):
+    client = create_ipfs(monkeypatch)
+    client.backend.on_unpin = lambda cid: client.pin_ledger.add_reference(cid, "new report")
+    asyncio.run(client.async_collect_garbage())
+    for cid in (first_cid, second_cid):
+        assert client.pin_ledger.is_pinned(cid)
+    assert client.pin_ledger.stats()[PinState.Live] == 2
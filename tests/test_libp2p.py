@@ -0,0 +1,335 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import websockets
+
+from custom_components.robonomics_report_service import libp2p
+from custom_components.robonomics_report_service.libp2p import LibP2PReports, LibP2PRPC
+from custom_components.robonomics_report_service.pyproxy import Libp2pProxyAPI
+from custom_components.robonomics_report_service.pyproxy.utils.backoff import Backoff
+from custom_components.robonomics_report_service.pyproxy.utils.dispatcher import CallbackDispatcher
+from custom_components.robonomics_report_service.pyproxy.utils.message import encode_msg_to_libp2p
+from custom_components.robonomics_report_service.pyproxy.utils.protocols_manager import Callback, CallbackTypes
+from custom_components.robonomics_report_service.pyproxy.utils.websocket import BINARY_SUBPROTOCOL, KeepAlive, get_extension_names
+
+hass_address = "4FNQo2tK6PLeEhNEUuPePs8B8xKNwx15fX7tC2XnYpkC8W1j"
+protocol = "/initialization"
+
+
+async def request_concurrently(echo_request_id: bool) -> list:
+    requests = []
+
+    async def stand_in_proxy(websocket):
+        async for raw in websocket:
+            message = json.loads(raw)
+            if "protocols_to_listen" in message:
+                continue
+            requests.append(message["data"]["data"])
+            if len(requests) == 3:
+                # Answer in reverse order, responses must still reach their requests
+                answers = reversed(requests) if echo_request_id else requests
+                for request in answers:
+                    response = {"number": request["number"]}
+                    if echo_request_id:
+                        response["request_id"] = request["request_id"]
+                    await websocket.send(json.dumps({"protocol": f"{protocol}/{hass_address}", "data": response}))
+
+    async with websockets.serve(stand_in_proxy, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        proxy = Libp2pProxyAPI(f"ws://127.0.0.1:{port}")
+        rpc = LibP2PRPC(proxy, hass_address)
+        responses = await asyncio.gather(*(rpc.request({"number": i}, protocol, timeout=5) for i in range(3)))
+        await proxy.unsubscribe_from_all_protocols()
+    return responses
+
+def test_concurrent_requests_are_matched_by_id():
+    responses = asyncio.run(request_concurrently(echo_request_id=True))
+    assert [response["number"] for response in responses] == [0, 1, 2]
+
+def test_responses_without_id_are_matched_in_order():
+    responses = asyncio.run(request_concurrently(echo_request_id=False))
+    assert [response["number"] for response in responses] == [0, 1, 2]
+
+async def request_many_concurrently(count: int) -> tuple:
+    async def stand_in_proxy(websocket):
+        async for raw in websocket:
+            message = json.loads(raw)
+            if "protocols_to_listen" in message:
+                continue
+            response = {"request_id": message["data"]["data"]["request_id"]}
+            await websocket.send(json.dumps({"protocol": f"{protocol}/{hass_address}", "data": response}))
+
+    async with websockets.serve(stand_in_proxy, "127.0.0.1", 0) as server:
+        proxy = Libp2pProxyAPI(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}", keep_alive=KeepAlive())
+        rpc = LibP2PRPC(proxy, hass_address)
+        start = time.monotonic()
+        responses = await asyncio.gather(*(rpc.request({"number": i}, protocol, timeout=5) for i in range(count)))
+        duration = time.monotonic() - start
+        await proxy.unsubscribe_from_all_protocols()
+    return responses, duration
+
+def test_concurrent_round_trips_are_faster_than_polling():
+    # Responses were polled once a second before, one request at a time
+    responses, duration = asyncio.run(request_many_concurrently(100))
+    assert len(responses) == 100
+    assert duration < 0.5
+
+async def send_with_keep_alive() -> tuple:
+    connections = []
+    received = []
+
+    async def stand_in_proxy(websocket):
+        connections.append(websocket)
+        async for raw in websocket:
+            message = json.loads(raw)
+            if "protocols_to_listen" not in message:
+                received.append(message["data"]["data"])
+
+    async with websockets.serve(stand_in_proxy, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        proxy = Libp2pProxyAPI(f"ws://127.0.0.1:{port}", keep_alive=KeepAlive(idle_timeout=1))
+        for i in range(3):
+            await proxy.send_msg_to_libp2p(json.dumps({"number": i}), "/report")
+        await asyncio.sleep(0.1)
+        connections_before_close = len(connections)
+        # Connection dropped by the proxy is opened again by the next message
+        await connections[0].close()
+        await asyncio.sleep(0.1)
+        await proxy.send_msg_to_libp2p(json.dumps({"number": 3}), "/report")
+        await asyncio.sleep(1.5)
+        closed_when_idle = proxy.ws_client.websocket is None
+    return connections_before_close, len(connections), received, closed_when_idle
+
+def test_keep_alive_connection_is_reused():
+    connections_before_close, connections, received, closed_when_idle = asyncio.run(send_with_keep_alive())
+    assert connections_before_close == 1
+    assert connections == 2
+    assert [data["number"] for data in received] == [0, 1, 2, 3]
+    assert closed_when_idle
+
+async def send_while_proxy_is_down() -> tuple:
+    received = []
+
+    async def stand_in_proxy(websocket):
+        async for raw in websocket:
+            message = json.loads(raw)
+            if "protocols_to_listen" not in message:
+                received.append(message["data"]["data"])
+
+    # Take a free port and release it, so the first connection attempts fail
+    server = await websockets.serve(stand_in_proxy, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    server.close()
+    await server.wait_closed()
+
+    keep_alive = KeepAlive(reconnect_delay=0.05, max_reconnect_delay=0.2, send_buffer_size=3)
+    proxy = Libp2pProxyAPI(f"ws://127.0.0.1:{port}", keep_alive=keep_alive)
+    start = time.monotonic()
+    for i in range(4):
+        await proxy.send_msg_to_libp2p(json.dumps({"number": i}), "/report")
+    send_time = time.monotonic() - start
+    await asyncio.sleep(0.5)
+    async with websockets.serve(stand_in_proxy, "127.0.0.1", port):
+        await asyncio.sleep(0.5)
+        await proxy.unsubscribe_from_all_protocols()
+    return send_time, received
+
+def test_messages_are_buffered_while_proxy_is_down():
+    send_time, received = asyncio.run(send_while_proxy_is_down())
+    assert send_time < 0.05
+    # The oldest message doesn't fit the buffer, the rest are sent in order
+    assert [data["number"] for data in received] == [1, 2, 3]
+
+async def buffer_big_messages() -> list:
+    keep_alive = KeepAlive(reconnect_delay=10, send_buffer_bytes=1000)
+    proxy = Libp2pProxyAPI("ws://127.0.0.1:1", keep_alive=keep_alive)
+    for i in range(4):
+        await proxy.send_msg_to_libp2p({"number": i, "report": "secret" * 60}, "/report")
+    await proxy.send_msg_to_libp2p({"number": 4, "report": "secret" * 300}, "/report")
+    buffered = [json.loads(msg)["data"]["data"]["number"] for _, msg in proxy.ws_client._outbox]
+    await proxy.unsubscribe_from_all_protocols()
+    return buffered
+
+def test_send_buffer_is_bounded_in_bytes(caplog):
+    # Messages are about 440 bytes, only two fit the buffer. The last one is bigger than the
+    # buffer, but is kept alone
+    assert asyncio.run(buffer_big_messages()) == [4]
+    dropped = [record.getMessage() for record in caplog.records if "dropping" in record.getMessage()]
+    assert len(dropped) == 4
+    assert "to /report" in dropped[0]
+    assert not any("secret" in message for message in dropped)
+
+def test_backoff_grows_to_maximum():
+    backoff = Backoff(initial=1, maximum=8)
+    delays = [backoff.next_delay() for _ in range(6)]
+    for delay, cap in zip(delays, [1, 2, 4, 8, 8, 8]):
+        assert cap / 2 <= delay <= cap
+    backoff.reset()
+    assert backoff.next_delay() <= 1
+
+async def dispatch_with_slow_callback() -> tuple:
+    dispatcher = CallbackDispatcher(max_concurrency=2)
+    handled = []
+    release = asyncio.Event()
+
+    async def slow(message):
+        await release.wait()
+        handled.append(("slow", message))
+
+    async def fast(message):
+        handled.append(("fast", message))
+
+    def failing(message):
+        raise ValueError(message)
+
+    dispatcher.dispatch("/slow", Callback(slow, CallbackTypes.AsyncType), 0)
+    dispatcher.dispatch("/slow", Callback(slow, CallbackTypes.AsyncType), 1)
+    dispatcher.dispatch("/failing", Callback(failing, CallbackTypes.SyncType, ordered=False), 0)
+    for i in range(3):
+        dispatcher.dispatch("/fast", Callback(fast, CallbackTypes.AsyncType), i)
+    await asyncio.sleep(0.05)
+    handled_before_release = list(handled)
+    depth_before_release = dispatcher.queue_depth
+    release.set()
+    await asyncio.sleep(0.05)
+    return handled_before_release, depth_before_release, handled, dispatcher.stats()
+
+def test_slow_callback_does_not_block_other_protocols():
+    handled_before_release, depth_before_release, handled, stats = asyncio.run(dispatch_with_slow_callback())
+    assert handled_before_release == [("fast", 0), ("fast", 1), ("fast", 2)]
+    # The second message of the slow protocol waits for the first one
+    assert depth_before_release == 1
+    assert handled[3:] == [("slow", 0), ("slow", 1)]
+    assert stats["queue_depth"] == 0
+    assert stats["protocols"]["/failing"]["errors"] == 1
+    assert stats["protocols"]["/slow"]["handled"] == 2
+    assert stats["protocols"]["/slow"]["max_latency"] > 0
+
+async def change_subscriptions() -> list:
+    updates = []
+
+    async def stand_in_proxy(websocket):
+        async for raw in websocket:
+            message = json.loads(raw)
+            if "protocols_to_listen" in message:
+                updates.append(message["protocols_to_listen"])
+
+    async def callback(message):
+        pass
+
+    async with websockets.serve(stand_in_proxy, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        proxy = Libp2pProxyAPI(f"ws://127.0.0.1:{port}", keep_alive=KeepAlive(subscription_debounce=0.1))
+        await proxy.subscribe_to_protocol_async("/a", callback)
+        await proxy.subscribe_to_protocol_async("/b", callback)
+        await proxy.unsubscribe_from_protocol("/a")
+        await asyncio.sleep(0.3)
+        # Unsubscribe and subscribe again within the window don't change the list
+        await proxy.unsubscribe_from_protocol("/b")
+        await proxy.subscribe_to_protocol_async("/b", callback)
+        await asyncio.sleep(0.3)
+        await proxy.unsubscribe_from_all_protocols()
+    return updates
+
+def test_subscription_changes_are_coalesced():
+    assert asyncio.run(change_subscriptions()) == [["/b"]]
+
+async def send_report_and_linger() -> tuple:
+    received = []
+
+    async def stand_in_proxy(websocket):
+        async for raw in websocket:
+            message = json.loads(raw)
+            received.append((time.monotonic(), message))
+            if message.get("protocol") == "/report":
+                response = {"datalog": "0x01", "id": message["data"]["data"]["id"]}
+                await websocket.send(json.dumps({"protocol": f"/report/{hass_address}", "data": response}))
+
+    responses = []
+
+    async def handle_response(report_id, response):
+        responses.append(report_id)
+
+    async with websockets.serve(stand_in_proxy, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        # The debounce is long, a queued report must not wait for it
+        proxy = Libp2pProxyAPI(f"ws://127.0.0.1:{port}", keep_alive=KeepAlive(subscription_debounce=1))
+        reports = LibP2PReports(proxy, hass_address)
+        reports.register_report_handler(handle_response)
+        start = time.monotonic()
+        await reports.send_report({"description": "test"}, 1)
+        await asyncio.sleep(0.3)
+        lingering = reports._unsubscribe_task is not None
+        await asyncio.sleep(1.5)
+        await proxy.unsubscribe_from_all_protocols()
+    return start, received, responses, lingering
+
+def test_subscription_is_sent_with_queued_report(monkeypatch):
+    monkeypatch.setattr(libp2p, "LIBP2P_REPORT_SUBSCRIPTION_LINGER", 0.5)
+    start, received, responses, lingering = asyncio.run(send_report_and_linger())
+    (subscribed_at, subscription), (sent_at, report) = received[:2]
+    # The subscription goes first, so the response to the report is not missed
+    assert subscription == {"protocols_to_listen": [f"/report/{hass_address}"]}
+    assert report["protocol"] == "/report"
+    assert sent_at - start < 0.5
+    assert responses == [1]
+    assert lingering
+    # Unsubscribed after the linger, with the debounce
+    assert received[2][1] == {"protocols_to_listen": []}
+
+def test_message_formats_give_the_same_message():
+    data = {"report": {"logs.txt": "ab" * 10}, "id": 1}
+    expected = {"protocol": "/report", "serverPeerId": "peer", "save_data": False, "data": {"data": data}}
+    for payload in (data, json.dumps(data), json.dumps(data).encode()):
+        assert json.loads(encode_msg_to_libp2p(payload, "/report", "peer", False)) == expected
+    plain = json.loads(encode_msg_to_libp2p("not json", "/report", "peer", False))
+    assert plain["data"]["data"] == "not json"
+
+async def send_report_to_proxy(binary_proxy: bool) -> tuple:
+    frames = []
+    responses = []
+    negotiated = {}
+
+    async def stand_in_proxy(websocket):
+        negotiated["subprotocol"] = websocket.subprotocol
+        negotiated["extensions"] = get_extension_names(websocket)
+        async for raw in websocket:
+            message = json.loads(raw)
+            if "protocols_to_listen" in message:
+                continue
+            frames.append((type(raw), message["data"]["data"]))
+            response = json.dumps({"protocol": f"/report/{hass_address}", "data": {"id": 1}})
+            await websocket.send(response.encode() if binary_proxy else response)
+
+    async def callback(message):
+        responses.append(message)
+
+    serve_kwargs = {"subprotocols": [BINARY_SUBPROTOCOL]} if binary_proxy else {"compression": None}
+    async with websockets.serve(stand_in_proxy, "127.0.0.1", 0, **serve_kwargs) as server:
+        port = server.sockets[0].getsockname()[1]
+        proxy = Libp2pProxyAPI(f"ws://127.0.0.1:{port}", keep_alive=KeepAlive(), binary_frames=True)
+        await proxy.subscribe_to_protocol_async(f"/report/{hass_address}", callback)
+        await proxy.send_msg_to_libp2p({"report": {"logs.txt": "ab" * 1000}, "id": 1}, "/report")
+        await asyncio.sleep(0.3)
+        await proxy.unsubscribe_from_all_protocols()
+    return negotiated, frames, responses
+
+def test_binary_frames_and_compression_with_capable_proxy():
+    negotiated, frames, responses = asyncio.run(send_report_to_proxy(binary_proxy=True))
+    assert negotiated == {"subprotocol": BINARY_SUBPROTOCOL, "extensions": ["permessage-deflate"]}
+    assert frames == [(bytes, {"report": {"logs.txt": "ab" * 1000}, "id": 1})]
+    assert responses == [{"id": 1}]
+
+def test_text_frames_with_plain_proxy():
+    negotiated, frames, responses = asyncio.run(send_report_to_proxy(binary_proxy=False))
+    assert negotiated == {"subprotocol": None, "extensions": []}
+    assert frames == [(str, {"report": {"logs.txt": "ab" * 1000}, "id": 1})]
+    assert responses == [{"id": 1}]
+
+def test_extensions_of_legacy_connection():
+    deflate = SimpleNamespace(name="permessage-deflate")
+    assert get_extension_names(SimpleNamespace(extensions=[deflate])) == ["permessage-deflate"]
+    assert get_extension_names(SimpleNamespace(protocol=SimpleNamespace(extensions=[deflate]))) == ["permessage-deflate"]
+    assert get_extension_names(SimpleNamespace()) == []
@@ -0,0 +1,42 @@
+import logging
+
+from custom_components.robonomics_report_service.log_buffer import RingBufferLogHandler
+
+
+def create_handler(max_bytes: int) -> RingBufferLogHandler:
+    handler = RingBufferLogHandler(max_bytes)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+def emit(handler: RingBufferLogHandler, message: str) -> None:
+    handler.handle(logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None))
+
+def test_snapshot_keeps_records_in_order():
+    handler = create_handler(1000)
+    for i in range(5):
+        emit(handler, f"record {i}")
+    assert handler.snapshot() == "".join(f"record {i}\n" for i in range(5))
+    assert handler.size == len(handler.snapshot().encode())
+
+def test_oldest_records_are_evicted_over_byte_budget():
+    handler = create_handler(20)
+    for i in range(5):
+        emit(handler, f"record {i}") # 9 bytes with the new line
+    assert handler.snapshot() == "record 3\nrecord 4\n"
+    assert handler.size == 18
+
+def test_oversized_record_keeps_its_tail():
+    handler = create_handler(10)
+    emit(handler, "short")
+    emit(handler, "a" * 20 + "tail")
+    assert handler.snapshot() == "aaaaa" + "tail\n"
+    assert handler.size == 10
+
+def test_multibyte_records_are_counted_in_bytes():
+    handler = create_handler(12)
+    emit(handler, "ёёё") # 7 bytes with the new line
+    emit(handler, "ёёё")
+    assert handler.snapshot() == "ёёё\n"
+    handler.clear()
+    assert handler.size == 0
+    assert handler.snapshot() == ""
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+from custom_components.robonomics_report_service.const import (
+    DOMAIN,
+    LOG_BUFFER,
+    LOGS_MAX_LEN,
+    REPORT_MEMORY_BUDGET_KEY,
+    REPORT_MEMORY_FACTOR,
+)
+from custom_components.robonomics_report_service.diagnostics import async_get_config_entry_diagnostics
+from custom_components.robonomics_report_service.executor import ReportServiceExecutor
+from custom_components.robonomics_report_service.log_buffer import RingBufferLogHandler
+from custom_components.robonomics_report_service.memory_budget import ReportMemoryBudget
+from custom_components.robonomics_report_service.report_service import ReportService
+from custom_components.robonomics_report_service.utils import estimate_report_memory
+
+
+async def reserve_over_budget() -> tuple:
+    budget = ReportMemoryBudget(100)
+    order = []
+    release_first = asyncio.Event()
+
+    async def build(name: str, nbytes: int, release: asyncio.Event = None):
+        async with budget.reserve(nbytes):
+            order.append(f"{name} started")
+            if release is not None:
+                await release.wait()
+        order.append(f"{name} finished")
+
+    first = asyncio.create_task(build("first", 70, release_first))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(build("second", 50))
+    await asyncio.sleep(0.01)
+    stats_while_waiting = budget.stats()
+    release_first.set()
+    await asyncio.gather(first, second)
+    return order, stats_while_waiting, budget.stats()
+
+def test_build_waits_for_free_budget():
+    order, stats_while_waiting, stats = asyncio.run(reserve_over_budget())
+    assert order == ["first started", "first finished", "second started", "second finished"]
+    assert stats_while_waiting["bytes_in_use"] == 70
+    assert stats_while_waiting["waiting"] == 1
+    assert stats["bytes_in_use"] == 0
+    assert stats["peak_bytes"] == 70
+    assert stats["waiting"] == 0
+    assert stats["last_wait_time"] > 0
+
+def test_build_larger_than_budget_is_admitted_alone():
+    async def run():
+        budget = ReportMemoryBudget(100)
+        async with budget.reserve(1000):
+            in_use = budget.bytes_in_use
+        return in_use, budget.bytes_in_use
+
+    assert asyncio.run(run()) == (100, 0)
+
+def test_estimate_report_memory_uses_largest_file(tmp_path):
+    small = tmp_path / "small.log"
+    small.write_bytes(b"x" * 10)
+    large = tmp_path / "large.log"
+    large.write_bytes(b"x" * 1000)
+    files = [str(small), str(large), str(tmp_path / "missing.log")]
+    assert estimate_report_memory(files) == 1000 * REPORT_MEMORY_FACTOR
+    # The snapshot of the buffer is held during the build as well
+    assert estimate_report_memory(files, {"home-assistant.log": 2000}) == 2000 * REPORT_MEMORY_FACTOR + 2000
+    # Logs are truncated to the maximum length before encryption
+    assert estimate_report_memory([], {"home-assistant.log": LOGS_MAX_LEN + 1}) == (
+        LOGS_MAX_LEN * REPORT_MEMORY_FACTOR + LOGS_MAX_LEN + 1
+    )
+
+def test_budget_stats_are_in_diagnostics():
+    budget = ReportMemoryBudget(100)
+    hass = SimpleNamespace(data={DOMAIN: {REPORT_MEMORY_BUDGET_KEY: budget}})
+    diagnostics = asyncio.run(async_get_config_entry_diagnostics(hass, None))
+    assert diagnostics["report_memory_budget"] == budget.stats()
+
+async def build_report_while_budget_is_taken(tmp_path) -> list:
+    events = []
+    log_buffer = RingBufferLogHandler(LOGS_MAX_LEN)
+    log_buffer.emit(logging.makeLogRecord({"msg": "x" * 1000}))
+    snapshot = log_buffer.snapshot
+    log_buffer.snapshot = lambda: events.append("snapshot") or snapshot()
+
+    async def add_executor_job(func, *args):
+        return func(*args)
+
+    hass = SimpleNamespace(
+        data={DOMAIN: {LOG_BUFFER: log_buffer}},
+        config=SimpleNamespace(path=lambda *args: str(tmp_path)),
+        async_add_executor_job=add_executor_job,
+    )
+    service = ReportService.__new__(ReportService)
+    service.hass = hass
+    service.executor = ReportServiceExecutor()
+    service.memory_budget = ReportMemoryBudget(100)
+
+    async def create_files(files, buffers, size_budget):
+        return str(tmp_path)
+
+    async def add_description(issue_description, tempdir):
+        pass
+
+    service._async_create_temp_dir_with_encrypted_files = create_files
+    service._async_add_description_json = add_description
+
+    async with service.memory_budget.reserve(100):
+        build = asyncio.create_task(service._create_temp_dir_with_report_data({"description": "test"}))
+        await asyncio.sleep(0.1)
+        events.append("released")
+    await build
+    return events
+
+def test_logs_snapshot_is_taken_after_budget_is_reserved(tmp_path):
+    assert asyncio.run(build_report_while_budget_is_taken(tmp_path)) == ["released", "snapshot"]
@@ -0,0 +1,37 @@
+import json
+
+from custom_components.robonomics_report_service.error_sources.sources.utils.message_formatter import MessageFormatter
+
+
+def test_problems_are_grouped_by_device():
+    problems = {
+        "unavailables": {
+            "devices": {
+                "lamp": {"device_name": "Lamp", "entities": ["light.lamp", "sensor.lamp_power"]},
+                "plug": {"device_name": "Plug", "entities": ["switch.plug"]},
+            },
+            "entities": ["sensor.template"],
+        },
+        "not updated": {
+            "devices": {"lamp": {"device_name": "Lamp", "entities": ["sensor.lamp_energy"]}},
+            "entities": [],
+        },
+    }
+    report = MessageFormatter.format_devices_report(problems)
+    assert report == {
+        "devices": {
+            "lamp": {
+                "name": "Lamp",
+                "unavailables": ["light.lamp", "sensor.lamp_power"],
+                "not updated": ["sensor.lamp_energy"],
+            },
+            "plug": {"name": "Plug", "unavailables": ["switch.plug"]},
+        },
+        "entities": {"unavailables": ["sensor.template"]},
+    }
+    # The description is sent as JSON, so the report must stay serializable
+    assert json.loads(json.dumps(report)) == report
+
+def test_report_without_problems_is_empty():
+    problems = {"unavailables": {"devices": {}, "entities": []}, "not updated": {"devices": {}, "entities": []}}
+    assert MessageFormatter.format_devices_report(problems) == {"devices": {}, "entities": {}}
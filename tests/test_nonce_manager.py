@@ -0,0 +1,15 @@
+from custom_components.robonomics_report_service.nonce_manager import NonceManager
+
+
+def test_nonces_are_assigned_locally():
+    fetched = []
+    def fetch_nonce() -> int:
+        fetched.append(True)
+        return 5
+
+    nonces = NonceManager()
+    assert [nonces.next(fetch_nonce) for _ in range(3)] == [5, 6, 7]
+    assert len(fetched) == 1
+    nonces.resync()
+    assert nonces.next(fetch_nonce) == 5
+    assert len(fetched) == 2
@@ -0,0 +1,76 @@
+import asyncio
+
+from custom_components.robonomics_report_service.const import PIN_COMMITTED_MAX_AGE
+from custom_components.robonomics_report_service.pin_ledger import PinLedger, PinState
+
+cid = "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o"
+
+
+def create_ledger() -> PinLedger:
+    ledger = PinLedger(hass=None)
+    ledger._pins = {}
+    return ledger
+
+def test_pin_is_removed_with_last_reference():
+    ledger = create_ledger()
+    ledger.add_reference(cid, "1")
+    ledger.add_reference(cid, "2")
+    assert not ledger.remove_reference(cid, "1")
+    assert ledger.remove_reference(cid, "2")
+    assert ledger.stats()[PinState.Expired] == 1
+
+def test_retained_pin_expires_later():
+    ledger = create_ledger()
+    ledger.add_reference(cid, "1")
+    assert not ledger.remove_reference(cid, "1", retention=60)
+    assert ledger.get_expired(10) == []
+
+def test_committed_pin_is_never_expired():
+    ledger = create_ledger()
+    ledger.add_reference(cid, "1")
+    ledger.commit(cid)
+    assert not ledger.remove_reference(cid, "1")
+    assert ledger.get_expired(10) == []
+    assert ledger.stats()[PinState.Committed] == 1
+
+def test_reset_forgets_all_pins():
+    ledger = create_ledger()
+    ledger.add_reference(cid, "1")
+    ledger.commit(cid)
+    ledger.reset()
+    assert not ledger.is_pinned(cid)
+    assert sum(ledger.stats().values()) == 0
+
+class Store:
+    def __init__(self, data=None):
+        self.data = data
+        self.delayed_saves = 0
+
+    async def async_load(self):
+        return self.data
+
+    def async_delay_save(self, data_func, delay):
+        self.delayed_saves += 1
+        self.data = data_func()
+
+def test_ledger_of_another_storage_is_dropped():
+    store = Store({"storage": "pinata", "pins": {cid: {"owners": [], "state": PinState.Committed}}})
+    same_storage = PinLedger(hass=None, storage_id="pinata")
+    same_storage._store = store
+    asyncio.run(same_storage.async_load())
+    assert same_storage.is_pinned(cid)
+    other_storage = PinLedger(hass=None, storage_id="kubo:http://127.0.0.1:5001")
+    other_storage._store = store
+    asyncio.run(other_storage.async_load())
+    assert not other_storage.is_pinned(cid)
+    other_storage.save()
+    assert store.data == {"storage": "kubo:http://127.0.0.1:5001", "pins": {}}
+
+def test_unused_committed_pins_are_forgotten():
+    ledger = create_ledger()
+    ledger.commit(cid)
+    ledger.commit("QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH")
+    ledger._pins[cid]["updated"] -= PIN_COMMITTED_MAX_AGE + 1
+    assert ledger.get_expired(10) == []
+    assert not ledger.is_pinned(cid)
+    assert ledger.stats()[PinState.Committed] == 1
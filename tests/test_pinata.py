@@ -0,0 +1,70 @@
+import asyncio
+import io
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from custom_components.robonomics_report_service.pinata import PinataClient
+
+api_key = "public"
+secret_api_key = "secret"
+ipfs_hash = "QmYwAPJzv5CZsnA625s3Xf2nemtYgPpHdWEz79ojWnPbdG"
+
+
+def create_pinata_app(received: list) -> web.Application:
+    async def pin_file(request: web.Request) -> web.Response:
+        if request.headers.get("pinata_api_key") != api_key:
+            return web.Response(status=403, text='{"error":{"reason":"API_KEY_REVOKED"}}')
+        reader = await request.multipart()
+        async for part in reader:
+            received.append((part.filename, bytes(await part.read())))
+        return web.json_response({"IpfsHash": ipfs_hash, "PinSize": 1})
+
+    async def unpin(request: web.Request) -> web.Response:
+        received.append(request.match_info["ipfs_hash"])
+        return web.Response(text="OK")
+
+    app = web.Application()
+    app.router.add_post("/pinning/pinFileToIPFS", pin_file)
+    app.router.add_delete("/pinning/unpin/{ipfs_hash}", unpin)
+    return app
+
+
+async def run_with_pinata(test, key: str = api_key):
+    received = []
+    async with TestServer(create_pinata_app(received)) as server:
+        async with aiohttp.ClientSession() as session:
+            client = PinataClient(session, key, secret_api_key, str(server.make_url("")))
+            res = await test(client)
+    return res, received
+
+
+def test_pin_file_streams_file_object():
+    content = b"log line\n" * 100_000
+    res, received = asyncio.run(
+        run_with_pinata(lambda client: client.pin_file_to_ipfs(io.BytesIO(content), "home-assistant.log"))
+    )
+    assert res["IpfsHash"] == ipfs_hash
+    assert received == [("home-assistant.log", content)]
+
+def test_pin_file_with_revoked_keys():
+    res, received = asyncio.run(
+        run_with_pinata(lambda client: client.pin_file_to_ipfs(b"data", "file"), key="revoked")
+    )
+    assert res["status"] == 403
+    assert "API_KEY_REVOKED" in res["text"]
+    assert received == []
+
+def test_remove_pin():
+    res, received = asyncio.run(run_with_pinata(lambda client: client.remove_pin_from_ipfs(ipfs_hash)))
+    assert res == {"status": 200, "text": "OK"}
+    assert received == [ipfs_hash]
+
+def test_pin_directory_in_one_request():
+    files = [("home-assistant.log", io.BytesIO(b"logs")), ("issue_description.json", b"{}")]
+    res, received = asyncio.run(
+        run_with_pinata(lambda client: client.pin_directory_to_ipfs(files, "report"))
+    )
+    assert res["IpfsHash"] == ipfs_hash
+    assert received == [("report/home-assistant.log", b"logs"), ("report/issue_description.json", b"{}")]
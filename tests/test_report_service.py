@@ -0,0 +1,68 @@
+import asyncio
+
+from custom_components.robonomics_report_service.executor import ReportServiceExecutor
+from custom_components.robonomics_report_service.report_model import ReportData, ReportStatus
+from custom_components.robonomics_report_service.report_service import ReportService
+
+bundle = {"home-assistant.log": "QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o"}
+
+
+class IPFS:
+    def __init__(self):
+        self.pinned = []
+
+    async def pin_files(self, dirname, owner=None):
+        await asyncio.sleep(0.01)
+        self.pinned.append(owner)
+        return dict(bundle)
+
+
+class Robonomics:
+    def __init__(self):
+        self.datalogs = []
+
+    async def send_datalog(self, data):
+        self.datalogs.append(data)
+
+
+def create_report_service() -> ReportService:
+    service = ReportService.__new__(ReportService)
+    service.ipfs = IPFS()
+    service.robonomics = Robonomics()
+    service._pending_reports = {}
+    service._requesting_new_pinata_creds = False
+    service.executor = ReportServiceExecutor()
+
+    async def create_temp_dir(issue_description):
+        return "/nonexistent/report"
+
+    async def remove_tempdir(tempdir):
+        pass
+
+    service._create_temp_dir_with_report_data = create_temp_dir
+    service._remove_tempdir = remove_tempdir
+    return service
+
+async def respond_with_datalog(service: ReportService, report: ReportData, responses: int) -> None:
+    service._pending_reports[report.id] = report
+    for ticket in range(responses):
+        await service._handle_report_response(report.id, {"datalog": True, "ticket_ids": [ticket]})
+    await asyncio.sleep(0.1)
+
+def test_report_without_logs_is_pinned_once_for_datalog():
+    service = create_report_service()
+    report = ReportData.create({"issue_description.json": "0x01"}, "test", report_id="1")
+    # The integrator repeats the response while the files are pinned
+    asyncio.run(respond_with_datalog(service, report, responses=2))
+    assert service.ipfs.pinned == ["1"]
+    assert service.robonomics.datalogs == [{**bundle, "ticket_ids": [0]}]
+    assert report.bundle == bundle
+    assert report.status == ReportStatus.DONE
+    assert service._pending_reports == {}
+
+def test_report_with_logs_reuses_its_bundle():
+    service = create_report_service()
+    report = ReportData.create(dict(bundle), "test", dict(bundle), report_id="2")
+    asyncio.run(respond_with_datalog(service, report, responses=1))
+    assert service.ipfs.pinned == []
+    assert service.robonomics.datalogs == [bundle]
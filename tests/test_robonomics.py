@@ -0,0 +1,163 @@
+import asyncio
+import threading
+from collections import deque
+from types import SimpleNamespace
+
+from custom_components.robonomics_report_service import robonomics
+from custom_components.robonomics_report_service.endpoint_manager import EndpointManager
+from custom_components.robonomics_report_service.executor import ReportServiceExecutor
+from custom_components.robonomics_report_service.robonomics import Robonomics, get_batch_results
+
+
+class Event:
+    def __init__(self, module_id: str, event_id: str, attributes=None):
+        self.value = {"module_id": module_id, "event_id": event_id, "attributes": attributes}
+
+
+def test_completed_batch():
+    events = [Event("Datalog", "NewRecord"), Event("Utility", "BatchCompleted")]
+    assert get_batch_results(events, 3) == [True, True, True]
+
+def test_interrupted_batch():
+    events = [Event("Datalog", "NewRecord"), Event("Utility", "BatchInterrupted", {"index": 1, "error": {}})]
+    assert get_batch_results(events, 3) == [True, False, False]
+    events = [Event("Utility", "BatchInterrupted", (0, {}))]
+    assert get_batch_results(events, 2) == [False, False]
+
+
+def create_robonomics() -> Robonomics:
+    # Only the chain tracking state, without connecting to a node
+    client = Robonomics.__new__(Robonomics)
+    client.executor = ReportServiceExecutor()
+    client.current_wss = "wss://node"
+    client._stale_interfaces = set()
+    client._chain_lock = threading.Lock()
+    client._pending_extrinsics = {}
+    return client
+
+def test_deadline_passes_when_blocks_cant_be_scanned(monkeypatch):
+    monkeypatch.setattr(robonomics, "DATALOG_INCLUSION_POLL_INTERVAL", 0)
+    client = create_robonomics()
+
+    def scan_blocks(wss, next_block, extrinsic_hashes):
+        raise ConnectionError("Node is down")
+
+    client._scan_blocks = scan_blocks
+    client._get_head_block = lambda wss: 151
+
+    async def track():
+        future = asyncio.get_running_loop().create_future()
+        client._pending_extrinsics["0x01"] = (future, 150)
+        await asyncio.wait_for(client._async_track_inclusion(100), 1)
+        return future.result()
+
+    assert asyncio.run(track()) is None
+    assert client._stale_interfaces == {"wss://node"}
+
+class Chain:
+    """Account with the nonce 8 at the finalized head and two more extrinsics in the pool."""
+
+    def get_chain_finalised_head(self):
+        return "0xfinalized"
+
+    def query(self, module, storage_function, params, block_hash=None):
+        assert (module, storage_function, block_hash) == ("System", "Account", "0xfinalized")
+        return SimpleNamespace(value={"nonce": 8, "data": {}})
+
+    def rpc_request(self, method, params):
+        assert method == "system_accountNextIndex"
+        return {"result": 10}
+
+def test_extrinsic_is_included_if_finalized_nonce_is_used():
+    client = create_robonomics()
+    client.sender_address = "4FNQo2tK6PLeEhNEUuPePs8B8xKNwx15fX7tC2XnYpkC8W1j"
+    client._get_interface = lambda wss: Chain()
+    assert asyncio.run(client._async_is_nonce_used(7))
+    # Extrinsics waiting in the pool are not included
+    assert not asyncio.run(client._async_is_nonce_used(8))
+    assert not asyncio.run(client._async_is_nonce_used(9))
+
+def test_datalog_is_sent_to_next_node_after_failure():
+    client = create_robonomics()
+    client.endpoints = EndpointManager(hass=None, endpoints=["wss://first/", "wss://second/"])
+    client.current_wss = client.endpoints.best()
+    client._datalog_queue = deque()
+    used_wss = []
+
+    def submit_rws_call(wss, call_module, call_function, call_args):
+        used_wss.append(wss)
+        if wss == "wss://first/":
+            raise ConnectionError("Node is down")
+        return "0x01", 100, 5
+
+    client._submit_rws_call = submit_rws_call
+    assert asyncio.run(client._send_datalogs(["data"])) == ("0x01", 100, 5)
+    assert used_wss == ["wss://first/", "wss://second/"]
+    assert client._stale_interfaces == {"wss://first/"}
+    assert client.endpoints.stats()["wss://first/"]["consecutive_failures"] == 1
+    assert client.current_wss == "wss://second/"
+
+def test_rws_membership_is_cached(monkeypatch):
+    client = create_robonomics()
+    checks = []
+
+    def check_sender_in_rws(wss):
+        checks.append(wss)
+        return True
+
+    client._check_sender_in_rws = check_sender_in_rws
+    client._rws_waiters = []
+    client._rws_membership = None
+    assert asyncio.run(client.async_is_sender_in_rws())
+    assert asyncio.run(client.async_is_sender_in_rws())
+    assert checks == ["wss://node"]
+    # The membership is checked again after it expires
+    monkeypatch.setattr(robonomics, "RWS_MEMBERSHIP_TTL", 0)
+    assert asyncio.run(client.async_is_sender_in_rws())
+    assert checks == ["wss://node", "wss://node"]
+
+class Subscriber:
+    """Calls back from its own thread, as the subscriber of the chain events does."""
+
+    instances = []
+
+    def __init__(self, account, event, callback, addr):
+        self.callback = callback
+        self.cancelled = False
+        Subscriber.instances.append(self)
+
+    def send_event(self, data):
+        thread = threading.Thread(target=self.callback, args=(data,))
+        thread.start()
+        thread.join()
+
+    def cancel(self):
+        self.cancelled = True
+
+def test_wait_for_rws_resolves_on_new_devices_event(monkeypatch):
+    monkeypatch.setattr(robonomics, "Subscriber", Subscriber)
+    monkeypatch.setattr(robonomics, "Account", lambda remote_ws: None)
+    client = create_robonomics()
+    client.sender_address = "4FNQo2tK6PLeEhNEUuPePs8B8xKNwx15fX7tC2XnYpkC8W1j"
+    client.subscriber = None
+    client._rws_waiters = []
+    client._rws_membership = None
+    client._check_sender_in_rws = lambda wss: False
+
+    async def wait():
+        client.hass = SimpleNamespace(loop=asyncio.get_running_loop())
+        waiting = asyncio.ensure_future(client.wait_for_rws())
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        subscriber = Subscriber.instances[-1]
+        subscriber.send_event((robonomics.OWNER_ADDRESS, ["other"]))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        subscriber.send_event((robonomics.OWNER_ADDRESS, ["other", client.sender_address]))
+        await asyncio.wait_for(waiting, 1)
+        return subscriber
+
+    subscriber = asyncio.run(wait())
+    assert subscriber.cancelled
+    assert client.subscriber is None
+    assert asyncio.run(client.async_is_sender_in_rws())
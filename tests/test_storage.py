@@ -0,0 +1,99 @@
+import asyncio
+import io
+import json
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from custom_components.robonomics_report_service.cid import compute_directory_cid, compute_file_cid
+from custom_components.robonomics_report_service.storage import KuboBackend, LocalBackend, kubo_backend
+
+log = bytes(range(256)) * 2344
+description = b'{"description":"test"}'
+
+
+def test_local_backend_round_trip(tmp_path):
+    backend = LocalBackend(SimpleNamespace(data={}), str(tmp_path / "storage"))
+
+    async def round_trip():
+        cid = await backend.pin("home-assistant.log", io.BytesIO(log))
+        pinned = await backend.exists(cid)
+        removed = await backend.unpin(cid)
+        return cid, pinned, removed, await backend.exists(cid)
+
+    cid, pinned, removed, exists = asyncio.run(round_trip())
+    assert cid == compute_file_cid(log)
+    assert pinned and removed and not exists
+
+def test_local_backend_directory(tmp_path):
+    backend = LocalBackend(SimpleNamespace(data={}), str(tmp_path / "storage"))
+    files = [("home-assistant.log", io.BytesIO(log)), ("issue_description.json", io.BytesIO(description))]
+    cid = asyncio.run(backend.pin_directory(files, "report"))
+    assert cid == compute_directory_cid({"home-assistant.log": log, "issue_description.json": description})
+    assert (tmp_path / "storage" / cid / "issue_description.json").read_bytes() == description
+    assert asyncio.run(backend.unpin(cid))
+    assert not (tmp_path / "storage" / cid).exists()
+
+
+def create_kubo_app(pins: set) -> web.Application:
+    async def add(request: web.Request) -> web.Response:
+        files = {}
+        reader = await request.multipart()
+        async for part in reader:
+            files[part.filename] = bytes(await part.read())
+        added = [{"Name": name, "Hash": compute_file_cid(data)} for name, data in files.items()]
+        if request.query.get("wrap-with-directory") == "true":
+            added.append({"Name": "", "Hash": compute_directory_cid(files)})
+        pins.add(added[-1]["Hash"])
+        return web.Response(text="\n".join(json.dumps(obj) for obj in added) + "\n")
+
+    async def pin_rm(request: web.Request) -> web.Response:
+        if request.query["arg"] not in pins:
+            return web.json_response({"Message": "not pinned or pinned indirectly", "Code": 0}, status=500)
+        pins.remove(request.query["arg"])
+        return web.json_response({"Pins": [request.query["arg"]]})
+
+    async def pin_ls(request: web.Request) -> web.Response:
+        if request.query["arg"] not in pins:
+            return web.json_response({"Message": "not pinned", "Code": 0}, status=500)
+        return web.json_response({"Keys": {request.query["arg"]: {"Type": "recursive"}}})
+
+    app = web.Application()
+    app.router.add_post("/api/v0/add", add)
+    app.router.add_post("/api/v0/pin/rm", pin_rm)
+    app.router.add_post("/api/v0/pin/ls", pin_ls)
+    return app
+
+
+async def run_with_kubo(monkeypatch, test):
+    pins = set()
+    async with TestServer(create_kubo_app(pins)) as server:
+        async with aiohttp.ClientSession() as session:
+            monkeypatch.setattr(kubo_backend, "async_get_clientsession", lambda hass: session)
+            backend = KuboBackend(SimpleNamespace(data={}), str(server.make_url("/")))
+            return await test(backend), pins
+
+def test_kubo_backend_pins_file(monkeypatch):
+    async def pin_and_unpin(backend):
+        cid = await backend.pin("home-assistant.log", io.BytesIO(log))
+        pinned = await backend.exists(cid)
+        return cid, pinned, await backend.unpin(cid), await backend.unpin(cid), await backend.exists(cid)
+
+    (cid, pinned, removed, removed_again, exists), pins = asyncio.run(run_with_kubo(monkeypatch, pin_and_unpin))
+    assert cid == compute_file_cid(log)
+    assert pinned and removed and not exists
+    # Removing a pin which is not there is not an error
+    assert removed_again
+    assert pins == set()
+
+def test_kubo_backend_pins_directory(monkeypatch):
+    files = [("home-assistant.log", io.BytesIO(log)), ("issue_description.json", io.BytesIO(description))]
+
+    async def pin_directory(backend):
+        return await backend.pin_directory(files, "report")
+
+    cid, pins = asyncio.run(run_with_kubo(monkeypatch, pin_directory))
+    assert cid == compute_directory_cid({"home-assistant.log": log, "issue_description.json": description})
+    assert pins == {cid}
@@ -2,7 +2,15 @@
 from robonomicsinterface import Account
 from substrateinterface import Keypair, KeypairType
 
-from custom_components.robonomics_report_service.utils import multi_device_encrypt_message, encrypt_message, decrypt_message, _decrypt_message
+from custom_components.robonomics_report_service.utils import (
+    multi_device_encrypt_message,
+    encrypt_message,
+    decrypt_message,
+    _decrypt_message,
+    truncate_to_bytes,
+    plan_report_budget,
+    encrypted_message_size,
+)
 
 sender_address = "4CsXeZy3VbKnB9YMUBYpgsnsaZXZczF2PXH1bYYGBnH5PRcz"
 sender_seed = "labor now library worry monitor surface sword pulse poem fee cousin outer"
@@ -31,4 +39,27 @@ def test_multi_device_decrypt():
     decrypted_receiver = decrypt_message(message_encrypted_for_multiply_devices, receiver_seed, sender_address)
     decrypted_sender = decrypt_message(message_encrypted_for_multiply_devices, sender_seed, sender_address)
     assert decrypted_receiver == message
-    assert decrypted_sender == message
\ No newline at end of file
+    assert decrypted_sender == message
+
+def test_truncate_to_bytes_keeps_whole_lines():
+    data = "first line\nвторая строка\nthird line\n".encode("utf-8")
+    truncated = truncate_to_bytes(data, 20)
+    assert len(truncated) <= 20
+    assert truncated == b"third line\n"
+    assert truncate_to_bytes(data, len(data)) == data
+
+def test_plan_report_budget_redistributes_unused_shares():
+    plan = plan_report_budget({"log": 10_000, "traces": 100}, {"log": 3}, 1000)
+    assert plan == {"log": 900, "traces": 100}
+    plan = plan_report_budget({"log": 10_000, "traces": 10_000}, {"log": 3}, 1000)
+    assert plan == {"log": 750, "traces": 250}
+
+def test_encrypted_message_size_is_upper_bound():
+    encrypted = multi_device_encrypt_message(message, sender_seed, receiver_address)
+    assert len(encrypted) <= encrypted_message_size(len(message.encode("utf-8")))
+
+def test_deterministic_multi_device_encrypt():
+    encrypted = multi_device_encrypt_message(message, sender_seed, receiver_address, deterministic=True)
+    assert encrypted == multi_device_encrypt_message(message, sender_seed, receiver_address, deterministic=True)
+    assert encrypted != multi_device_encrypt_message(message + "!", sender_seed, receiver_address, deterministic=True)
+    assert decrypt_message(encrypted, receiver_seed, sender_address) == message